@@ -0,0 +1,3 @@
+import time
+
+IMPORT_STARTED = time.perf_counter()  # startup report: import cost is measured from the package import
@@ -1,6 +1,8 @@
 # src/api.py
 import json
 import os
+import sys
+import time
 import traceback
 from uuid import uuid4
 from fastapi import (
@@ -11,24 +13,59 @@ from fastapi import (
     HTTPException,
     status,
     FastAPI,
-    BackgroundTasks,
     Header,
 )
 from pydantic import BaseModel, Field
-from typing import Optional, List
-from tempfile import NamedTemporaryFile
+from typing import Optional, List, Dict
+from pathlib import Path
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from fastapi.responses import PlainTextResponse
 import httpx
 import asyncio
 
 from .models import FeedbackResponse, FeedbackMetadata, LLMUsage
 from .constants import settings
-from .services.audio_service import extract_features, features_to_payload
-from .services.llm_service import MLService
-from .prompts import assemble_messages, COMPARISON_USER_TEMPLATE
-from .progress import post_progress  # our helper with retries + backoff
+from .services.extraction_engine import engine
+from .services.feature_cache import feature_cache, hash_file
+from .services.decode import probe, check_duration, AudioTooLong
+from .services.extractor_config import ExtractionProfile, resolve_profile
+from .services.llm_service import MLService, aclose_http_client, get_service, warmup_services
+from .prompts import (
+    assemble_combined_messages, assemble_comparison_messages, assemble_messages, split_combined, PROMPT_VERSION,
+)
+from .progress import (
+    ProgressTracker, StageGroup, get_callback_client, progress_dispatcher, progress_estimator, work_units,
+)
+from .logger import get_logger
+from .utils import BodySizeLimitMiddleware, save_upload_streaming
+from .jobs import job_queue, QueueFull, DuplicateJob
+from .batch import BatchReport, discover, run_batch
+from .metrics import (
+    REGISTRY,
+    QUEUE_DEPTH,
+    FEATURE_CACHE_TOTAL,
+    CALLBACK_RETRIES_TOTAL,
+    LLM_PHASE_COST_USD,
+    LLM_PHASE_SECONDS,
+    STARTUP_SECONDS,
+)
+from . import IMPORT_STARTED
+
+log = get_logger("api")
 
 router = APIRouter(prefix="/v1", tags=["feedback"])
 
+class BatchRequest(BaseModel):
+    source: str = Field(..., description="Directory or manifest, relative to BATCH_INPUT_DIR")
+    batch_id: Optional[str] = Field(
+        None, pattern=r"^[A-Za-z0-9_-]{1,64}$",
+        description="Reuse an existing batch's output (resumes it, skipping finished tracks), or name a new one",
+    )
+    concurrency: Optional[int] = Field(None, description="Max tracks in flight (defaults to the pool size)")
+    use_cache: bool = Field(True, description="Read/populate the feature cache")
+    profile: str = Field(settings.DEFAULT_PROFILE, description="Extraction profile: fast | standard | full")
+
 class FeedbackRequest(BaseModel):
     genre: str = Field(..., description="Selected genre, e.g. 'Techno'")
     feedback_type: str = Field(..., description="Focus area (e.g., Mix, Arrangement)")
@@ -36,24 +73,30 @@ class FeedbackRequest(BaseModel):
 
 async def post_json_with_retries(url: str, payload: dict, secret: Optional[str], retries: int = 4, base: float = 1.2):
     headers = {"x-ml-secret": (secret or settings.ML_CALLBACK_SECRET)}
-    async with httpx.AsyncClient(timeout=30) as client:
-        for attempt in range(1, retries + 1):
-            try:
-                r = await client.post(url, json=payload, headers=headers)
-                if r.status_code >= 400:
-                    # raise to enter except and retry
-                    raise httpx.HTTPStatusError(f"{r.status_code} {r.text[:200]}", request=r.request, response=r)
-                return
-            except Exception as e:
-                if attempt == retries:
-                    raise
-                await asyncio.sleep(base * attempt)
-
-def _save_upload_local(f: UploadFile) -> str:
-    tmp = NamedTemporaryFile(delete=False, suffix=os.path.splitext(f.filename or '')[-1])
-    with open(tmp.name, "wb") as w:
-        w.write(f.file.read())
-    return tmp.name
+    client = get_callback_client()
+    for attempt in range(1, retries + 1):
+        try:
+            r = await client.post(url, json=payload, headers=headers, timeout=30)
+            if r.status_code >= 400:
+                # raise to enter except and retry
+                raise httpx.HTTPStatusError(f"{r.status_code} {r.text[:200]}", request=r.request, response=r)
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            CALLBACK_RETRIES_TOTAL.inc(kind="result")
+            await asyncio.sleep(base * attempt)
+
+async def _save_upload_local(f: UploadFile) -> tuple[str, str]:
+    # chunked copy + hash runs in a worker thread so large uploads don't block the loop
+    path, content_hash = await run_in_threadpool(save_upload_streaming, f, settings.UPLOADS_DIR)
+    try:
+        # header-only duration probe: over-limit tracks are rejected before any decoding
+        check_duration(await run_in_threadpool(probe, str(path)))
+    except AudioTooLong as e:
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return str(path), content_hash
 
 def _cleanup(paths: List[str]):
     for p in paths:
@@ -63,6 +106,132 @@ def _cleanup(paths: List[str]):
         except Exception:
             pass
 
+async def _cached_extract(path: str, content_hash: Optional[str] = None,
+                         profile: Optional[ExtractionProfile] = None) -> tuple[dict, bool]:
+    """Return (payload, cache_hit); cache hits skip decoding and extraction entirely."""
+    profile = profile or resolve_profile()
+    content_hash = content_hash or await asyncio.to_thread(hash_file, path)
+    key = feature_cache.key(content_hash, profile)
+    cached = await asyncio.to_thread(feature_cache.get, key)
+    if cached is not None:
+        FEATURE_CACHE_TOTAL.inc(result="hit")
+        log.info(f"[features] cache hit {key} for {os.path.basename(path)}")
+        return cached, True
+    FEATURE_CACHE_TOTAL.inc(result="miss")
+    payload = await engine.extract(path, content_hash, profile.name)
+    await asyncio.to_thread(feature_cache.put, key, payload)
+    return payload, False
+
+COMPARE_MODES = ("sequential", "pipelined", "combined")
+PIPELINED_LLM = StageGroup("llm", ("comparing", "prompting"))
+
+
+def _compare_mode(has_reference: bool) -> str:
+    if not has_reference:
+        return "no_reference"
+    mode = settings.LLM_COMPARE_MODE
+    if mode not in COMPARE_MODES:
+        log.warning(f"[llm] unknown LLM_COMPARE_MODE={mode!r}; using sequential")
+        return "sequential"
+    return mode
+
+
+def _llm_stages(mode: str) -> list:
+    if mode == "sequential":
+        return ["comparing", "prompting"]
+    if mode == "pipelined":
+        return [PIPELINED_LLM]
+    return ["prompting"]
+
+
+async def _compare(llm: MLService, main_meta: dict, ref_meta: dict, *, use_cache: bool = True,
+                   **query) -> tuple[dict, dict]:
+    comparison_messages = await asyncio.to_thread(assemble_comparison_messages, main_meta, ref_meta, **query)
+    async with job_queue.stage("llm"):
+        comparison_text, info = await llm.call_llm_async(
+            messages=comparison_messages,
+            max_tokens=800,
+            temperature=0.4,
+            call_type="compare_main_reference",
+            use_cache=use_cache,
+        )
+    try:
+        return json.loads(comparison_text), info
+    except Exception:
+        return {"summary_text": (comparison_text or "").strip()[:1000]}, info
+
+
+async def _feedback(llm: MLService, messages: list, *, max_tokens: int = 1200,
+                    call_type: str = "final_feedback", use_cache: bool = True) -> tuple[str, dict]:
+    async with job_queue.stage("llm"):
+        return await llm.call_llm_async(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.5,
+            call_type=call_type,
+            use_cache=use_cache,
+        )
+
+
+async def _llm_phase(llm: MLService, progress: ProgressTracker, mode: str, main_meta: dict,
+                     ref_meta: Optional[dict], *, use_cache: bool = True,
+                     **query) -> tuple[str, dict, Optional[dict], list]:
+    """
+    (feedback text, final call info, comparison summary, every call's info) per compare mode:
+    sequential waits for the comparison and feeds it to the feedback prompt; pipelined runs
+    both calls at once, the feedback prompt seeing the raw reference features; combined
+    asks one call for both. `use_cache=False` re-asks the model even for a cached prompt.
+    Prompts are assembled in worker threads: fitting one to the token budget re-renders
+    and re-tokenizes it once per trim step.
+    """
+    query.update(count_tokens=llm.count_tokens, token_budget=settings.PROMPT_TOKEN_BUDGET)
+    if mode == "no_reference":
+        await progress.enter("prompting")
+        messages = await asyncio.to_thread(assemble_messages, main_meta, has_reference=False, **query)
+        content, info = await _feedback(llm, messages, use_cache=use_cache)
+        return content, info, None, [info]
+
+    if mode == "combined":
+        await progress.enter("prompting")
+        messages = await asyncio.to_thread(assemble_combined_messages, main_meta, ref_meta, **query)
+        content, info = await _feedback(llm, messages, max_tokens=2000, call_type="combined_feedback",
+                                        use_cache=use_cache)
+        feedback_text, comparison_summary = split_combined(content)
+        return feedback_text, info, comparison_summary, [info]
+
+    if mode == "pipelined":
+        await progress.enter(PIPELINED_LLM)
+
+        async def part(stage: str, call):
+            result = await call
+            await progress.part_done(stage)
+            return result
+
+        async def feedback():
+            messages = await asyncio.to_thread(
+                assemble_messages, main_meta, has_reference=True, reference_metadata=ref_meta, **query)
+            return await _feedback(llm, messages, use_cache=use_cache)
+
+        (comparison_summary, compare_info), (content, info) = await asyncio.gather(
+            part("comparing", _compare(llm, main_meta, ref_meta, use_cache=use_cache, **query)),
+            part("prompting", feedback()),
+        )
+        return content, info, comparison_summary, [compare_info, info]
+
+    await progress.enter("comparing")
+    comparison_summary, compare_info = await _compare(llm, main_meta, ref_meta, use_cache=use_cache, **query)
+    await progress.enter("prompting")
+    messages = await asyncio.to_thread(
+        assemble_messages, main_meta, has_reference=True, comparison_summary=comparison_summary, **query)
+    content, info = await _feedback(llm, messages, use_cache=use_cache)
+    return content, info, comparison_summary, [compare_info, info]
+
+
+# x-ml-secret of jobs submitted to this process, by request_id, until their run starts. Kept
+# out of the jobs DB: a job recovered after a restart calls back with ML_CALLBACK_SECRET.
+_job_secrets: Dict[str, str] = {}
+
+
 async def _process_in_background(
     *,
     request_id: str,
@@ -71,75 +240,87 @@ async def _process_in_background(
     user_note: Optional[str],
     main_path: str,
     ref_path: Optional[str],
+    main_hash: Optional[str] = None,
+    ref_hash: Optional[str] = None,
     callback_url: Optional[str],
     progress_url: Optional[str],
-    secret: Optional[str],
+    profile: Optional[str] = None,
+    llm_cache: bool = True,
+    secret: Optional[str] = None,  # only in rows persisted before secrets were kept out of the DB
 ):
-    llm = MLService(model_name=settings.MODEL_NAME)
+    secret = _job_secrets.pop(request_id, secret)
+    llm = get_service()
+    extraction_profile = resolve_profile(profile, feedback_type)
     tmp_files = [main_path] + ([ref_path] if ref_path else [])
 
+    # the reference is extracted alongside the main track when there's a spare worker for it
+    # (an identical upload is left sequential: the second lookup is a feature-cache hit)
+    parallel = bool(ref_path) and engine.workers > 1 and main_hash != ref_hash
+    extracting = StageGroup("extracting", ("extracting_main", "extracting_reference"))
+    llm_mode = _compare_mode(bool(ref_path))
+    stages = ["received"]
+    if ref_path:
+        stages += [extracting] if parallel else ["extracting_main", "extracting_reference"]
+    else:
+        stages += ["extracting_main"]
+    stages += _llm_stages(llm_mode) + ["finalizing"]
+
+    async def send(percent: int, stage: str, status: str, meta: Optional[dict]):
+        job_queue.report(request_id, percent=percent, stage=stage, status=status, error=(meta or {}).get("error"))
+        # queued, coalesced and sent off the pipeline's path; a slow backend can't stall the job
+        progress_dispatcher.publish(request_id, progress_url, secret, percent=percent, stage=stage,
+                                    status=status, meta=meta)
+
+    progress = ProgressTracker(send, stages, variant=extraction_profile.name)
+
     try:
-        # Progress: received
-        await post_progress(progress_url, secret, percent=5, stage="received", status="processing")
-
-        # 1) Extract main
-        await post_progress(progress_url, secret, percent=15, stage="extracting_main", status="processing")
-        main_features = extract_features(main_path)
-        main_meta = features_to_payload(main_features)
-
-        comparison_summary = None
-
-        # 2) If reference → extract + compare
-        if ref_path:
-            await post_progress(progress_url, secret, percent=35, stage="extracting_reference", status="processing")
-            ref_features = extract_features(ref_path)
-            ref_meta = features_to_payload(ref_features)
-
-            await post_progress(progress_url, secret, percent=50, stage="comparing", status="processing")
-            comparison_messages = [
-                {"role": "system", "content": "You are an expert mastering engineer and producer."},
-                {
-                    "role": "user",
-                    "content": COMPARISON_USER_TEMPLATE.format(
-                        genre=genre,
-                        feedback_type=feedback_type,
-                        user_note=user_note or "",
-                        main_metadata_json=json.dumps(main_meta, indent=2),
-                        ref_metadata_json=json.dumps(ref_meta, indent=2),
-                    ),
-                },
-            ]
-            comparison_text, _info = llm.call_llm(
-                messages=comparison_messages,
-                max_tokens=800,
-                temperature=0.4,
-                call_type="compare_main_reference",
+        await progress.enter("received")
+        # header-only probes size the extraction stages for the estimator
+        for stage, path in (("extracting_main", main_path), ("extracting_reference", ref_path)):
+            if path:
+                info = await asyncio.to_thread(probe, path)
+                progress.units[stage] = work_units(info.duration_sec, info.sample_rate)
+
+        async def extract(stage: str, path: str, content_hash: Optional[str]) -> dict:
+            async with job_queue.stage("extract"):
+                meta, cached = await _cached_extract(path, content_hash, extraction_profile)
+            if parallel:
+                await progress.part_done(stage, sample=not cached)
+            elif cached:
+                progress.skip_sample()
+            return meta
+
+        ref_meta = None
+
+        # 1) Extract main (+ reference concurrently)
+        if parallel:
+            await progress.enter(extracting)
+            main_meta, ref_meta = await asyncio.gather(
+                extract("extracting_main", main_path, main_hash),
+                extract("extracting_reference", ref_path, ref_hash),
             )
-            try:
-                comparison_summary = json.loads(comparison_text)
-            except Exception:
-                comparison_summary = {"summary_text": (comparison_text or "").strip()[:1000]}
-
-        # 3) Final prompt
-        await post_progress(progress_url, secret, percent=65, stage="prompting", status="processing")
-        messages = assemble_messages(
-            main_meta,
-            genre=genre,
-            feedback_type=feedback_type,
-            user_note=user_note,
-            has_reference=bool(ref_path),
-            comparison_summary=comparison_summary,
-        )
+        else:
+            await progress.enter("extracting_main")
+            main_meta = await extract("extracting_main", main_path, main_hash)
 
-        content, info = llm.call_llm(
-            messages=messages,
-            max_tokens=1200,
-            temperature=0.5,
-            call_type="final_feedback",
+        # 2) If reference → extract (unless done above)
+        if ref_path and not parallel:
+            await progress.enter("extracting_reference")
+            ref_meta = await extract("extracting_reference", ref_path, ref_hash)
+
+        # 3) Comparison + final feedback
+        llm_started = time.perf_counter()
+        content, info, comparison_summary, calls = await _llm_phase(
+            llm, progress, llm_mode, main_meta, ref_meta, use_cache=llm_cache,
+            genre=genre, feedback_type=feedback_type, user_note=user_note,
         )
+        llm_sec = time.perf_counter() - llm_started
+        llm_cost = sum(c.get("cost") or 0.0 for c in calls)
+        LLM_PHASE_SECONDS.observe(llm_sec, mode=llm_mode)
+        LLM_PHASE_COST_USD.observe(llm_cost, mode=llm_mode)
 
         # 4) Final callback
-        await post_progress(progress_url, secret, percent=95, stage="finalizing", status="processing")
+        await progress.enter("finalizing")
         payload = {
             "session_id": uuid4().hex,           # local session for ML
             "request_id": request_id,
@@ -149,13 +330,20 @@ async def _process_in_background(
             "metadata": main_meta,
             "comparison_summary": comparison_summary,
             "query": {"genre": genre, "feedback_type": feedback_type, "user_note": user_note},
-            "llm": {"model": info["model"], "usage": info.get("usage"), "cost": info.get("cost")},
-            "prompt_version": "v1.1.0",
+            "llm": {
+                "model": info["model"], "usage": info.get("usage"), "cost": info.get("cost"),
+                "mode": llm_mode,
+                "wall_sec": round(llm_sec, 3),
+                "total_cost": llm_cost,
+                "calls": [{"type": c["type"], "usage": c.get("usage"), "cost": c.get("cost"),
+                           "cached": c.get("cached", False)} for c in calls],
+            },
+            "prompt_version": PROMPT_VERSION,
         }
         if callback_url:
             await post_json_with_retries(callback_url, payload, secret, retries=4, base=1.5)
 
-        await post_progress(progress_url, secret, percent=100, stage="completed", status="completed")
+        await progress.finish("completed")
 
     except Exception as e:
         # Report failure to backend
@@ -172,58 +360,134 @@ async def _process_in_background(
                     retries=3,
                     base=1.5,
                 )
-            await post_progress(progress_url, secret, percent=100, stage="failed", status="failed", meta={"error": str(e)})
         finally:
-            _cleanup(tmp_files)
+            # the job ends "failed" even when the backend can't take the error callback
+            try:
+                await progress.finish("failed", meta={"error": str(e)})
+            finally:
+                _cleanup(tmp_files)
         return
+    finally:
+        # whatever raised above, no ticker may outlive the job and report it "processing" again
+        await progress.close()
 
     _cleanup(tmp_files)
 
+async def _report_abandoned(request_id: str, params: dict, error: str) -> None:
+    """A job recovery gave up on (see JobStore.recover): tell the backend, as a failed run would."""
+    secret = None  # per-request secrets die with the process: fall back to ML_CALLBACK_SECRET
+    progress_dispatcher.publish(request_id, params.get("progress_url"), secret, percent=100, stage="failed",
+                                status="failed", meta={"error": error})
+    if not params.get("callback_url"):
+        return
+    try:
+        await post_json_with_retries(
+            params["callback_url"],
+            {"session_id": uuid4().hex, "request_id": request_id, "error": error},
+            secret,
+            retries=3,
+            base=1.5,
+        )
+    except Exception as e:
+        log.error(f"[jobs] failure callback for {request_id} not delivered: {type(e).__name__}: {e}")
+
 @router.post(
     "/feedback",
     status_code=status.HTTP_202_ACCEPTED,
-    summary="Kick off feedback; background process and callback when done",
-    description="Upload one or two audio files. Work runs in background; progress + final callback will be sent.",
+    summary="Kick off feedback; queued for background processing with callback when done",
+    description=(
+        "Upload one or two audio files. Work is persisted to the job queue; progress + final callback "
+        "will be sent. Returns 429 when the queue is full."
+    ),
 )
 async def feedback_endpoint(
-    background: BackgroundTasks,
     genre: str = Form(...),
     feedback_type: str = Form(...),
     user_note: Optional[str] = Form(None),
     request_id: Optional[str] = Form(None),
     callback_url: Optional[str] = Form(None),
     progress_url: Optional[str] = Form(None),
+    profile: Optional[str] = Form(None, description="Extraction profile: fast | standard | full (default from feedback_type)"),
+    llm_cache: bool = Form(True, description="Set false to re-ask the LLM even if an identical prompt was answered recently"),
     audio_file: UploadFile = File(..., description="Primary audio file (WAV/MP3)"),
     reference_audio_file: Optional[UploadFile] = File(None, description="Optional reference track"),
     x_ml_secret: Optional[str] = Header(None),
 ):
     """
-    Accepts large files, returns 202 quickly, and runs heavy work in a background task.
+    Accepts large files, returns 202 quickly, and enqueues the heavy work on the durable job queue.
     """
+    # cheap admission check before touching the uploads
+    if await job_queue.is_full():
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Processing queue is full; retry later.",
+            headers={"Retry-After": "30"},
+        )
+
     try:
-      # save temp files
-      main_path = _save_upload_local(audio_file)
-      ref_path = _save_upload_local(reference_audio_file) if reference_audio_file else None
-
-      background.add_task(
-          _process_in_background,
-          request_id=request_id or uuid4().hex,
-          genre=genre,
-          feedback_type=feedback_type,
-          user_note=user_note,
-          main_path=main_path,
-          ref_path=ref_path,
-          callback_url=callback_url,
-          progress_url=progress_url,
-          secret=(x_ml_secret or settings.ML_CALLBACK_SECRET),
-      )
+        extraction_profile = resolve_profile(profile, feedback_type)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    request_id = request_id or uuid4().hex
+    saved: List[str] = []
+    try:
+      # save uploads
+      main_path, main_hash = await _save_upload_local(audio_file)
+      saved.append(main_path)
+      ref_path, ref_hash = None, None
+      if reference_audio_file:
+          ref_path, ref_hash = await _save_upload_local(reference_audio_file)
+          saved.append(ref_path)
+
+      # the per-request secret stays in this process, never in the jobs DB; it's set before
+      # submit since a worker may claim the job straight away
+      previous_secret = _job_secrets.get(request_id)
+      if x_ml_secret:
+          _job_secrets[request_id] = x_ml_secret
+      try:
+          await job_queue.submit(
+              request_id,
+              dict(
+                  request_id=request_id,
+                  genre=genre,
+                  feedback_type=feedback_type,
+                  user_note=user_note,
+                  main_path=main_path,
+                  ref_path=ref_path,
+                  main_hash=main_hash,
+                  ref_hash=ref_hash,
+                  callback_url=callback_url,
+                  progress_url=progress_url,
+                  profile=extraction_profile.name,
+                  llm_cache=llm_cache,
+              ),
+          )
+      except BaseException:
+          if previous_secret is None:
+              _job_secrets.pop(request_id, None)
+          else:
+              _job_secrets[request_id] = previous_secret
+          raise
 
       # Immediate 202 – the actual output will arrive via callbacks
       return {"ok": True, "accepted": True, "request_id": request_id}
 
+    except QueueFull:
+      _cleanup(saved)
+      raise HTTPException(
+          status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+          detail="Processing queue is full; retry later.",
+          headers={"Retry-After": "30"},
+      )
+    except DuplicateJob:
+      _cleanup(saved)
+      raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job {request_id} is already in progress")
     except HTTPException:
+      _cleanup(saved)
       raise
     except Exception as e:
+      _cleanup(saved)
       traceback.print_exc()
       raise HTTPException(
           status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -231,11 +495,181 @@ async def feedback_endpoint(
       )
 
 
+@router.get("/jobs/{request_id}", summary="Job status from the persistent queue")
+async def job_status(request_id: str):
+    job = await job_queue.get(request_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown request_id")
+    return {
+        "request_id": job["request_id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "percent": job["percent"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+        "queue_position": await job_queue.position(request_id) if job["status"] == "queued" else None,
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+_batches: Dict[str, BatchReport] = {}       # live batches' reports; finished ones are read from the jobs DB
+_batch_tasks: Dict[str, asyncio.Task] = {}
+BATCH_CHECKPOINT_SEC = 5.0  # how often a running batch's report is saved
+
+@asynccontextmanager
+async def _batch_slot():
+    # a backfill track holds one of BATCH_CONCURRENCY slots *and* an extract slot, so it queues here
+    # (outside the engine's timeout clock) and never takes every worker from live jobs
+    async with job_queue.stage("batch"), job_queue.stage("extract"):
+        yield
+
+def _batch_output(batch_id: str) -> Path:
+    return settings.BATCH_OUTPUT_DIR / f"{batch_id}.jsonl"
+
+async def _save_batch(batch_id: str, state: str, params: dict) -> None:
+    await asyncio.to_thread(job_queue.store.put_batch, batch_id, state, params, _batches[batch_id].to_dict())
+
+async def _run_batch(batch_id: str, params: dict, paths: List[Path], **kwargs) -> None:
+    """`run_batch`, with its report checkpointed to the jobs DB and its end state recorded there."""
+    async def checkpoint():
+        while True:
+            await asyncio.sleep(BATCH_CHECKPOINT_SEC)
+            await _save_batch(batch_id, "running", params)
+
+    saver = asyncio.create_task(checkpoint())
+    state = "failed"
+    try:
+        await run_batch(paths, _batch_output(batch_id), report=_batches[batch_id], slot=_batch_slot, **kwargs)
+        state = "finished"
+    except asyncio.CancelledError:
+        state = "cancelled"  # shutdown; POST the same batch_id to resume
+        raise
+    except Exception as e:
+        log.error(f"[batch] {batch_id} failed: {type(e).__name__}: {e}")
+        raise
+    finally:
+        saver.cancel()
+        _batches[batch_id].finished_at = _batches[batch_id].finished_at or time.time()
+        await _save_batch(batch_id, state, params)
+
+def _prune_batches() -> None:
+    for batch_id in [b for b, task in _batch_tasks.items() if task.done()]:
+        _batches.pop(batch_id, None)
+        _batch_tasks.pop(batch_id, None)
+
+async def _cancel_batches() -> None:
+    for task in _batch_tasks.values():
+        task.cancel()
+    await asyncio.gather(*_batch_tasks.values(), return_exceptions=True)
+
+async def _batch_status(batch_id: str) -> Optional[dict]:
+    task = _batch_tasks.get(batch_id)
+    if task is not None and not task.done():
+        state, report = "running", _batches[batch_id].to_dict()
+    else:
+        row = await asyncio.to_thread(job_queue.store.get_batch, batch_id)
+        if row is None:
+            return None
+        # still "running" in the DB with no task here: the process running it went away
+        state, report = ("interrupted" if row["state"] == "running" else row["state"]), row["report"]
+    return {"batch_id": batch_id, "state": state, "output": str(_batch_output(batch_id)), "report": report}
+
+@router.post(
+    "/features/batch",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Batch feature extraction (catalog backfill) to JSON Lines",
+)
+async def features_batch(req: BatchRequest):
+    root = settings.BATCH_INPUT_DIR.resolve()
+    source = (root / req.source).resolve()
+    if not source.is_relative_to(root) or not source.exists():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="source must exist under BATCH_INPUT_DIR")
+
+    try:
+        extraction_profile = resolve_profile(req.profile)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    try:
+        # manifest entries are confined to BATCH_INPUT_DIR too, not just the manifest itself
+        paths = await asyncio.to_thread(discover, source, root)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"invalid source: {e}")
+    _prune_batches()
+    batch_id = req.batch_id or uuid4().hex
+    if batch_id in _batch_tasks:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Batch {batch_id} is already running")
+    params = req.model_dump(exclude={"batch_id"})
+    _batches[batch_id] = BatchReport(total=len(paths))
+    await _save_batch(batch_id, "running", params)
+    # an existing output is reopened: run_batch skips the tracks it already holds a payload for
+    _batch_tasks[batch_id] = asyncio.create_task(_run_batch(
+        batch_id, params, paths,
+        concurrency=req.concurrency, use_cache=req.use_cache, profile=extraction_profile,
+    ))
+    return await _batch_status(batch_id)
+
+@router.get("/features/batch/{batch_id}", summary="Batch progress and throughput")
+async def features_batch_status(batch_id: str):
+    batch = await _batch_status(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown batch_id")
+    return batch
+
+
 # ===========================
 # App Factory
 # ===========================
+_startup: Dict[str, float] = {}
+
+
+def _startup_phase(phase: str, seconds: float) -> None:
+    _startup[phase] = round(seconds, 3)
+    STARTUP_SECONDS.set(seconds, phase=phase)
+
+
+async def _warm_workers() -> None:
+    """Background: run the extractor once in every worker, then log the worker half of the startup report."""
+    started = time.perf_counter()
+    try:
+        workers = await engine.warmup()
+    except Exception as e:
+        log.warning(f"[startup] extractor warmup failed: {type(e).__name__}: {e}")
+        return
+    _startup_phase("workers", time.perf_counter() - started)
+    _startup_phase("worker_import", max(w["import_sec"] for w in workers))
+    _startup_phase("worker_warmup", max(w["warmup_sec"] for w in workers))
+    log.info(f"[startup] {len({w['pid'] for w in workers})} extraction workers warm: {_startup}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    await asyncio.to_thread(warmup_services)  # raises on a bad MODEL_NAME / missing key: fail the deploy
+    _startup_phase("llm", time.perf_counter() - started)
+    engine.start()
+    await job_queue.start(_process_in_background, on_failed=_report_abandoned)
+    if "librosa" in sys.modules:
+        log.warning("[startup] the audio stack was imported in the API process; keep it inside the workers")
+    log.info(f"[startup] ready: {_startup}")
+    warm = asyncio.create_task(_warm_workers()) if settings.EXTRACT_WARMUP else None
+    try:
+        yield
+    finally:
+        if warm is not None:
+            warm.cancel()
+        await _cancel_batches()
+        await job_queue.stop()
+        await asyncio.to_thread(progress_estimator.flush)  # stages of jobs cut off by the shutdown
+        engine.shutdown()
+        await progress_dispatcher.aclose()
+        await aclose_http_client()
+
+
 def create_app() -> FastAPI:
     app = FastAPI(
+        lifespan=lifespan,
         title="TrackCheck ML Backend (MLint)",
         version="1.1.0",
         description=(
@@ -248,9 +682,19 @@ def create_app() -> FastAPI:
     async def healthz():
         return {"ok": True, "service": "mlend", "status": "healthy"}
 
+    QUEUE_DEPTH.set_function(job_queue.store.depth)
+    app.add_middleware(BodySizeLimitMiddleware)
+
+    @app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+    async def metrics():
+        # the queue depth gauge reads the jobs DB at scrape time
+        body = await asyncio.to_thread(REGISTRY.render)
+        return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 
     app.include_router(router)
     return app
 
 
-app = create_app()
\ No newline at end of file
+app = create_app()
+_startup_phase("import", time.perf_counter() - IMPORT_STARTED)
\ No newline at end of file
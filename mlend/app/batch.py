@@ -0,0 +1,192 @@
+# src/batch.py
+"""
+Batch feature extraction for catalog backfills.
+
+    python -m app.batch <dir-or-manifest> -o features.jsonl [--workers N] [--no-cache] [--profile full]
+
+A manifest is a text file with one audio path per line, or JSON Lines with a
+"path" key. Results are appended to the output as JSON Lines; re-running with the
+same output resumes, skipping tracks that already have a payload.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import AsyncContextManager, Callable, Iterable, List, Optional, Set
+
+from .constants import settings
+from .logger import get_logger
+from .metrics import observe_extract_timings
+from .services.extraction_engine import ExtractionEngine, _extract_payload, engine as shared_engine
+from .services.extractor_config import ExtractionProfile, PROFILES, resolve_profile
+from .services.feature_cache import feature_cache, hash_file
+
+log = get_logger("batch")
+
+AUDIO_EXTS = {".wav", ".mp3", ".flac", ".m4a", ".ogg"}
+
+
+@dataclass
+class BatchReport:
+    total: int = 0
+    done: int = 0
+    cached: int = 0
+    skipped: int = 0          # already in the output (resume)
+    failed: int = 0
+    cpu_sec: float = 0.0      # worker CPU time, extracted tracks only
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def wall_sec(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self) -> dict:
+        extracted = max(1, self.done - self.cached)
+        return {
+            **asdict(self),
+            "wall_sec": round(self.wall_sec, 2),
+            "tracks_per_min": round(self.done / self.wall_sec * 60, 2) if self.wall_sec > 0 else 0.0,
+            "cpu_sec_per_track": round(self.cpu_sec / extracted, 3),
+        }
+
+
+def discover(source: Path, root: Optional[Path] = None) -> List[Path]:
+    """
+    Audio files under a directory, or the paths listed in a manifest. With `root`, every
+    path is resolved (symlinks, "..") and one outside `root` raises ValueError.
+    """
+    source = Path(source)
+    if source.is_dir():
+        paths = sorted(p for p in source.rglob("*") if p.suffix.lower() in AUDIO_EXTS and p.is_file())
+    else:
+        paths = []
+        for line in source.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            p = Path(json.loads(line)["path"]) if line.startswith("{") else Path(line)
+            paths.append(p if p.is_absolute() else source.parent / p)
+    if root is None:
+        return paths
+    root = Path(root).resolve()
+    resolved = [p.resolve() for p in paths]
+    outside = [str(p) for p, r in zip(paths, resolved) if not r.is_relative_to(root)]
+    if outside:
+        raise ValueError(f"{len(outside)} path(s) outside {root}, e.g. {outside[0]}")
+    return resolved
+
+
+def completed_paths(out_path: Path) -> Set[str]:
+    done: Set[str] = set()
+    if not out_path.exists():
+        return done
+    with out_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if "payload" in rec:
+                done.add(rec["path"])
+    return done
+
+
+async def run_batch(
+    paths: Iterable[Path],
+    out_path: Path,
+    *,
+    engine: ExtractionEngine = shared_engine,
+    concurrency: Optional[int] = None,
+    use_cache: bool = True,
+    profile: Optional[ExtractionProfile] = None,
+    report: Optional[BatchReport] = None,
+    slot: Callable[[], AsyncContextManager] = nullcontext,
+) -> BatchReport:
+    """
+    Extract `paths` into `out_path`. Each extraction runs inside `slot()`, which the API
+    uses to share (and cap) the live jobs' extract slots on the shared engine.
+    """
+    paths = [Path(p) for p in paths]
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    report = report or BatchReport()
+    report.total = len(paths)
+    profile = profile or resolve_profile()
+
+    already = completed_paths(out_path)
+    todo = [p for p in paths if str(p) not in already]
+    report.skipped = len(paths) - len(todo)
+
+    sem = asyncio.Semaphore(max(1, concurrency or engine.workers))
+    write_lock = asyncio.Lock()
+
+    with out_path.open("a", encoding="utf-8") as out:
+        async def one(p: Path):
+            async with sem:
+                rec = {"path": str(p)}
+                try:
+                    content_hash = await asyncio.to_thread(hash_file, str(p))
+                    rec["content_hash"] = content_hash
+                    key = feature_cache.key(content_hash, profile)
+                    cached = await asyncio.to_thread(feature_cache.get, key) if use_cache else None
+                    if cached is not None:
+                        rec.update(payload=cached, cached=True)
+                        report.cached += 1
+                    else:
+                        async with slot():
+                            res = await engine.run(_extract_payload, str(p), content_hash, profile.name)
+                        observe_extract_timings(res["timings"])
+                        total = res["timings"]["total"]
+                        rec.update(payload=res["payload"], cpu_sec=total["cpu_sec"], wall_sec=total["wall_sec"])
+                        report.cpu_sec += total["cpu_sec"]
+                        if use_cache:
+                            await asyncio.to_thread(feature_cache.put, key, res["payload"])
+                    report.done += 1
+                except Exception as e:
+                    rec["error"] = f"{type(e).__name__}: {e}"
+                    report.failed += 1
+                    log.error(f"[batch] {p}: {rec['error']}")
+                async with write_lock:
+                    out.write(json.dumps(rec, separators=(",", ":")) + "\n")
+                    out.flush()
+                finished = report.done + report.failed
+                if finished % 10 == 0:
+                    log.info(f"[batch] {finished}/{len(todo)} {report.to_dict()['tracks_per_min']} tracks/min")
+
+        await asyncio.gather(*(one(p) for p in todo))
+
+    report.finished_at = time.time()
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.batch", description="Batch feature extraction to JSON Lines")
+    ap.add_argument("source", type=Path, help="directory of audio files or manifest (paths / JSONL with 'path')")
+    ap.add_argument("-o", "--output", type=Path, required=True, help="JSON Lines output (appended; enables resume)")
+    ap.add_argument("--workers", type=int, default=settings.EXTRACT_WORKERS, help="extraction processes")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and don't populate the feature cache")
+    ap.add_argument("--profile", choices=list(PROFILES), default=settings.DEFAULT_PROFILE, help="extraction profile")
+    args = ap.parse_args(argv)
+
+    paths = discover(args.source)
+    eng = ExtractionEngine(workers=args.workers)
+
+    async def _run():
+        try:
+            return await run_batch(paths, args.output, engine=eng, use_cache=not args.no_cache,
+                                   profile=PROFILES[args.profile])
+        finally:
+            eng.shutdown()
+
+    report = asyncio.run(_run())
+    print(json.dumps(report.to_dict(), indent=2))
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+# src/bench.py
+"""
+Reproducible benchmark for `audio_service.extract_features` with per-stage timings.
+
+    python -m app.bench                              # default synthetic matrix + real-audio smoke case
+    python -m app.bench --durations 30 360 --rates 44100 96000 --repeat 3
+    python -m app.bench --profile fast
+    python -m app.bench --durations 1800 --stream   # block-wise extraction (bounded memory)
+    python -m app.bench --save data/bench_baseline.json
+    python -m app.bench --compare data/bench_baseline.json --fail-over 20
+
+Synthetic tracks (clicks, sines, noise, a vocal-like formant tone) are generated
+with a fixed seed, so no assets are needed. Each stage reports median wall time,
+CPU time and peak RSS over `--repeat` runs after one warm-up run (numba JIT).
+"""
+from __future__ import annotations
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .constants import settings
+
+REAL_SMOKE = settings.BASE_DIR.parent / "audios" / "euro-bass-line-electro-buzz-loop_125bpm_A_minor.wav"
+DEFAULT_CASES = [(30, 44100), (120, 48000), (360, 44100), (60, 96000)]
+
+
+def synth_track(duration_sec: float, sr: int, bpm: float = 125.0, seed: int = 0) -> np.ndarray:
+    """Deterministic club-ish test signal: kick clicks, bass sine, hats, a pad sweep and a vocal-like tone."""
+    rng = np.random.default_rng(seed)
+    n = int(duration_sec * sr)
+    t = np.arange(n) / sr
+    y = np.zeros(n, dtype=np.float64)
+
+    beat = 60.0 / bpm
+    kick_len = int(0.08 * sr)
+    kick = np.sin(2 * np.pi * 55 * np.arange(kick_len) / sr) * np.exp(-np.arange(kick_len) / (0.02 * sr))
+    hat = rng.standard_normal(int(0.02 * sr)) * np.exp(-np.arange(int(0.02 * sr)) / (0.004 * sr))
+    for i, start in enumerate(np.arange(0, duration_sec, beat / 2)):
+        s = int(start * sr)
+        src = kick if i % 2 == 0 else 0.3 * hat
+        e = min(n, s + len(src))
+        y[s:e] += src[: e - s]
+
+    y += 0.25 * np.sin(2 * np.pi * 55 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * t / (beat * 4)))   # bass
+    y += 0.05 * np.sin(2 * np.pi * (440 + 220 * np.sin(2 * np.pi * t / 32)) * t)               # sweep
+    # vocal-ish: 220 Hz glottal-like pulse with formant AM, gated in 8-bar phrases
+    gate = (np.floor(t / (beat * 32)) % 2 == 1).astype(np.float64)
+    voice = np.sign(np.sin(2 * np.pi * 220 * t)) * (0.5 + 0.5 * np.sin(2 * np.pi * 5 * t))
+    y += 0.08 * gate * voice * np.sin(2 * np.pi * 800 * t)
+    y += 0.01 * rng.standard_normal(n)                                                          # noise floor
+    return (0.8 * y / max(1e-9, np.max(np.abs(y)))).astype(np.float32)
+
+
+def _run_case(path: str, repeat: int, profile: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    from .services.audio_service import extract_features
+    from .services.pcm_store import pcm_store
+    from .services.profiling import StageTimer
+
+    pcm_store.enabled = False  # measure real decoding every run
+    runs: List[Dict[str, Dict[str, float]]] = []
+    for i in range(repeat + 1):
+        timer = StageTimer(track_rss=True)
+        try:
+            with timer.stage("total"):
+                extract_features(path, timer=timer, profile=profile)
+        finally:
+            timer.close()
+        if i > 0:  # run 0 warms numba/FFT caches
+            runs.append(timer.as_dict())
+
+    stages: Dict[str, Dict[str, float]] = {}
+    for name in runs[0]:
+        stages[name] = {
+            metric: round(statistics.median(r[name][metric] for r in runs), 4)
+            for metric in runs[0][name]
+        }
+    return stages
+
+
+def run(cases, repeat: int, include_real: bool = True, profile: Optional[str] = None) -> dict:
+    import soundfile as sf
+    import librosa
+    from .services.extractor_config import extractor_fingerprint, resolve_profile
+
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for dur, sr in cases:
+            name = f"synth_{int(dur)}s_{sr // 1000 if sr % 1000 == 0 else sr / 1000:g}k"
+            path = str(Path(tmp) / f"{name}.wav")
+            sf.write(path, synth_track(dur, sr), sr, subtype="FLOAT")
+            print(f"[bench] {name} ...", file=sys.stderr)
+            results[name] = {"duration_sec": dur, "sample_rate": sr, "stages": _run_case(path, repeat, profile)}
+    if include_real and REAL_SMOKE.exists():
+        print(f"[bench] real_smoke ...", file=sys.stderr)
+        results["real_smoke"] = {"path": REAL_SMOKE.name, "stages": _run_case(str(REAL_SMOKE), repeat, profile)}
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "numpy": np.__version__,
+            "librosa": librosa.__version__,
+            "analysis_sr": settings.ANALYSIS_SR,
+            "profile": resolve_profile(profile).name,
+            "extractor_fingerprint": extractor_fingerprint(resolve_profile(profile)),
+            "stream_above_sec": settings.STREAM_ABOVE_SEC,
+            "repeat": repeat,
+        },
+        "cases": results,
+    }
+
+
+def compare(current: dict, baseline: dict, fail_over_pct: Optional[float] = None) -> bool:
+    """Print per-stage wall-time deltas vs a baseline; False if any stage regressed past the threshold."""
+    ok = True
+    print(f"{'case':<22} {'stage':<15} {'base s':>9} {'now s':>9} {'delta':>8}")
+    for case, cur in current["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        if not base:
+            print(f"{case:<22} (not in baseline)")
+            continue
+        for stage, rec in cur["stages"].items():
+            b = base["stages"].get(stage)
+            if not b:
+                continue
+            delta = (rec["wall_sec"] - b["wall_sec"]) / max(b["wall_sec"], 1e-9) * 100
+            flag = ""
+            if fail_over_pct is not None and delta > fail_over_pct and rec["wall_sec"] - b["wall_sec"] > 0.05:
+                flag, ok = "  REGRESSION", False
+            print(f"{case:<22} {stage:<15} {b['wall_sec']:>9.3f} {rec['wall_sec']:>9.3f} {delta:>+7.1f}%{flag}")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.bench", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--durations", type=float, nargs="*", help="synthetic durations (s); each is run at every --rates value")
+    ap.add_argument("--rates", type=int, nargs="*", help="synthetic sample rates (Hz); each is run at every --durations value")
+    ap.add_argument("--repeat", type=int, default=3, help="measured runs per case (after one warm-up)")
+    ap.add_argument("--profile", help="extraction profile (fast | standard | full); default DEFAULT_PROFILE")
+    ap.add_argument("--stream", action="store_true", help="force block-wise extraction (STREAM_ABOVE_SEC=0)")
+    ap.add_argument("--no-real", action="store_true", help="skip the bundled real-audio smoke case")
+    ap.add_argument("--save", type=Path, help="write results JSON (e.g. a new baseline)")
+    ap.add_argument("--compare", type=Path, help="baseline JSON to compare against")
+    ap.add_argument("--fail-over", type=float, help="exit 1 if any stage is slower than baseline by this %%")
+    args = ap.parse_args(argv)
+
+    if args.stream:
+        settings.STREAM_ABOVE_SEC = 0
+
+    if args.durations or args.rates:
+        durs = args.durations or [d for d, _ in DEFAULT_CASES]
+        rates = args.rates or [44100]
+        cases = [(d, r) for d in durs for r in rates]
+    else:
+        cases = DEFAULT_CASES
+
+    results = run(cases, args.repeat, include_real=not args.no_real, profile=args.profile)
+    print(json.dumps(results, indent=2))
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if not compare(results, baseline, args.fail_over):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
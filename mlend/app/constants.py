@@ -9,19 +9,88 @@ class Settings(BaseModel):
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     MODEL_NAME: str = os.getenv("MODEL_NAME","")
     ML_CALLBACK_SECRET: str = os.getenv("ML_CALLBACK_SECRET","" )
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+    # Shared LLM HTTP client pool
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_MAX_KEEPALIVE: int = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+    # reference jobs: sequential (compare, then feedback) | pipelined (both calls at once) | combined (one call)
+    LLM_COMPARE_MODE: str = os.getenv("LLM_COMPARE_MODE", "sequential")
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))  # per request; series trimmed to fit, 0 = no limit
 
     # Upload limits
     MAX_FILE_MB: int = int(os.getenv("MAX_FILE_MB", "100"))
-    MAX_DURATION_SEC: int = int(os.getenv("MAX_DURATION_SEC", "420"))  # <7 min
+    # in-memory analysis cap (<7 min). With streaming on (STREAM_ABOVE_SEC >= 0, the default) the
+    # longest accepted track is STREAM_MAX_DURATION_SEC instead; STREAM_ABOVE_SEC=-1 restores this cap
+    MAX_DURATION_SEC: int = int(os.getenv("MAX_DURATION_SEC", "420"))
+    OVERLONG_POLICY: str = os.getenv("OVERLONG_POLICY", "truncate")     # truncate | reject
+
+    # Decode
+    ANALYSIS_SR: int = int(os.getenv("ANALYSIS_SR", "22050"))             # 0 = native rate
+    ANALYSIS_RES_TYPE: str = os.getenv("ANALYSIS_RES_TYPE", "soxr_hq")
+    VOCAL_INTENSITY: str = os.getenv("VOCAL_INTENSITY", "spectral")       # standard profile: hpss | spectral (~20x faster)
+    DEFAULT_PROFILE: str = os.getenv("DEFAULT_PROFILE", "standard")        # fast | standard | full
+    # block-wise extraction past this many (decoded) seconds; 0 = always, <0 = never. Tracks longer than
+    # MAX_DURATION_SEC are always streamed (up to STREAM_MAX_DURATION_SEC) instead of truncated, unless streaming is off
+    STREAM_ABOVE_SEC: float = float(os.getenv("STREAM_ABOVE_SEC", "420"))
+    STREAM_MAX_DURATION_SEC: int = int(os.getenv("STREAM_MAX_DURATION_SEC", "3600"))  # DJ mixes / live sets
+    STREAM_BLOCK_SEC: float = float(os.getenv("STREAM_BLOCK_SEC", "30"))
+    EXTRACT_DEBUG: bool = os.getenv("EXTRACT_DEBUG", "0").lower() in ("1", "true", "yes")   # keep full onset/RMS series on AudioFeatures
+
+    # Extraction worker pool
+    EXTRACT_WORKERS: int = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+    EXTRACT_TIMEOUT_SEC: float = float(os.getenv("EXTRACT_TIMEOUT_SEC", "600"))
+    EXTRACT_MAX_JOBS_PER_WORKER: int = int(os.getenv("EXTRACT_MAX_JOBS_PER_WORKER", "20"))  # recycle to cap leaks
+    EXTRACT_WARMUP: bool = os.getenv("EXTRACT_WARMUP", "1").lower() in ("1", "true", "yes")  # prime each worker at startup
+
+    # Job queue
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "16"))                  # concurrent pipelines
+    JOB_MAX_QUEUE_DEPTH: int = int(os.getenv("JOB_MAX_QUEUE_DEPTH", "64"))  # queued + running before 429
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))         # restarts survived per job
+    EXTRACT_CONCURRENCY: int = int(os.getenv("EXTRACT_CONCURRENCY", str(os.cpu_count() or 1)))
+    LLM_CONCURRENCY: int = int(os.getenv("LLM_CONCURRENCY", "8"))
+    # batch API tracks extracting at once, on top of sharing the extract slots; the rest stay free for live jobs
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", str(max(1, (os.cpu_count() or 1) // 2))))
+
+    # Progress reporting
+    PROGRESS_TICK_SEC: float = float(os.getenv("PROGRESS_TICK_SEC", "3"))  # intermediate updates in long stages
+    PROGRESS_TERMINAL_RETRIES: int = int(os.getenv("PROGRESS_TERMINAL_RETRIES", "8"))  # completed/failed events
+    CALLBACK_MAX_CONNECTIONS: int = int(os.getenv("CALLBACK_MAX_CONNECTIONS", "20"))   # pooled progress/result client
 
     # Paths
     BASE_DIR: Path = Path(__file__).resolve().parent
     STORAGE_DIR: Path = BASE_DIR / "storage"
     UPLOADS_DIR: Path = STORAGE_DIR / "uploads"
     CLIPS_DIR: Path = STORAGE_DIR / "clips"
+    FEATURE_CACHE_DIR: Path = STORAGE_DIR / "feature_cache"
+    LLM_CACHE_DIR: Path = STORAGE_DIR / "llm_cache"
+    NUMBA_CACHE_DIR: Path = Path(os.getenv("NUMBA_CACHE_DIR", str(STORAGE_DIR / "numba_cache")))  # compiled JIT kernels
+    JOBS_DB_PATH: Path = STORAGE_DIR / "jobs.sqlite3"
+    PROGRESS_MODEL_PATH: Path = STORAGE_DIR / "progress_model.json"  # learned stage durations
+    BATCH_INPUT_DIR: Path = Path(os.getenv("BATCH_INPUT_DIR", str(STORAGE_DIR / "catalog")))  # batch API sources
+    BATCH_OUTPUT_DIR: Path = STORAGE_DIR / "batches"
+
+    # Feature cache (content hash + extractor version -> payload)
+    FEATURE_CACHE_ENABLED: bool = os.getenv("FEATURE_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+    FEATURE_CACHE_MAX_MB: int = int(os.getenv("FEATURE_CACHE_MAX_MB", "512"))
+
+    # LLM response cache (model + messages + sampling params + prompt version -> reply)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+    LLM_CACHE_TTL_SEC: int = int(os.getenv("LLM_CACHE_TTL_SEC", "86400"))  # replies older than this are re-requested
+    LLM_CACHE_MAX_MB: int = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+
+    # Decoded PCM store (memory-mapped float32 under CLIPS_DIR)
+    PCM_STORE_ENABLED: bool = os.getenv("PCM_STORE_ENABLED", "1").lower() in ("1", "true", "yes")
+    PCM_STORE_MAX_MB: int = int(os.getenv("PCM_STORE_MAX_MB", "2048"))
 
 settings = Settings()
 
 # Ensure dirs exist at import-time
 settings.UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 settings.CLIPS_DIR.mkdir(parents=True, exist_ok=True)
+settings.FEATURE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+settings.LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# numba reads this on first import (librosa, in the extraction workers), so kernels compiled once are
+# reused by every later process; `python -m app.warmup` at image build ships them with the deploy
+os.environ.setdefault("NUMBA_CACHE_DIR", str(settings.NUMBA_CACHE_DIR))
@@ -0,0 +1,353 @@
+# src/jobs.py
+from __future__ import annotations
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .constants import settings
+from .logger import get_logger
+
+log = get_logger("jobs")
+
+ACTIVE_STATUSES = ("queued", "processing")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    request_id  TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    stage       TEXT,
+    percent     INTEGER NOT NULL DEFAULT 0,
+    params      TEXT NOT NULL,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created_at);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id    TEXT PRIMARY KEY,
+    state       TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    report      TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+"""
+
+
+FailedHook = Callable[[str, Dict[str, Any], str], Awaitable[None]]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DuplicateJob(Exception):
+    pass
+
+
+class JobStore:
+    """
+    SQLite-backed job table (plus batch backfill status); survives restarts so pending work
+    can be resumed. Every call
+    blocks on a commit: from the event loop, go through JobQueue (which runs them in threads).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def enqueue(self, request_id: str, params: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT status FROM jobs WHERE request_id = ?", (request_id,)).fetchone()
+            if row and row["status"] in ACTIVE_STATUSES:
+                raise DuplicateJob(request_id)
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (request_id, status, stage, percent, params, attempts, created_at, updated_at) "
+                "VALUES (?, 'queued', 'queued', 0, ?, 0, ?, ?)",
+                (request_id, json.dumps(params), now, now),
+            )
+
+    def claim_next(self) -> Optional[tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT request_id, params FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE jobs SET status = 'processing', attempts = attempts + 1, updated_at = ? WHERE request_id = ?",
+                    (time.time(), row["request_id"]),
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return row["request_id"], json.loads(row["params"])
+
+    def update(self, request_id: str, *, only_active: bool = False, **fields: Any) -> None:
+        """Set columns on a job; `only_active` leaves a job that already finished untouched."""
+        if not fields:
+            return
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        where = "request_id = ? AND status IN ('queued', 'processing')" if only_active else "request_id = ?"
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {cols} WHERE {where}", (*fields.values(), request_id))
+
+    def report_many(self, reports: Dict[str, Dict[str, Any]]) -> None:
+        """Progress for several jobs in one transaction; "processing"/"queued" rows never revive a finished job."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for request_id, fields in reports.items():
+                    cols = ", ".join(f"{k} = ?" for k in fields)
+                    where = "request_id = ?"
+                    if fields.get("status") in ACTIVE_STATUSES:
+                        where += " AND status IN ('queued', 'processing')"
+                    self._db.execute(f"UPDATE jobs SET {cols}, updated_at = ? WHERE {where}",
+                                     (*fields.values(), now, request_id))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE request_id = ?", (request_id,)).fetchone()
+        return dict(row) if row else None
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'processing')"
+            ).fetchone()[0]
+
+    def position(self, request_id: str) -> Optional[int]:
+        """1-based position among queued jobs, or None if not queued."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= "
+                "(SELECT created_at FROM jobs WHERE request_id = ? AND status = 'queued')",
+                (request_id,),
+            ).fetchone()
+        return row[0] or None
+
+    def put_batch(self, batch_id: str, state: str, params: Dict[str, Any], report: Dict[str, Any]) -> None:
+        """Create or update a batch backfill's row (state, request and latest BatchReport)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO batches (batch_id, state, params, report, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(batch_id) DO UPDATE SET state = excluded.state, params = excluded.params, "
+                "report = excluded.report, updated_at = excluded.updated_at",
+                (batch_id, state, json.dumps(params), json.dumps(report), now, now),
+            )
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        return {**dict(row), "params": json.loads(row["params"]), "report": json.loads(row["report"])}
+
+    def recover(self, max_attempts: int) -> tuple[int, list[tuple[str, Dict[str, Any], str]]]:
+        """
+        Re-queue jobs interrupted by a restart; fail those out of attempts or missing their uploads.
+        Returns (requeued count, [(request_id, params, error)] of the jobs failed here). A failed
+        job's uploads are deleted: nothing will run it again.
+        """
+        requeued, failed = 0, []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT request_id, params, attempts FROM jobs WHERE status = 'processing'"
+            ).fetchall()
+            queued = self._db.execute("SELECT request_id, params, attempts FROM jobs WHERE status = 'queued'").fetchall()
+        for row in [*rows, *queued]:
+            params = json.loads(row["params"])
+            paths = [p for p in (params.get("main_path"), params.get("ref_path")) if p]
+            if row["attempts"] >= max_attempts:
+                error = "exceeded max attempts"
+            elif not all(os.path.exists(p) for p in paths):
+                error = "uploaded audio lost before processing"
+            else:
+                self.update(row["request_id"], status="queued", stage="queued", percent=0)
+                requeued += 1
+                continue
+            self.update(row["request_id"], status="failed", stage="failed", error=error)
+            for p in paths:
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    log.warning(f"[jobs] could not delete upload {p} of failed job {row['request_id']}: {e}")
+            failed.append((row["request_id"], params, error))
+        return requeued, failed
+
+
+class JobQueue:
+    """
+    Runs persisted jobs with a fixed number of async workers. Stage-level semaphores
+    (`async with job_queue.stage("extract")`) cap how many jobs decode/extract or call
+    the LLM at once, and `submit` refuses new work once the queue depth limit is hit.
+    Store calls run in worker threads; `report` only records the latest stage/percent per
+    job, and a flusher writes whatever accumulated in one transaction every `flush_sec`.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        *,
+        workers: int = settings.JOB_WORKERS,
+        max_depth: int = settings.JOB_MAX_QUEUE_DEPTH,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        stage_limits: Optional[Dict[str, int]] = None,
+        flush_sec: float = 0.5,
+    ):
+        self.store = store
+        self.flush_sec = flush_sec
+        self.workers = max(1, workers)
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.stage_limits = stage_limits or {
+            "extract": settings.EXTRACT_CONCURRENCY,
+            "llm": settings.LLM_CONCURRENCY,
+            "batch": settings.BATCH_CONCURRENCY,
+        }
+        self._runner: Optional[Callable[..., Awaitable[None]]] = None
+        self._on_failed: Optional[FailedHook] = None
+        self._stages: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._reports: Dict[str, Dict[str, Any]] = {}   # request_id -> latest unwritten progress
+        self._dirty: Optional[asyncio.Event] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def start(self, runner: Callable[..., Awaitable[None]], on_failed: Optional[FailedHook] = None) -> None:
+        """
+        Start the workers. `on_failed(request_id, params, error)` is called for each job that
+        recovery fails instead of re-queueing, since its runner will never report it.
+        """
+        self._runner = runner
+        self._on_failed = on_failed
+        self._wake = asyncio.Event()
+        self._dirty = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stages = {name: asyncio.Semaphore(max(1, n)) for name, n in self.stage_limits.items()}
+        recovered, failed = await asyncio.to_thread(self.store.recover, self.max_attempts)
+        if recovered:
+            log.info(f"[jobs] recovered {recovered} pending job(s) after restart")
+            self._wake.set()
+        if failed:
+            log.warning(f"[jobs] failed {len(failed)} unrecoverable job(s) after restart")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._flusher()))
+        if on_failed is not None:
+            self._tasks += [asyncio.create_task(on_failed(*job)) for job in failed]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    async def submit(self, request_id: str, params: Dict[str, Any]) -> None:
+        if await self.is_full():
+            raise QueueFull(f"queue depth limit {self.max_depth} reached")
+        await asyncio.to_thread(self.store.enqueue, request_id, params)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def is_full(self) -> bool:
+        return await self.depth() >= self.max_depth
+
+    async def depth(self) -> int:
+        return await asyncio.to_thread(self.store.depth)
+
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """A job's row, with any progress not yet flushed to the store applied."""
+        job = await asyncio.to_thread(self.store.get, request_id)
+        if job is not None:
+            job.update(self._reports.get(request_id, {}))
+        return job
+
+    async def position(self, request_id: str) -> Optional[int]:
+        return await asyncio.to_thread(self.store.position, request_id)
+
+    def report(self, request_id: str, *, percent: int, stage: str, status: str, error: Optional[str] = None) -> None:
+        fields: Dict[str, Any] = dict(percent=percent, stage=stage, status=status)
+        if error:
+            fields["error"] = error
+        pending = self._reports.get(request_id)
+        if pending and pending["status"] not in ACTIVE_STATUSES and status in ACTIVE_STATUSES:
+            return  # a late "processing" tick must never pull a completed/failed job back into the queue depth
+        self._reports[request_id] = fields
+        if self._dirty is not None:
+            self._dirty.set()
+
+    async def flush(self) -> None:
+        """Write the coalesced progress reports to the store (in report order across flushes)."""
+        async with self._flush_lock:
+            reports, self._reports = self._reports, {}
+            if reports:
+                await asyncio.to_thread(self.store.report_many, reports)
+
+    async def _flusher(self) -> None:
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error(f"[jobs] progress flush failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(self.flush_sec)
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        sem = self._stages.get(name)
+        if sem is None:
+            yield
+            return
+        async with sem:
+            yield
+
+    async def _worker(self, idx: int) -> None:
+        while True:
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            request_id, params = job
+            try:
+                await self._runner(**params)
+            except asyncio.CancelledError:
+                raise  # shutting down: leave the job 'processing' so recover() picks it up
+            except Exception as e:
+                log.error(f"[jobs] worker {idx} job {request_id} crashed: {type(e).__name__}: {e}")
+                self.report(request_id, percent=100, stage="failed", status="failed", error=f"{type(e).__name__}: {e}")
+            else:
+                row = await self.get(request_id)
+                if row and row["status"] in ACTIVE_STATUSES:
+                    self.report(request_id, percent=100, stage="completed", status="completed")
+
+
+job_queue = JobQueue(JobStore(settings.JOBS_DB_PATH))
@@ -0,0 +1,199 @@
+# src/metrics.py
+"""
+Minimal in-process Prometheus-style metrics (text exposition format 0.0.4).
+
+Extraction runs in worker processes, so workers hand their stage timings back with
+the payload and the parent records them; everything here lives in the API process.
+"""
+from __future__ import annotations
+import math
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+LabelKey = Tuple[str, ...]
+
+
+def _fmt_labels(names: Tuple[str, ...], values: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_num(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> str:
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n" + "".join(self._samples())
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.label_names, key)} {_fmt_num(v)}\n"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[LabelKey, float] = {}
+        self._fn: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        """Compute the (unlabelled) value at scrape time."""
+        self._fn = fn
+
+    def _samples(self):
+        if self._fn is not None:
+            try:
+                yield f"{self.name} {_fmt_num(self._fn())}\n"
+            except Exception:
+                pass
+            return
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.label_names, key)} {_fmt_num(v)}\n"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *a, buckets: Iterable[float] = LATENCY_BUCKETS, **kw):
+        super().__init__(*a, **kw)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelKey, list] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(c), self._sums[k]) for k, c in self._counts.items()]
+        for key, counts, total in items:
+            for b, c in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_fmt_labels(self.label_names, key, ('le', _fmt_num(b)))} {c}\n"
+            yield f"{self.name}_sum{_fmt_labels(self.label_names, key)} {_fmt_num(total)}\n"
+            yield f"{self.name}_count{_fmt_labels(self.label_names, key)} {counts[-1]}\n"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "".join(m.render() for m in self._metrics.values())
+
+
+REGISTRY = Registry()
+
+# ---- pipeline ----
+PIPELINE_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "mlend_pipeline_stage_seconds", "Wall time per feedback pipeline stage", ["stage"]))
+JOBS_TOTAL = REGISTRY.register(Counter(
+    "mlend_jobs_total", "Feedback jobs finished, by outcome", ["status"]))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "mlend_queue_depth", "Jobs queued or running"))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "mlend_startup_seconds", "Cold-start cost by phase (import, llm, workers, worker_import, worker_warmup)", ["phase"]))
+FEATURE_CACHE_TOTAL = REGISTRY.register(Counter(
+    "mlend_feature_cache_requests_total", "Feature cache lookups", ["result"]))
+
+# ---- extraction (timings reported back by workers) ----
+EXTRACT_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "mlend_extract_stage_seconds", "Wall time per extract_features sub-step", ["stage"]))
+EXTRACT_CPU_SECONDS = REGISTRY.register(Counter(
+    "mlend_extract_cpu_seconds_total", "Worker CPU time spent in extract_features sub-steps", ["stage"]))
+
+# ---- LLM ----
+LLM_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "mlend_llm_request_seconds", "LLM call latency including retries", ["call_type", "model"]))
+LLM_TOKENS_TOTAL = REGISTRY.register(Counter(
+    "mlend_llm_tokens_total", "LLM tokens used", ["call_type", "model", "kind"]))
+LLM_COST_USD_TOTAL = REGISTRY.register(Counter(
+    "mlend_llm_cost_usd_total", "Estimated LLM spend (calculate_text_model_cost)", ["call_type", "model"]))
+LLM_RETRIES_TOTAL = REGISTRY.register(Counter(
+    "mlend_llm_retries_total", "LLM call retries", ["call_type", "reason"]))
+LLM_PHASE_SECONDS = REGISTRY.register(Histogram(
+    "mlend_llm_phase_seconds", "Wall time from a job's first LLM call to its final feedback", ["mode"]))
+LLM_PHASE_COST_USD = REGISTRY.register(Histogram(
+    "mlend_llm_phase_cost_usd", "Estimated LLM spend per job", ["mode"],
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)))
+LLM_CACHE_TOTAL = REGISTRY.register(Counter(
+    "mlend_llm_cache_requests_total", "LLM response cache lookups (hit/miss/expired/bypass)", ["call_type", "result"]))
+
+# ---- callbacks ----
+CALLBACK_RETRIES_TOTAL = REGISTRY.register(Counter(
+    "mlend_callback_retries_total", "Retries posting progress/result callbacks", ["kind"]))
+PROGRESS_UPDATES_TOTAL = REGISTRY.register(Counter(
+    "mlend_progress_updates_total", "Progress updates by outcome (sent/coalesced/dropped/failed)", ["result"]))
+
+
+def observe_extract_timings(timings: Dict[str, Dict[str, float]]) -> None:
+    for stage, rec in timings.items():
+        EXTRACT_STAGE_SECONDS.observe(rec["wall_sec"], stage=stage)
+        EXTRACT_CPU_SECONDS.inc(rec["cpu_sec"], stage=stage)
+
+
+def observe_llm_usage(call_type: str, model: str, usage: dict, cost: Optional[float]) -> None:
+    LLM_TOKENS_TOTAL.inc(usage.get("prompt_tokens", 0) or 0, call_type=call_type, model=model, kind="prompt")
+    LLM_TOKENS_TOTAL.inc(usage.get("completion_tokens", 0) or 0, call_type=call_type, model=model, kind="completion")
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+    if cached:
+        LLM_TOKENS_TOTAL.inc(cached, call_type=call_type, model=model, kind="prompt_cached")
+    if cost:
+        LLM_COST_USD_TOTAL.inc(cost, call_type=call_type, model=model)
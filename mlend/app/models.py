@@ -44,15 +44,21 @@ class FeedbackMetadata(BaseModel):
     transients_info: List[float]                    # [t,...]
     silence_segments: List[Dict[str, Any]]          # [{start,end,label}]
 
-    # Vocals
-    vocal_timestamps: List[TimeRange]               # [{start,end}]
+    # Vocals (absent when the extraction profile skips them)
+    vocal_timestamps: Optional[List[TimeRange]] = None      # [{start,end}]
     vocal_intensity: Optional[float] = None
 
-    # Structure & FX
-    drop_timestamps: List[float]
-    structure_segments: List[StructureSeg]
-    structure: str
-    fx_and_transitions: List[FxEvent]
+    # Structure & FX (absent when the extraction profile skips them)
+    drop_timestamps: Optional[List[float]] = None
+    structure_segments: Optional[List[StructureSeg]] = None
+    structure: Optional[str] = None
+    fx_and_transitions: Optional[List[FxEvent]] = None
+
+    # Decode
+    sample_rate: Optional[int] = None               # original file rate
+    analysis_sample_rate: Optional[int] = None      # rate features were computed at
+    truncated: bool = False                         # analysis stopped at the duration limit
+    profile: Optional[str] = None                   # extraction profile (fast | standard | full)
 
 class LLMUsage(BaseModel):
     model: str
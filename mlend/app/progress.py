@@ -1,15 +1,23 @@
 # src/progress.py
 from __future__ import annotations
-from typing import Optional, Dict
+from typing import Awaitable, Callable, Optional, Dict, List, NamedTuple, Tuple, Union
+from pathlib import Path
 import httpx
 import asyncio
 import json
+import math
+import os
+import threading
+import time
+from collections import deque
 from .constants import settings
+from .services.decode import duration_limit
 from .logger import get_logger
+from .metrics import CALLBACK_RETRIES_TOTAL, JOBS_TOTAL, PIPELINE_STAGE_SECONDS, PROGRESS_UPDATES_TOTAL
 
 log = get_logger("progress")
 
-# For this pipeline we report discrete stages; weights are illustrative if you later compute % automatically.
+# Relative stage cost for a typical job; only a cold-start prior for ProgressEstimator.
 STAGE_WEIGHTS = {
     "received": 0.05,
     "extracting_main": 0.30,
@@ -24,6 +32,279 @@ STAGE_WEIGHTS = {
 def clamp_pct(pct: int) -> int:
     return max(0, min(100, int(pct)))
 
+
+# STAGE_WEIGHTS read as fractions of a typical job: a ~4 min track taking ~60 s end to end.
+PRIOR_JOB_SEC = 60.0
+PRIOR_TRACK_SEC = 240.0
+# Extraction time scales with the audio analysed; the other stages cost about the same per job.
+EXTRACT_STAGES = ("extracting_main", "extracting_reference")
+REFERENCE_RATE = 22050
+
+
+def work_units(duration_sec: Optional[float], sample_rate: Optional[int]) -> float:
+    """Audio seconds that extraction will analyse, normalised to a 22.05 kHz analysis rate."""
+    if not duration_sec:
+        return PRIOR_TRACK_SEC
+    rate = settings.ANALYSIS_SR or sample_rate or REFERENCE_RATE
+    return min(duration_sec, duration_limit()) * rate / REFERENCE_RATE
+
+
+class ProgressEstimator:
+    """
+    Predicts stage durations from rolling history: an EWMA of seconds per work unit for
+    extraction stages and of plain seconds for the rest. Stages with no history fall back
+    to STAGE_WEIGHTS. The model is persisted so restarts keep what they learned: `observe`
+    only updates memory, `flush` writes it out (trackers flush once per job, off the loop).
+    """
+
+    def __init__(self, path: Optional[Path] = None, alpha: float = 0.2):
+        self.path = Path(path) if path else None
+        self.alpha = alpha
+        self._rates: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()   # one writer at a time, each with the latest state
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._rates = {k: float(v) for k, v in data.get("rates", {}).items()}
+            self._counts = {k: int(v) for k, v in data.get("counts", {}).items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            log.warning(f"[progress] ignoring unreadable model {self.path}: {e}")
+
+    def flush(self) -> None:
+        """Persist the model if it changed since the last flush. Blocking; call from a worker thread."""
+        if not self.path:
+            return
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                blob = json.dumps({"rates": self._rates, "counts": self._counts})
+                self._dirty = False
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                tmp.write_text(blob, encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                log.warning(f"[progress] could not persist model: {e}")
+
+    @staticmethod
+    def prior(stage: str) -> float:
+        sec = STAGE_WEIGHTS.get(stage, 0.05) * PRIOR_JOB_SEC
+        return sec / PRIOR_TRACK_SEC if stage in EXTRACT_STAGES else sec
+
+    @staticmethod
+    def _key(stage: str, variant: Optional[str]) -> str:
+        # extraction cost depends on the extraction profile, so each one learns its own rate
+        return f"{stage}/{variant}" if variant and stage in EXTRACT_STAGES else stage
+
+    def expected_sec(self, stage: str, units: float = PRIOR_TRACK_SEC, variant: Optional[str] = None) -> float:
+        rate = self._rates.get(self._key(stage, variant)) or self._rates.get(stage) or self.prior(stage)
+        return rate * units if stage in EXTRACT_STAGES else rate
+
+    def observe(self, stage: str, seconds: float, units: float = PRIOR_TRACK_SEC, variant: Optional[str] = None) -> None:
+        value = seconds / max(units, 1e-6) if stage in EXTRACT_STAGES else seconds
+        key = self._key(stage, variant)
+        with self._lock:
+            old = self._rates.get(key)
+            self._rates[key] = value if old is None else old + self.alpha * (value - old)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._dirty = True
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {s: {"rate": round(r, 5), "samples": self._counts.get(s, 0)} for s, r in self._rates.items()}
+
+
+progress_estimator = ProgressEstimator(settings.PROGRESS_MODEL_PATH)
+
+SendFn = Callable[[int, str, str, Optional[dict]], Awaitable[None]]
+
+
+class StageGroup(NamedTuple):
+    """Stages that run concurrently: reported as `name`, sized by the slowest part, learned per part."""
+    name: str
+    parts: Tuple[str, ...]
+
+
+Stage = Union[str, StageGroup]
+
+
+class ProgressTracker:
+    """
+    Drives one job's progress bar. Each stage gets a share of the remaining percent in
+    proportion to its predicted duration, and a ticker advances the bar inside long
+    stages (extraction, LLM waits) without reaching the next stage's start. Measured
+    stage durations feed the estimator and the pipeline stage histogram.
+    """
+
+    def __init__(
+        self,
+        send: SendFn,
+        stages: List[Stage],
+        units: Optional[Dict[str, float]] = None,
+        *,
+        variant: Optional[str] = None,
+        estimator: ProgressEstimator = progress_estimator,
+        tick_sec: float = settings.PROGRESS_TICK_SEC,
+    ):
+        self.send = send
+        self.stages = list(stages)
+        self.units = dict(units or {})
+        self.variant = variant                  # e.g. the extraction profile
+        self.estimator = estimator
+        self.tick_sec = tick_sec
+        self.percent = 0
+        self._stage: Optional[Stage] = None
+        self._parts: Dict[str, str] = {}        # part -> running | done, inside a StageGroup
+        self._sample = True
+        self._span = (0.0, 0.0, 1.0)            # start %, end %, expected seconds
+        self._job_started = self._stage_started = time.perf_counter()
+        self._ticker: Optional[asyncio.Task] = None
+
+    def _expected(self, stage: Stage) -> float:
+        if isinstance(stage, StageGroup):
+            return max((self._expected(p) for p in stage.parts), default=0.0)
+        return self.estimator.expected_sec(stage, self.units.get(stage, PRIOR_TRACK_SEC), self.variant)
+
+    @property
+    def _label(self) -> Optional[str]:
+        return self._stage.name if isinstance(self._stage, StageGroup) else self._stage
+
+    def _meta(self, elapsed: float) -> dict:
+        meta = {"eta_sec": round(self._remaining_sec(elapsed), 1)}
+        if self._parts:
+            meta["parts"] = dict(self._parts)
+        return meta
+
+    def _remaining_sec(self, elapsed: float) -> float:
+        i = self.stages.index(self._stage) if self._stage in self.stages else len(self.stages)
+        rest = sum(self._expected(s) for s in self.stages[i + 1:])
+        return max(0.0, self._span[2] - elapsed) + rest
+
+    def skip_sample(self) -> None:
+        """Don't learn from the current stage's duration (e.g. it was served from cache)."""
+        self._sample = False
+
+    def _close_stage(self, now: float) -> None:
+        if self._stage is None:
+            return
+        seconds = now - self._stage_started
+        PIPELINE_STAGE_SECONDS.observe(seconds, stage=self._label)
+        if isinstance(self._stage, StageGroup):
+            return  # parts were timed in part_done
+        if self._sample:
+            self.estimator.observe(self._stage, seconds, self.units.get(self._stage, PRIOR_TRACK_SEC), self.variant)
+
+    async def _stop_ticker(self) -> None:
+        if self._ticker is not None:
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+            self._ticker = None
+
+    async def close(self) -> None:
+        """Stop the ticker when a job ends without `finish`. Safe to call more than once, or after `finish`."""
+        await self._stop_ticker()
+
+    async def enter(self, stage: Stage) -> None:
+        await self._stop_ticker()
+        now = time.perf_counter()
+        self._close_stage(now)
+        self._stage, self._stage_started, self._sample = stage, now, True
+        self._parts = {p: "running" for p in stage.parts} if isinstance(stage, StageGroup) else {}
+
+        expected = self._expected(stage)
+        i = self.stages.index(stage) if stage in self.stages else len(self.stages)
+        remaining = expected + sum(self._expected(s) for s in self.stages[i + 1:])
+        start = float(self.percent)
+        end = start + (99 - start) * expected / max(remaining, 1e-6)
+        self._span = (start, end, expected)
+
+        await self.send(self.percent, self._label, "processing", self._meta(0.0))
+        if self.tick_sec > 0 and end - start >= 2:
+            self._ticker = asyncio.create_task(self._tick())
+
+    async def part_done(self, part: str, *, sample: bool = True) -> None:
+        """One part of the current StageGroup finished; `sample=False` for cache hits."""
+        seconds = time.perf_counter() - self._stage_started
+        PIPELINE_STAGE_SECONDS.observe(seconds, stage=part)
+        if sample:
+            self.estimator.observe(part, seconds, self.units.get(part, PRIOR_TRACK_SEC), self.variant)
+        self._parts[part] = "done"
+        await self.send(self.percent, self._label, "processing", self._meta(seconds))
+
+    async def _tick(self) -> None:
+        start, end, expected = self._span
+        while True:
+            await asyncio.sleep(self.tick_sec)
+            elapsed = time.perf_counter() - self._stage_started
+            frac = elapsed / max(expected, 1e-6)
+            # linear up to 90% of the span, then an asymptotic creep for overruns
+            eased = 0.9 * frac if frac < 1 else 0.9 + 0.09 * (1 - math.exp(1 - frac))
+            pct = int(start + (end - start) * eased)
+            if pct > self.percent:
+                self.percent = pct
+                await self.send(pct, self._label, "processing", self._meta(elapsed))
+
+    async def finish(self, status: str, meta: Optional[dict] = None) -> None:
+        await self._stop_ticker()
+        now = time.perf_counter()
+        if status != "completed":
+            self._sample = False
+        self._close_stage(now)
+        PIPELINE_STAGE_SECONDS.observe(now - self._job_started, stage="total")
+        JOBS_TOTAL.inc(status=status)
+        self._stage, self.percent = status, 100
+        await asyncio.to_thread(self.estimator.flush)
+        await self.send(100, status, status, meta)
+
+# One pooled client for progress + result callbacks (keep-alive, no handshake per post).
+_callback_client: Optional[httpx.AsyncClient] = None
+
+
+def get_callback_client() -> httpx.AsyncClient:
+    global _callback_client
+    if _callback_client is None or _callback_client.is_closed:
+        _callback_client = httpx.AsyncClient(
+            timeout=15,
+            limits=httpx.Limits(
+                max_connections=settings.CALLBACK_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CALLBACK_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+    return _callback_client
+
+
+def _progress_payload(percent: int, stage: str, meta: Optional[Dict], status: Optional[str]) -> dict:
+    return {
+        "percent": clamp_pct(percent),
+        "stage": stage,
+        "meta": meta or {},
+        "status": status or "processing",
+    }
+
+
+async def _post_once(url: str, payload: dict, secret: Optional[str], client: Optional[httpx.AsyncClient] = None) -> None:
+    headers = {"x-ml-secret": (secret or settings.ML_CALLBACK_SECRET)}
+    resp = await (client or get_callback_client()).post(url, json=payload, headers=headers)
+    if resp.status_code >= 400:
+        log.error(f"[progress] HTTP {resp.status_code} POST {url} text={resp.text[:300]}")
+        resp.raise_for_status()
+    log.info(f"[progress] OK {resp.status_code} POST {url}")
+
+
 async def post_progress(
     progress_url: Optional[str],
     secret: Optional[str],
@@ -36,33 +317,141 @@ async def post_progress(
     backoff_base: float = 1.0,
     verify_tls: bool = True,
 ) -> None:
+    """Send one update now, awaiting delivery. Pipelines should use `progress_dispatcher.publish`."""
     if not progress_url:
         log.warning("[progress] skipped: empty progress_url")
         return
 
-    payload = {
-        "percent": clamp_pct(percent),
-        "stage": stage,
-        "meta": meta or {},
-        "status": status or "processing",
-    }
-    headers = {"x-ml-secret": (secret or settings.ML_CALLBACK_SECRET)}
-
+    payload = _progress_payload(percent, stage, meta, status)
     log.info(f"[progress] POST {progress_url} body={json.dumps(payload)[:200]} headers={{'x-ml-secret': '***'}}")
 
     for attempt in range(1, retries + 1):
         try:
-            async with httpx.AsyncClient(timeout=15, verify=verify_tls) as client:
-                resp = await client.post(progress_url, json=payload, headers=headers)
-                if resp.status_code >= 400:
-                    log.error(f"[progress] HTTP {resp.status_code} POST {progress_url} text={resp.text[:300]}")
-                    resp.raise_for_status()
-                else:
-                    log.info(f"[progress] OK {resp.status_code} POST {progress_url}")
-                return
+            if verify_tls:
+                await _post_once(progress_url, payload, secret)
+            else:
+                async with httpx.AsyncClient(timeout=15, verify=False) as client:
+                    await _post_once(progress_url, payload, secret, client)
+            return
         except Exception as e:
             log.error(f"[progress] attempt {attempt}/{retries} failed: {e}")
             if attempt == retries:
                 log.critical(f"[progress] giving up POST {progress_url}")
                 return
+            CALLBACK_RETRIES_TOTAL.inc(kind="progress")
             await asyncio.sleep(backoff_base * attempt)
+
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class ProgressDispatcher:
+    """
+    Fire-and-forget progress delivery. `publish` never waits on the network: each
+    request_id gets one sender task, and "processing" updates coalesce so only the
+    latest is sent. An update still being retried is dropped once a newer one arrives.
+    Terminal events (completed/failed) queue behind the update in flight and are
+    retried harder. `aclose` waits for them before the client closes.
+    """
+
+    def __init__(
+        self,
+        *,
+        retries: int = 3,
+        terminal_retries: int = settings.PROGRESS_TERMINAL_RETRIES,
+        backoff_base: float = 1.0,
+    ):
+        self.retries = retries
+        self.terminal_retries = terminal_retries
+        self.backoff_base = backoff_base
+        self._latest: Dict[str, tuple] = {}
+        self._terminal: Dict[str, deque] = {}
+        self._senders: Dict[str, asyncio.Task] = {}
+
+    def publish(
+        self,
+        request_id: str,
+        progress_url: Optional[str],
+        secret: Optional[str],
+        *,
+        percent: int,
+        stage: str,
+        status: Optional[str] = None,
+        meta: Optional[Dict] = None,
+    ) -> None:
+        if not progress_url:
+            return
+        item = (progress_url, secret, _progress_payload(percent, stage, meta, status))
+        if (status or "processing") in TERMINAL_STATUSES:
+            if self._latest.pop(request_id, None) is not None:
+                PROGRESS_UPDATES_TOTAL.inc(result="coalesced")
+            self._terminal.setdefault(request_id, deque()).append(item)
+        elif self._terminal.get(request_id):
+            PROGRESS_UPDATES_TOTAL.inc(result="dropped")  # late update after the job ended
+            return
+        else:
+            if self._latest.get(request_id) is not None:
+                PROGRESS_UPDATES_TOTAL.inc(result="coalesced")
+            self._latest[request_id] = item
+        if request_id not in self._senders:
+            self._senders[request_id] = asyncio.create_task(self._drain(request_id))
+
+    def _superseded(self, request_id: str) -> bool:
+        return request_id in self._latest or bool(self._terminal.get(request_id))
+
+    async def _drain(self, request_id: str) -> None:
+        try:
+            while True:
+                item = self._latest.pop(request_id, None)
+                if item is not None:
+                    await self._deliver(request_id, item, terminal=False)
+                    continue
+                queue = self._terminal.get(request_id)
+                if not queue:
+                    break
+                await self._deliver(request_id, queue[0], terminal=True)
+                queue.popleft()
+        finally:
+            self._senders.pop(request_id, None)
+            if not self._terminal.get(request_id):
+                self._terminal.pop(request_id, None)
+
+    async def _deliver(self, request_id: str, item: tuple, *, terminal: bool) -> None:
+        url, secret, payload = item
+        retries = self.terminal_retries if terminal else self.retries
+        for attempt in range(1, retries + 1):
+            try:
+                await _post_once(url, payload, secret)
+                PROGRESS_UPDATES_TOTAL.inc(result="sent")
+                return
+            except Exception as e:
+                log.error(f"[progress] {request_id} attempt {attempt}/{retries} failed: {e}")
+                if attempt == retries:
+                    log.critical(f"[progress] giving up {payload['status']} POST {url}")
+                    PROGRESS_UPDATES_TOTAL.inc(result="failed")
+                    return
+                CALLBACK_RETRIES_TOTAL.inc(kind="progress")
+                if terminal:
+                    await asyncio.sleep(min(30.0, self.backoff_base * 2 ** (attempt - 1)))
+                else:
+                    await asyncio.sleep(self.backoff_base * attempt)
+                    if self._superseded(request_id):
+                        PROGRESS_UPDATES_TOTAL.inc(result="coalesced")
+                        return
+
+    async def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait for everything published so far to be delivered (or given up)."""
+        if self._senders:
+            await asyncio.wait(list(self._senders.values()), timeout=timeout)
+
+    async def aclose(self, timeout: float = 30.0) -> None:
+        global _callback_client
+        await self.flush(timeout)
+        for task in list(self._senders.values()):
+            task.cancel()
+        if _callback_client is not None:
+            await _callback_client.aclose()
+            _callback_client = None
+
+
+progress_dispatcher = ProgressDispatcher()
@@ -0,0 +1,199 @@
+# src/prompt_encoder.py
+"""
+Compact, token-budgeted rendering of feature payloads for prompts.
+
+Floats are quantised, lists of records become columnar arrays and JSON is written
+without whitespace. When a prompt is over its token budget the time series are
+thinned, then summarised, then dropped, lowest priority first (`TRIM_ORDER`), until
+it fits.
+"""
+from __future__ import annotations
+import json
+import math
+from typing import Callable, Dict, List, Optional
+
+from .logger import get_logger
+
+log = get_logger("prompt_encoder")
+
+# Trimmed first -> last; everything else in the payload is scalars and always kept.
+TRIM_ORDER = (
+    "silence_segments",
+    "transients_info",
+    "fx_and_transitions",
+    "energy_profile",
+    "vocal_timestamps",
+    "drop_timestamps",
+    "structure_segments",
+)
+
+# Detail levels: 0 full, 1..MAX_THIN keep ~1/2**level of the points, then a summary, then omitted.
+MAX_THIN = 3
+SUMMARY = MAX_THIN + 1
+OMITTED = SUMMARY + 1
+OMITTED_TEXT = "omitted to fit the prompt budget"
+
+TIME_KEYS = {"t", "start", "end"}   # seconds, kept to 10 ms
+SIG_DIGITS = 4                      # everything else
+
+Levels = Dict[str, int]
+
+
+def quantise(x, key: Optional[str] = None):
+    """Round floats (recursively) to what the model can use: 10 ms for times, 4 significant digits otherwise."""
+    if isinstance(x, bool) or x is None or isinstance(x, (int, str)):
+        return x
+    if isinstance(x, float):
+        if not math.isfinite(x):
+            return None
+        q = round(x, 2) if key in TIME_KEYS else float(f"{x:.{SIG_DIGITS}g}")
+        return int(q) if q.is_integer() else q
+    if isinstance(x, dict):
+        return {k: quantise(v, k) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [quantise(v, key) for v in x]
+    return x
+
+
+def compact_json(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _columns(rows: List[dict]) -> dict:
+    """[{"t": 1.0, "rms": 0.2}, ...] -> {"t": [1.0, ...], "rms": [0.2, ...]}"""
+    keys = list(rows[0]) if rows else []
+    return {k: [quantise(r.get(k), k) for r in rows] for k in keys}
+
+
+def _keep_top(rows: list, n: int, weight: Callable[[dict], float]) -> list:
+    """The `n` heaviest rows, in their original (time) order."""
+    idx = sorted(sorted(range(len(rows)), key=lambda i: weight(rows[i]), reverse=True)[:n])
+    return [rows[i] for i in idx]
+
+
+def _keep(n: int, level: int) -> int:
+    return max(1, math.ceil(n / 2 ** level))
+
+
+def _series(rows: List[dict]) -> dict:
+    """Columnar, with evenly spaced times (within 5% of the step) sent as t0/dt instead of a "t" column."""
+    cols = _columns(rows)
+    t = [r["t"] for r in rows]
+    if len(t) > 2:
+        dt = (t[-1] - t[0]) / (len(t) - 1)
+        if dt > 0 and all(abs(b - a - dt) <= 0.05 * dt for a, b in zip(t, t[1:])):
+            del cols["t"]
+            return {"t0": quantise(t[0], "t"), "dt": quantise(dt), **cols}
+    return cols
+
+
+def _energy(rows: List[dict], level: int):
+    if level == 0:
+        return _series(rows)
+    if level <= MAX_THIN:
+        # max-pool so drops and peaks survive the thinning
+        step = 2 ** level
+        return _series([{"t": rows[i]["t"], "rms": max(r["rms"] for r in rows[i:i + step])}
+                        for i in range(0, len(rows), step)])
+    rms = [r["rms"] for r in rows]
+    peak = max(range(len(rms)), key=rms.__getitem__)
+    return quantise({"points": len(rms), "min": min(rms), "mean": sum(rms) / len(rms), "max": rms[peak],
+                     "peak_t": rows[peak]["t"]})
+
+
+def _events(times: List[float], level: int):
+    if level == 0:
+        return quantise(times, "t")
+    if level <= MAX_THIN:
+        return quantise(times[::2 ** level], "t")
+    gaps = sorted(b - a for a, b in zip(times, times[1:]))
+    return quantise({"count": len(times), "first": times[0], "last": times[-1],
+                     "median_gap": gaps[len(gaps) // 2] if gaps else None})
+
+
+def _segments(rows: List[dict], level: int):
+    if level == 0:
+        return _columns(rows)
+    if level <= MAX_THIN:
+        return _columns(_keep_top(rows, _keep(len(rows), level), lambda r: r["end"] - r["start"]))
+    summary = {"count": len(rows), "total_sec": sum(r["end"] - r["start"] for r in rows)}
+    if "label" in rows[0]:
+        labels: Dict[str, int] = {}
+        for r in rows:
+            labels[r["label"]] = labels.get(r["label"], 0) + 1
+        summary["labels"] = labels
+    return quantise(summary)
+
+
+def _fx(rows: List[dict], level: int):
+    if level == 0:
+        return _columns(rows)
+    if level <= MAX_THIN:
+        return _columns(_keep_top(rows, _keep(len(rows), level), lambda r: r.get("confidence") or 0.0))
+    types: Dict[str, int] = {}
+    for r in rows:
+        types[r["type"]] = types.get(r["type"], 0) + 1
+    return {"count": len(rows), "types": types}
+
+
+ENCODERS: Dict[str, Callable[[list, int], object]] = {
+    "energy_profile": _energy,
+    "transients_info": _events,
+    "drop_timestamps": _events,
+    "silence_segments": _segments,
+    "vocal_timestamps": _segments,
+    "structure_segments": _segments,
+    "fx_and_transitions": _fx,
+}
+
+
+def encode_field(name: str, value, level: int = 0):
+    """One payload field at a detail level (a JSON-able value, or OMITTED_TEXT)."""
+    if level >= OMITTED:
+        return OMITTED_TEXT
+    encoder = ENCODERS.get(name)
+    if encoder is None or not isinstance(value, list) or not value:
+        return quantise(value)
+    return encoder(value, level)
+
+
+def encode_metadata(metadata: dict, levels: Optional[Levels] = None) -> dict:
+    levels = levels or {}
+    return {k: encode_field(k, v, levels.get(k, 0)) for k, v in metadata.items()}
+
+
+def template_fields(metadata: dict, levels: Optional[Levels] = None) -> Dict[str, str]:
+    """`encode_metadata` with every non-string value as compact JSON, for `str.format` templates."""
+    return {k: v if isinstance(v, str) else compact_json(v)
+            for k, v in encode_metadata(metadata, levels).items()}
+
+
+def fit_budget(
+    build: Callable[[Levels], List[dict]],
+    *,
+    count_tokens: Optional[Callable[[str], int]],
+    budget: int,
+) -> List[dict]:
+    """
+    Messages from `build(levels)`, lowering detail one level at a time (every field at
+    a level, lowest priority first) until the prompt is within `budget` tokens.
+    """
+    levels: Levels = {name: 0 for name in TRIM_ORDER}
+    messages = build(levels)
+    if not budget or count_tokens is None:
+        return messages
+
+    def size(msgs: List[dict]) -> int:
+        return sum(count_tokens(m["content"]) for m in msgs)
+
+    tokens = size(messages)
+    for level in range(1, OMITTED + 1):
+        for name in TRIM_ORDER:
+            if tokens <= budget:
+                return messages
+            levels[name] = level
+            messages = build(levels)
+            tokens = size(messages)
+    if tokens > budget:
+        log.warning(f"[prompt] {tokens} tokens after trimming every series (budget {budget})")
+    return messages
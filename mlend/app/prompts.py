@@ -1,4 +1,9 @@
 import json
+from typing import Callable, Optional
+
+from .prompt_encoder import compact_json, encode_metadata, fit_budget, template_fields
+
+PROMPT_VERSION = "v1.2.0"  # bump on any template or encoding change; part of every LLM cache key
 
 SYSTEM_TEMPLATE = """TRAKCHEK — GPT-4o FEEDBACK PROMPT (V2.1)
 You are simultaneously:
@@ -32,7 +37,7 @@ Extracted Audio Data:
   - Rolloff = {rolloff} Hz
   - Bandwidth = {bandwidth} Hz
 - Dynamics & Energy Profile: {energy_profile}
-(Note: time-series lists like energy_profile/transients may be downsampled for brevity; units are seconds for time, Hz for frequency, and dB for loudness.)
+(Note: time-series lists like energy_profile/transients may be downsampled or summarised for brevity; lists of records are columnar, e.g. {{"t":[...],"rms":[...]}}, with t0/dt in place of evenly spaced "t"; units are seconds for time, Hz for frequency, and dB for loudness.)
 - Transients: {transients_info}
 - Vocal Sections: {vocal_timestamps}
 - Drop Timestamps: {drop_timestamps}
@@ -85,28 +90,7 @@ Do not include any text outside the JSON.
 }}
 """
 
-COMPARISON_USER_TEMPLATE = """
-You are a professional mastering engineer, sound designer, and A&R evaluator
-analyzing two electronic music tracks for comparative purposes.
-
-The user is working in the **{genre}** genre, seeking feedback focused on **{feedback_type}**.
-User note / creative intent (if provided): "{user_note}"
-
-Your goal is to **compare the MAIN track to the REFERENCE track** across all technical and musical dimensions.
-Evaluate differences in tone, energy, arrangement, stereo depth, and overall creative direction.
-
-Use the metadata below as the analytical basis for your comparison.
-Think deeply, reason step-by-step through each aspect, and summarize the findings
-in a structured JSON report that highlights both alignment and differentiation opportunities.
-
-MAIN_TRACK METADATA:
-{main_metadata_json}
-
-REFERENCE_TRACK METADATA:
-{ref_metadata_json}
-
-OUTPUT FORMAT (VALID JSON ONLY):
-{{
+COMPARISON_OUTPUT_FORMAT = """{{
   "overall_fit": "<single-sentence assessment of how well the main track aligns with the reference>",
   "key_differences": {{
     "tempo_bpm_delta": <float>,
@@ -131,30 +115,158 @@ OUTPUT FORMAT (VALID JSON ONLY):
 }}
 """
 
-def assemble_messages(
-    metadata: dict,
-    *,
-    genre: str,
-    feedback_type: str,
-    user_note: str | None,
-    has_reference: bool,
-    comparison_summary: dict | None = None,
-):
-    reference_block = (
-        f"Reference track comparison summary:\n{json.dumps(comparison_summary, indent=2)}"
-        if comparison_summary
-        else ("Reference track was provided for context." if has_reference else "No reference track was provided.")
-    )
+COMPARISON_USER_TEMPLATE = """
+You are a professional mastering engineer, sound designer, and A&R evaluator
+analyzing two electronic music tracks for comparative purposes.
+
+The user is working in the **{genre}** genre, seeking feedback focused on **{feedback_type}**.
+User note / creative intent (if provided): "{user_note}"
+
+Your goal is to **compare the MAIN track to the REFERENCE track** across all technical and musical dimensions.
+Evaluate differences in tone, energy, arrangement, stereo depth, and overall creative direction.
+
+Use the metadata below as the analytical basis for your comparison (compact JSON: lists of records
+are columnar, evenly spaced series give t0/dt instead of times, and long series may be downsampled or summarised).
+Think deeply, reason step-by-step through each aspect, and summarize the findings
+in a structured JSON report that highlights both alignment and differentiation opportunities.
+
+MAIN_TRACK METADATA:
+{main_metadata_json}
+
+REFERENCE_TRACK METADATA:
+{ref_metadata_json}
+
+OUTPUT FORMAT (VALID JSON ONLY):
+""" + COMPARISON_OUTPUT_FORMAT
+
+# LLM_COMPARE_MODE=combined: feedback and comparison from one call, wrapped in one JSON object.
+COMBINED_REFERENCE_TEMPLATE = """
+REFERENCE_TRACK METADATA:
+{ref_metadata_json}
+
+COMBINED RESPONSE (replaces the output format above):
+Also compare the MAIN track to the REFERENCE track across tone, energy, arrangement, stereo depth
+and creative direction, and let that comparison inform your feedback.
+Return ONE valid JSON object and nothing else:
+{{"feedback": <the feedback object in the format above>, "comparison": <the comparison object below>}}
+
+Comparison object:
+""" + COMPARISON_OUTPUT_FORMAT
+
+# Payload keys an extraction profile may leave out; the prompt says so instead of failing.
+OPTIONAL_FIELDS = (
+    "vocal_timestamps",
+    "vocal_intensity",
+    "drop_timestamps",
+    "structure_segments",
+    "structure",
+    "fx_and_transitions",
+)
+
+TokenCounter = Optional[Callable[[str], int]]
+
+
+def _feedback_messages(metadata: dict, levels: dict, *, genre: str, feedback_type: str,
+                       user_note: str | None, reference_block: str) -> list:
     note_block = f'User Note: "{user_note}"' if user_note else ""
-    system = SYSTEM_TEMPLATE.format(genre=genre)
+    not_analysed = f"not analysed in the {metadata.get('profile') or 'selected'} extraction profile"
     user = USER_TEMPLATE.format(
         genre=genre,
         feedback_type=feedback_type,
         reference_block=reference_block,
         note_block=note_block,
-        **metadata,
+        **{**{k: not_analysed for k in OPTIONAL_FIELDS}, **template_fields(metadata, levels)},
     )
     return [
-        {"role": "system", "content": system},
+        {"role": "system", "content": SYSTEM_TEMPLATE.format(genre=genre)},
         {"role": "user", "content": user},
-    ]
\ No newline at end of file
+    ]
+
+
+def assemble_messages(
+    metadata: dict,
+    *,
+    genre: str,
+    feedback_type: str,
+    user_note: str | None,
+    has_reference: bool,
+    comparison_summary: dict | None = None,
+    reference_metadata: dict | None = None,
+    count_tokens: TokenCounter = None,
+    token_budget: int = 0,
+):
+    """Final-feedback messages; with `count_tokens` and a `token_budget` the series are trimmed to fit."""
+    def build(levels: dict) -> list:
+        if comparison_summary:
+            reference_block = f"Reference track comparison summary:\n{compact_json(comparison_summary)}"
+        elif reference_metadata:
+            # pipelined mode: the comparison runs alongside, so the raw reference features stand in for it
+            reference_block = ("Reference track metadata (compare the main track against it):\n"
+                               f"{compact_json(encode_metadata(reference_metadata, levels))}")
+        else:
+            reference_block = ("Reference track was provided for context." if has_reference
+                               else "No reference track was provided.")
+        return _feedback_messages(metadata, levels, genre=genre, feedback_type=feedback_type,
+                                  user_note=user_note, reference_block=reference_block)
+
+    return fit_budget(build, count_tokens=count_tokens, budget=token_budget)
+
+
+def assemble_combined_messages(
+    metadata: dict,
+    reference_metadata: dict,
+    *,
+    genre: str,
+    feedback_type: str,
+    user_note: str | None,
+    count_tokens: TokenCounter = None,
+    token_budget: int = 0,
+):
+    """Final-feedback messages that also ask for the comparison; parse with `split_combined`."""
+    def build(levels: dict) -> list:
+        messages = _feedback_messages(metadata, levels, genre=genre, feedback_type=feedback_type,
+                                      user_note=user_note, reference_block="Reference track was provided for context.")
+        messages[1]["content"] += COMBINED_REFERENCE_TEMPLATE.format(
+            ref_metadata_json=compact_json(encode_metadata(reference_metadata, levels)),
+        )
+        return messages
+
+    return fit_budget(build, count_tokens=count_tokens, budget=token_budget)
+
+
+def assemble_comparison_messages(
+    metadata: dict,
+    reference_metadata: dict,
+    *,
+    genre: str,
+    feedback_type: str,
+    user_note: str | None,
+    count_tokens: TokenCounter = None,
+    token_budget: int = 0,
+):
+    """Main-vs-reference comparison messages (COMPARISON_USER_TEMPLATE)."""
+    def build(levels: dict) -> list:
+        return [
+            {"role": "system", "content": "You are an expert mastering engineer and producer."},
+            {
+                "role": "user",
+                "content": COMPARISON_USER_TEMPLATE.format(
+                    genre=genre,
+                    feedback_type=feedback_type,
+                    user_note=user_note or "",
+                    main_metadata_json=compact_json(encode_metadata(metadata, levels)),
+                    ref_metadata_json=compact_json(encode_metadata(reference_metadata, levels)),
+                ),
+            },
+        ]
+
+    return fit_budget(build, count_tokens=count_tokens, budget=token_budget)
+
+
+def split_combined(content: str) -> tuple[str, dict]:
+    """(feedback JSON text, comparison summary) from a combined response."""
+    try:
+        parsed = json.loads(content)
+        return json.dumps(parsed["feedback"]), parsed.get("comparison") or {}
+    except (ValueError, KeyError, TypeError):
+        return content, {"summary_text": (content or "").strip()[:1000]}
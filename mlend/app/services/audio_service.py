@@ -1,39 +1,169 @@
 # services/audio_service.py
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, Any, List, Tuple, Optional
+from functools import cached_property
+from typing import Callable, Dict, Any, List, Tuple, Optional
 import numpy as np
 import librosa
-from scipy.signal import butter, sosfilt
+from scipy.ndimage import median_filter
+from scipy.signal import butter, get_window, sosfilt
 import webrtcvad  # REQUIRED
 import math
 
-# --------------------
-# Tunables for payload size
-# --------------------
-MAX_ENERGY_POINTS = 512        # cap RMS time-series points
-MAX_TRANSIENTS     = 128       # cap transient timestamps
-MAX_VOCAL_SEGMENTS = 128       # cap VAD segments
-MAX_FX_EVENTS      = 64        # cap fx markers
-FX_CONF_MIN        = 0.50      # filter weak fx
-MAX_STRUCTURE_SEGS = 128       # cap structure segments
+from .extractor_config import (
+    MAX_ENERGY_POINTS,
+    MAX_TRANSIENTS,
+    MAX_VOCAL_SEGMENTS,
+    MAX_FX_EVENTS,
+    FX_CONF_MIN,
+    MAX_STRUCTURE_SEGS,
+    N_FFT,
+    HOP_LENGTH,
+    ExtractionProfile,
+    frame_grid,
+    resolve_profile,
+)
+from ..constants import settings
+from .decode import duration_limit, probe
+from .pcm_store import pcm_store
+from .profiling import StageTimer, NULL_TIMER
+from .segments import NO_SEGMENTS, min_gap_boundaries, runs, span_means, true_runs
 
 # =========================
 # Data container
 # =========================
-@dataclass
+@dataclass(slots=True)
 class AudioFeatures:
+    """
+    Compact extraction result: scalars plus short numpy series; `features_to_payload`
+    builds the JSON lists/dicts. Sections the profile skipped are None.
+    """
     tempo_bpm: float
     key_text: str               # "C minor" | "C major" etc.
     duration_sec: float
     peak_rms_linear: float
     peak_rms_dbfs: float
-    spectral: Dict[str, float]
-    dynamics: Dict[str, Any]
-    vocals: Dict[str, Any]
-    structure: Dict[str, Any]
-    fx_transitions: Dict[str, Any]
-    _debug: Dict[str, Any] | None = None
+    centroid_hz: float
+    rolloff_hz: float
+    bandwidth_hz: float
+    flatness: float             # keep; acts as noisiness proxy
+    energy_times: np.ndarray    # downsampled RMS envelope (<= MAX_ENERGY_POINTS)
+    energy_rms: np.ndarray
+    transient_times: np.ndarray
+    silence_segments: np.ndarray  # (n, 2) start/end seconds of active/silent runs
+    silence_active: np.ndarray    # bool per silence segment
+    vocal_segments: Optional[np.ndarray] = None   # (n, 2) start/end seconds
+    vocal_intensity: Optional[float] = None       # may be null/heuristic later
+    drop_times: Optional[np.ndarray] = None
+    structure_segments: Optional[np.ndarray] = None   # (n, 2) start/end seconds
+    structure_labels: Optional[np.ndarray] = None     # "build" | "breakdown" | "section" per segment
+    structure_energy: Optional[np.ndarray] = None     # mean novelty per segment
+    structure_notes: Optional[str] = None
+    fx_events: Optional[List[Dict[str, Any]]] = None
+    profile: str = "standard"            # extraction profile that produced these
+    source_sr: Optional[int] = None      # sample rate of the uploaded file
+    analysis_sr: Optional[int] = None    # rate the extractors ran at
+    truncated: bool = False              # analysis stopped at decode.duration_limit()
+    debug: Optional[Dict[str, Any]] = None   # full-length frame series; EXTRACT_DEBUG / debug=True only
+
+# =========================
+# Per-track analysis context
+# =========================
+class AnalysisContext:
+    """
+    Holds the decoded signal plus lazily computed, memoized spectral views so each
+    representation (STFT, power, mel, onset envelope, RMS, ...) is built once per track.
+    """
+
+    def __init__(self, y: np.ndarray, sr: int, *, source_sr: Optional[int] = None,
+                 n_fft: Optional[int] = None, hop_length: Optional[int] = None):
+        self.y = y
+        self.sr = sr
+        self.source_sr = source_sr or sr
+        grid_fft, grid_hop = frame_grid(sr)
+        self.n_fft = n_fft or grid_fft
+        self.hop_length = hop_length or grid_hop
+
+    def release(self, *names: str) -> None:
+        """Drop memoized arrays that are no longer needed to lower peak memory."""
+        for name in names:
+            self.__dict__.pop(name, None)
+
+    # ---- spectrograms ----
+    @cached_property
+    def stft(self) -> np.ndarray:
+        return librosa.stft(self.y, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    @cached_property
+    def S_mag(self) -> np.ndarray:
+        return np.abs(self.stft)
+
+    @cached_property
+    def S_power(self) -> np.ndarray:
+        return self.S_mag ** 2
+
+    @cached_property
+    def mel_db(self) -> np.ndarray:
+        mel = librosa.feature.melspectrogram(S=self.S_power, sr=self.sr)
+        return librosa.power_to_db(mel)
+
+    @cached_property
+    def frame_times(self) -> np.ndarray:
+        return librosa.times_like(self.S_mag.shape[-1], sr=self.sr, hop_length=self.hop_length)
+
+    # ---- frame-wise features ----
+    @cached_property
+    def onset_env(self) -> np.ndarray:
+        return librosa.onset.onset_strength(S=self.mel_db, sr=self.sr, hop_length=self.hop_length)
+
+    @cached_property
+    def beat_onset_env(self) -> np.ndarray:
+        # beat_track aggregates mel bands with a median rather than the mean
+        return librosa.onset.onset_strength(S=self.mel_db, sr=self.sr, hop_length=self.hop_length,
+                                            aggregate=np.median)
+
+    @cached_property
+    def onset_times(self) -> np.ndarray:
+        return librosa.times_like(self.onset_env, sr=self.sr, hop_length=self.hop_length)
+
+    @cached_property
+    def rms(self) -> np.ndarray:
+        return _frame_rms(self.y, frame_length=self.n_fft, hop_length=self.hop_length)
+
+    @cached_property
+    def rms_times(self) -> np.ndarray:
+        return librosa.times_like(self.rms, sr=self.sr, hop_length=self.hop_length)
+
+    @cached_property
+    def centroid(self) -> np.ndarray:
+        return librosa.feature.spectral_centroid(S=self.S_mag, sr=self.sr)[0]
+
+    @cached_property
+    def bandwidth(self) -> np.ndarray:
+        return librosa.feature.spectral_bandwidth(S=self.S_mag, sr=self.sr)[0]
+
+    @cached_property
+    def rolloff(self) -> np.ndarray:
+        return librosa.feature.spectral_rolloff(S=self.S_mag, sr=self.sr)[0]
+
+    @cached_property
+    def flatness(self) -> np.ndarray:
+        return librosa.feature.spectral_flatness(S=self.S_mag)[0]
+
+    @cached_property
+    def novelty(self) -> np.ndarray:
+        # positive spectral flux per frame (first frame has no predecessor)
+        flux = np.maximum(0, np.diff(self.S_power, axis=1)).sum(axis=0)
+        return np.concatenate([[0.0], flux])
+
+    @cached_property
+    def chroma_mean(self) -> np.ndarray:
+        return librosa.feature.chroma_cqt(y=self.y, sr=self.sr, hop_length=self.hop_length).mean(axis=1)
+
+    @cached_property
+    def zcr(self) -> np.ndarray:
+        return librosa.feature.zero_crossing_rate(y=self.y, frame_length=self.n_fft,
+                                                  hop_length=self.hop_length)[0]
 
 # =========================
 # Small helpers
@@ -44,136 +174,183 @@ def _downsample_series(times: np.ndarray, values: np.ndarray, max_points: int) -
     idx = np.linspace(0, len(values) - 1, num=max_points).astype(int)
     return times[idx], values[idx]
 
-def _sample_list(xs: List[Any], max_len: int) -> List[Any]:
+def _frame_rms(y: np.ndarray, frame_length: int = N_FFT, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """Same values as librosa.feature.rms(y=...) (centered, zero-padded) via a running sum of y**2."""
+    pad = frame_length // 2
+    sq = np.pad(y.astype(np.float64) ** 2, pad)
+    csum = np.concatenate([[0.0], np.cumsum(sq)])
+    n_frames = 1 + (len(sq) - frame_length) // hop_length
+    starts = np.arange(n_frames) * hop_length
+    power = (csum[starts + frame_length] - csum[starts]) / frame_length
+    return np.sqrt(np.maximum(power, 0.0)).astype(y.dtype)
+
+def _sample_list(xs, max_len: int):
     if len(xs) <= max_len:
         return xs
-    # even sampling over the list
+    # even sampling over the list (or array rows)
     idx = np.linspace(0, len(xs) - 1, num=max_len).astype(int)
-    return [xs[i] for i in idx]
+    return xs[idx] if isinstance(xs, np.ndarray) else [xs[i] for i in idx]
 
-def _estimate_key(y: np.ndarray, sr: int) -> str:
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-    chroma_mean = chroma.mean(axis=1)
-    pitch_class = int(chroma_mean.argmax())
+def _estimate_key(ctx: AnalysisContext) -> str:
+    pitch_class = int(ctx.chroma_mean.argmax())
     keys = ["C","C#","D","D#","E","F","F#","G","G#","A","A#","B"]
     # extremely simple maj/min heuristic; keep until Essentia/KH installed
-    centroid = librosa.feature.spectral_centroid(y=y, sr=sr).mean()
-    is_minor = centroid < (sr / 8)
+    # (threshold tied to the file's own rate so downsampled analysis keeps the same call)
+    centroid = ctx.centroid.mean()
+    is_minor = centroid < (ctx.source_sr / 8)
     return f"{keys[pitch_class]}{' minor' if is_minor else ' major'}"
 
-def _onset_transients(y: np.ndarray, sr: int) -> Tuple[List[float], np.ndarray, np.ndarray]:
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    times = librosa.times_like(onset_env, sr=sr)
-    peaks = librosa.util.peak_pick(onset_env, pre_max=16, post_max=16, pre_avg=16, post_avg=16, delta=0.7, wait=5)
-    transients = [float(times[p]) for p in peaks]
-    return transients, onset_env, times
+def _estimate_tempo(onset_env: np.ndarray, sr: int, hop_length: int, chunk: int = 1024) -> float:
+    """
+    beat_track's tempo (prior-weighted argmax of the mean tempogram) without its per-track
+    tempogram, which needs ~12 KB per frame. Tempogram columns only see their own window,
+    so the mean is accumulated over `chunk`-column slices of the padded envelope.
+    """
+    if not onset_env.any():
+        return 0.0
+    win = librosa.time_to_frames(8.0, sr=sr, hop_length=hop_length).item()   # tempo()'s ac_size
+    n = len(onset_env)
+    padded = np.pad(onset_env, win // 2, mode="linear_ramp", end_values=[0, 0])
+    total = np.zeros(win)
+    for c0 in range(0, n, chunk):
+        c1 = min(n, c0 + chunk)
+        tg = librosa.feature.tempogram(onset_envelope=padded[c0:c1 + win - 1], sr=sr,
+                                       hop_length=hop_length, win_length=win, center=False)
+        total += tg.sum(axis=1)
+    return float(librosa.feature.tempo(tg=(total / n)[:, None], sr=sr, hop_length=hop_length)[0])
+
+def _onset_transients(ctx: AnalysisContext) -> np.ndarray:
+    peaks = librosa.util.peak_pick(ctx.onset_env, pre_max=16, post_max=16, pre_avg=16, post_avg=16, delta=0.7, wait=5)
+    return ctx.onset_times[peaks]
 
 def _silence_segments_from_rms(times: np.ndarray, rms: np.ndarray, thr: Optional[float] = None,
-                               min_len: float = 0.2) -> List[Dict[str, float]]:
+                               min_len: float = 0.2) -> Tuple[np.ndarray, np.ndarray]:
+    """((n, 2) first/last frame times, active flag) of the above/below-threshold runs spanning >= min_len."""
     if thr is None:
         thr = float(np.percentile(rms, 10))
-    labels = (rms > thr).astype(int)
-    segs: List[Dict[str, float]] = []
-    start, cur = 0, labels[0]
-    for i in range(1, len(labels)):
-        if labels[i] != cur:
-            t0, t1 = times[start], times[i-1]
-            if (t1 - t0) >= min_len:
-                segs.append({"start": float(t0), "end": float(t1), "label": "active" if cur else "silence"})
-            start, cur = i, labels[i]
-    t0, t1 = times[start], times[-1]
-    if (t1 - t0) >= min_len:
-        segs.append({"start": float(t0), "end": float(t1), "label": "active" if cur else "silence"})
-    return segs
+    starts, stops, active = runs(rms > thr)
+    t0, t1 = times[starts], times[stops - 1]
+    keep = (t1 - t0) >= min_len
+    return np.column_stack([t0[keep], t1[keep]]), active[keep]
 
-def _bandlimit(y, sr, lo=300, hi=3400):
-    sos = butter(6, [lo, hi], btype="bandpass", fs=sr, output="sos")
-    return sosfilt(sos, y)
+def _speech_band_sos(sr, lo=300, hi=3400) -> np.ndarray:
+    return butter(6, [lo, hi], btype="bandpass", fs=sr, output="sos")
 
-def _vad_segments_webrtc(y: np.ndarray, sr: int,
+def _bandlimit(y, sr, lo=300, hi=3400):
+    return sosfilt(_speech_band_sos(sr, lo, hi), y)
+
+def _webrtc_flags(pcm16: np.ndarray, frame_len: int, vad: webrtcvad.Vad) -> np.ndarray:
+    """
+    webrtcvad decision per frame, reading fixed-size slices of one int16 buffer. Use one
+    Vad per track: it adapts to the signal, so frames can't be split across instances.
+    """
+    n = len(pcm16) // frame_len
+    buf = memoryview(np.ascontiguousarray(pcm16[: n * frame_len])).cast("B")
+    step = frame_len * 2
+    return np.fromiter((vad.is_speech(buf[i * step:(i + 1) * step], 16000) for i in range(n)), dtype=bool, count=n)
+
+def _vad_segments_webrtc(ctx: AnalysisContext,
                          aggressiveness: int = 2,
                          frame_ms: int = 30,
                          min_seg_ms: int = 300,
-                         energy_gate_db: float = -45.0) -> List[Dict[str, float]]:
+                         energy_gate_db: float = -45.0) -> np.ndarray:
     # 1) band-limit to speech band
-    y = _bandlimit(y, sr)
+    y = _bandlimit(ctx.y, ctx.sr).astype(np.float32)
 
     # 2) energy gate
     eps = 1e-12
-    rms_db = 20*np.log10(max(float(librosa.feature.rms(y=y)[0].mean()), eps))
+    rms_db = 20*np.log10(max(float(_frame_rms(y).mean()), eps))
     if rms_db < energy_gate_db:
-        return []
+        return NO_SEGMENTS
 
     # 16 kHz mono PCM for VAD
-    y16 = librosa.resample(y, orig_sr=sr, target_sr=16000)
-    y16 = np.clip(y16, -1.0, 1.0)
-    pcm16 = (y16 * 32767).astype(np.int16).tobytes()
-
-    vad = webrtcvad.Vad(aggressiveness)
-    bytes_per_frame = int(16000 * (frame_ms / 1000.0)) * 2
-    frames = [pcm16[i:i + bytes_per_frame] for i in range(0, len(pcm16), bytes_per_frame)]
-    flags = [vad.is_speech(fr, 16000) for fr in frames if len(fr) == bytes_per_frame]
-    times = np.arange(len(flags)) * (frame_ms / 1000.0)
+    y16 = y if ctx.sr == 16000 else librosa.resample(y, orig_sr=ctx.sr, target_sr=16000)
+    pcm16 = (np.clip(y16, -1.0, 1.0) * 32767).astype(np.int16)
+    flags = _webrtc_flags(pcm16, int(16000 * frame_ms / 1000), webrtcvad.Vad(aggressiveness))
+    if not flags.size:
+        return NO_SEGMENTS
 
-    # 3) simple timbre filter
+    # 3) simple timbre filter (speech band only: the full-band track features flag instrumentals)
     hop = int(16000 * (frame_ms / 1000.0))
-    zcr = librosa.feature.zero_crossing_rate(y=y16, frame_length=2*hop, hop_length=hop)[0][:len(flags)]
+    zcr = librosa.feature.zero_crossing_rate(y=y16, frame_length=2*hop, hop_length=hop)[0]
     S = np.abs(librosa.stft(y16, n_fft=2*hop, hop_length=hop))
-    flat = librosa.feature.spectral_flatness(S=S)[0][:len(flags)]
+    flat = librosa.feature.spectral_flatness(S=S)[0]
+    return _speech_segments(flags, zcr, flat, frame_ms, min_seg_ms)
+
+def _speech_segments(flags: np.ndarray, zcr: np.ndarray, flat: np.ndarray,
+                     frame_ms: int = 30, min_seg_ms: int = 300) -> np.ndarray:
+    """VAD flags AND a low-flatness/low-ZCR timbre filter, as (n, 2) start/end seconds of runs >= min_seg_ms."""
+    zcr, flat = zcr[:len(flags)], flat[:len(flags)]
     speech_like = (flat < np.percentile(flat, 65)) & (zcr < np.percentile(zcr, 65))
-    flags = [bool(f and s) for f, s in zip(flags, speech_like)]
-
-    segs, start = [], None
-    for i, f in enumerate(flags):
-        if f and start is None:
-            start = times[i]
-        last = (i == len(flags)-1)
-        if ((not f) or last) and start is not None:
-            end = times[i] + (frame_ms/1000.0) if f and last else times[i]
-            if (end - start) * 1000 >= min_seg_ms:
-                segs.append({"start": float(start), "end": float(end)})
-            start = None
-    return segs
-
-def _structure_segments_from_novelty(y: np.ndarray, sr: int, min_seg: float = 4.0) -> List[Dict[str, float]]:
-    S = np.abs(librosa.stft(y, n_fft=2048, hop_length=512)) ** 2
-    flux = np.maximum(0, np.diff(S, axis=1)).sum(axis=0)
-    flux = np.concatenate([[0.0], flux])
-    times = librosa.times_like(flux, sr=sr, hop_length=512)
+
+    frame_s = frame_ms / 1000.0
+    starts, stops = true_runs(flags & speech_like)
+    keep = (stops - starts) * frame_ms >= min_seg_ms
+    return np.column_stack([starts[keep], stops[keep]]) * frame_s
+
+def _vocal_intensity_hpss(ctx: AnalysisContext) -> float:
+    """Mean |harmonic signal| from full HPSS + inverse STFT (reference implementation)."""
+    H, _ = librosa.decompose.hpss(ctx.stft)
+    return float(np.mean(np.abs(librosa.istft(H, hop_length=ctx.hop_length, n_fft=ctx.n_fft, length=len(ctx.y)))))
+
+def _vocal_intensity_spectral(ctx: AnalysisContext, time_decim: int = 4, freq_decim: int = 2,
+                              kernel: int = 31) -> float:
+    """
+    Same proxy without leaving the spectral domain. The power spectrogram is pooled into
+    time_decim x freq_decim cells and HPSS-style median filters run at that resolution.
+    Parseval then turns the masked harmonic energy per cell column into a mean |amplitude|.
+    """
+    total, n_frames = _harmonic_abs_sum(ctx.S_power, ctx.n_fft, time_decim, freq_decim, kernel)
+    return total / n_frames
+
+def _harmonic_abs_sum(P: np.ndarray, n_fft: int, time_decim: int = 4, freq_decim: int = 2,
+                      kernel: int = 31) -> Tuple[float, int]:
+    """(sum over frames of the estimated mean |harmonic amplitude|, frame count) for a power spectrogram."""
+    n_bins, n_frames = P.shape
+    f_idx, t_idx = np.arange(0, n_bins, freq_decim), np.arange(0, n_frames, time_decim)
+    P_d = np.add.reduceat(np.add.reduceat(P, f_idx, axis=0), t_idx, axis=1)
+    f_len, t_len = np.diff(np.append(f_idx, n_bins)), np.diff(np.append(t_idx, n_frames))
+    mag = np.sqrt(P_d / np.outer(f_len, t_len))
+
+    harm = median_filter(mag, size=(1, max(3, (kernel // time_decim) | 1)), mode="reflect")
+    perc = median_filter(mag, size=(max(3, (kernel // freq_decim) | 1), 1), mode="reflect")
+    mask = harm ** 2 / (harm ** 2 + perc ** 2 + 1e-20)   # librosa's power-2 soft mask
+
+    # one-sided spectrum -> x2; a windowed frame's energy is n_fft * sum(w^2) * mean(x^2)
+    win_energy = float(np.sum(get_window("hann", n_fft) ** 2))
+    mean_sq = 2.0 * (mask * P_d).sum(axis=0) / (n_fft * win_energy * t_len)
+    # mean |x| ~ sqrt(2/pi) * rms for noise-like content
+    return float(np.sqrt(2.0 / np.pi) * np.sum(np.sqrt(mean_sq) * t_len)), n_frames
+
+VOCAL_INTENSITY_METHODS = {
+    "hpss": _vocal_intensity_hpss,
+    "spectral": _vocal_intensity_spectral,
+}
+
+def _structure_segments_from_novelty(ctx: AnalysisContext,
+                                     min_seg: float = 4.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """((n, 2) start/end seconds, label, mean novelty) of novelty-peak sections at least min_seg long."""
+    flux = ctx.novelty
+    times = ctx.frame_times
     thr = float(np.percentile(flux, 75))
     peaks = librosa.util.peak_pick(flux, pre_max=16, post_max=16, pre_avg=16, post_avg=16, delta=thr, wait=10)
 
-    bounds = [0.0] + [float(times[p]) for p in peaks] + [float(times[-1])]
-    segs: List[Dict[str, float]] = []
-    last = bounds[0]
-    for b in bounds[1:]:
-        if (b - last) >= min_seg:
-            segs.append({"start": float(last), "end": float(b)})
-            last = b
+    bounds = min_gap_boundaries(np.concatenate([[0.0], times[peaks], [times[-1]]]).astype(np.float64), min_seg)
+    segs = np.column_stack([bounds[:-1], bounds[1:]])
 
-    labeled: List[Dict[str, float]] = []
+    i0, i1 = np.searchsorted(times, segs[:, 0]), np.searchsorted(times, segs[:, 1])
+    energy = span_means(flux, i0, i1)
     p30, p70 = float(np.percentile(flux, 30)), float(np.percentile(flux, 70))
-    for seg in segs:
-        t0, t1 = seg["start"], seg["end"]
-        i0, i1 = np.searchsorted(times, [t0, t1])
-        energy = float(np.mean(flux[max(0, i0):max(i0+1, i1)]))
-        if energy <= p30: label = "breakdown"
-        elif energy >= p70: label = "build"
-        else: label = "section"
-        labeled.append({**seg, "label": label, "energy": energy})
-    return labeled
-
-def _detect_fx_transitions(y: np.ndarray, sr: int, boundaries: List[Dict[str, float]]) -> List[Dict[str, Any]]:
-    hop = 512
-    S_mag = np.abs(librosa.stft(y, n_fft=2048, hop_length=hop))
-    centroid = librosa.feature.spectral_centroid(S=S_mag, sr=sr)[0]
-    bandwidth = librosa.feature.spectral_bandwidth(S=S_mag, sr=sr)[0]
-    zcr = librosa.feature.zero_crossing_rate(y=y, frame_length=2048, hop_length=hop)[0]
-    times = librosa.times_like(centroid, sr=sr, hop_length=hop)
+    labels = np.where(energy <= p30, "breakdown", np.where(energy >= p70, "build", "section"))
+    return segs, labels, energy
+
+def _detect_fx_transitions(ctx: AnalysisContext, boundaries: np.ndarray) -> List[Dict[str, Any]]:
+    """FX markers around each section end (`boundaries`: seconds)."""
+    centroid, bandwidth, zcr = ctx.centroid, ctx.bandwidth, ctx.zcr
+    times = ctx.frame_times
 
     fx: List[Dict[str, Any]] = []
-    for seg in boundaries:
-        t = float(seg["end"])
+    for t in boundaries.tolist():
         pre, post = 2.0, 0.5
         i0, i1 = np.searchsorted(times, [max(0.0, t - pre), min(times[-1], t + post)])
         if i1 - i0 < 5:
@@ -195,83 +372,143 @@ def _detect_fx_transitions(y: np.ndarray, sr: int, boundaries: List[Dict[str, fl
 # =========================
 # Main extractor
 # =========================
-def extract_features(path) -> AudioFeatures:
-    y, sr = librosa.load(path, mono=True, sr=None)
-    duration = float(librosa.get_duration(y=y, sr=sr))
-
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-
-    rms = librosa.feature.rms(y=y)[0]
-    peak_rms_linear = float(np.max(rms))
-    # protect against log of 0
-    peak_rms_dbfs = float(20.0 * math.log10(max(peak_rms_linear, 1e-12)))
-
-    centroid = float(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
-    rolloff  = float(np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr)))
-    bandwidth = float(np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)))
-    flatness = float(np.mean(librosa.feature.spectral_flatness(y=y)))
-
-    # Energy profile (downsampled)
-    rms_times = librosa.times_like(rms, sr=sr)
-    ds_t, ds_rms = _downsample_series(rms_times, rms, max_points=MAX_ENERGY_POINTS)
-    energy_profile = [{"t": float(t), "rms": float(v)} for t, v in zip(ds_t, ds_rms)]
-
-    # Transients
-    transients, onset_env, onset_times = _onset_transients(y, sr)
-    transients = _sample_list(transients, MAX_TRANSIENTS)
+def _should_stream(path: str) -> bool:
+    """Stream when more than STREAM_ABOVE_SEC would be decoded (0 = always, negative = never)."""
+    limit = settings.STREAM_ABOVE_SEC
+    if limit < 0:
+        return False
+    # whatever the in-memory path would truncate is streamed instead
+    limit = min(limit, settings.MAX_DURATION_SEC)
+    return limit == 0 or min(probe(path).duration_sec or 0.0, duration_limit()) > limit
+
+def extract_features(path, content_hash: Optional[str] = None, timer: Optional[StageTimer] = None,
+                     profile: ExtractionProfile | str | None = None, debug: Optional[bool] = None) -> AudioFeatures:
+    """`debug` (default EXTRACT_DEBUG) keeps the full-length onset/RMS series on the result."""
+    timer = timer or NULL_TIMER
+    debug = settings.EXTRACT_DEBUG if debug is None else debug
+    profile = profile if isinstance(profile, ExtractionProfile) else resolve_profile(profile)
+    wants = set(profile.sections)
+
+    if _should_stream(path):
+        # block-wise pass with memory bounded by the block size (long mixes); see streaming.py
+        from .streaming import stream_analysis
+        with timer.stage("stream"):
+            sctx = stream_analysis(path, vocals="vocals" in wants, intensity=profile.vocal_intensity)
+        return _summarise(sctx, profile, timer, duration=sctx.duration, truncated=sctx.truncated, debug=debug,
+                          vocal_intensity=lambda: sctx.vocal_intensity,
+                          vocal_segments=lambda: sctx.vocal_segments)
+
+    with timer.stage("decode"):
+        audio = pcm_store.load(path, content_hash)
+    y, sr = audio.y, audio.sr
+    ctx = AnalysisContext(y, sr, source_sr=audio.source_sr)
+
+    with timer.stage("stft"):
+        # materialise the shared spectrograms up front so later stages time only their own work
+        ctx.S_mag
+        ctx.mel_db
+        if not ("vocals" in wants and profile.vocal_intensity == "hpss"):
+            ctx.release("stft")  # only HPSS needs the complex STFT
+
+    return _summarise(ctx, profile, timer,
+                      duration=float(librosa.get_duration(y=y, sr=sr)), truncated=audio.truncated, debug=debug,
+                      vocal_intensity=lambda: VOCAL_INTENSITY_METHODS[profile.vocal_intensity](ctx),
+                      vocal_segments=lambda: _vad_segments_webrtc(ctx))
+
+def _summarise(ctx: AnalysisContext, profile: ExtractionProfile, timer, *, duration: float, truncated: bool,
+               vocal_intensity: Callable[[], float], vocal_segments: Callable[[], np.ndarray],
+               debug: bool = False) -> AudioFeatures:
+    """Everything downstream of the spectrogram; `ctx` is an AnalysisContext or a StreamedAnalysis."""
+    sr = ctx.sr
+    wants = set(profile.sections)
+
+    with timer.stage("beat_tracking"):
+        tempo = _estimate_tempo(ctx.beat_onset_env, sr, ctx.hop_length)
+
+    with timer.stage("spectral"):
+        rms = ctx.rms
+        peak_rms_linear = float(np.max(rms))
+        # protect against log of 0
+        peak_rms_dbfs = float(20.0 * math.log10(max(peak_rms_linear, 1e-12)))
+
+        centroid = float(np.mean(ctx.centroid))
+        rolloff  = float(np.mean(ctx.rolloff))
+        bandwidth = float(np.mean(ctx.bandwidth))
+        flatness = float(np.mean(ctx.flatness))
+
+        # Energy profile (downsampled) & silence
+        rms_times = ctx.rms_times
+        energy_times, energy_rms = _downsample_series(rms_times, rms, max_points=MAX_ENERGY_POINTS)
+        silence_segments, silence_active = _silence_segments_from_rms(rms_times, rms)
+
+    # Transients (peaks of the onset envelope; drops reuse the same picks)
+    with timer.stage("transients"):
+        onset_peaks = _onset_transients(ctx)
 
     # Simple “vocal intensity” proxy & VAD segments
-    H, _ = librosa.effects.hpss(y)
-    vocal_intensity = float(np.mean(np.abs(H)))  # proxy; keep for now
-    vocal_sections = _sample_list(_vad_segments_webrtc(y, sr), MAX_VOCAL_SEGMENTS)
-
-    # Drops from onset env
-    drop_peaks = librosa.util.peak_pick(onset_env, pre_max=16, post_max=16, pre_avg=16, post_avg=16, delta=0.7, wait=5)
-    drop_timestamps = [float(onset_times[p]) for p in drop_peaks]
-    drop_timestamps = _sample_list(drop_timestamps, 64)
-
-    # Structure & silence
-    segments = _structure_segments_from_novelty(y, sr)
-    segments = _sample_list(segments, MAX_STRUCTURE_SEGS)
-    silence_segments = _silence_segments_from_rms(rms_times, rms)
+    vocal_sections, intensity = None, None
+    if "vocals" in wants:
+        with timer.stage("vocal_intensity"):
+            intensity = vocal_intensity()  # proxy; keep for now
+            ctx.release("stft")
+        with timer.stage("vad"):
+            vocal_sections = _sample_list(vocal_segments(), MAX_VOCAL_SEGMENTS)
+
+    # Structure (FX markers are placed against its boundaries)
+    segments = seg_labels = seg_energy = None
+    if wants & {"structure", "fx"}:
+        with timer.stage("structure"):
+            segments, seg_labels, seg_energy = _structure_segments_from_novelty(ctx)
+            keep = _sample_list(np.arange(len(segments)), MAX_STRUCTURE_SEGS)
+            segments, seg_labels, seg_energy = segments[keep], seg_labels[keep], seg_energy[keep]
+    ctx.release("S_power")
+    structured = "structure" in wants
 
     # FX (filter + cap)
-    fx_notable = [e for e in _detect_fx_transitions(y, sr, segments) if e.get("confidence", 0) >= FX_CONF_MIN]
-    fx_notable = _sample_list(fx_notable, MAX_FX_EVENTS)
+    fx_events = None
+    if "fx" in wants:
+        with timer.stage("fx"):
+            fx_notable = [e for e in _detect_fx_transitions(ctx, segments[:, 1]) if e.get("confidence", 0) >= FX_CONF_MIN]
+            fx_events = _sample_list(fx_notable, MAX_FX_EVENTS)
+
+    with timer.stage("key"):
+        key_text = _estimate_key(ctx)
 
     feats = AudioFeatures(
         tempo_bpm=float(tempo),
-        key_text=_estimate_key(y, sr),            # "C minor" / "C major"
+        key_text=key_text,                        # "C minor" / "C major"
         duration_sec=duration,
         peak_rms_linear=peak_rms_linear,
         peak_rms_dbfs=peak_rms_dbfs,
-        spectral={
-            "centroid_hz": centroid,
-            "rolloff_hz": rolloff,
-            "bandwidth_hz": bandwidth,
-            "flatness": flatness,                 # keep; acts as noisiness proxy
-        },
-        dynamics={
-            "energy_profile": energy_profile,
-            "transient_timestamps": transients,
-            "silence_segments": silence_segments,
-        },
-        vocals={
-            "vocal_segments": vocal_sections,
-            "vocal_intensity": vocal_intensity,   # may be null/heuristic later
-        },
-        structure={
-            "drop_timestamps": drop_timestamps,
-            "segments": segments,
-            "notes": "Segmented via novelty curve; labels are heuristic. Consider Essentia for robustness.",
-        },
-        fx_transitions={"events": fx_notable},
-        _debug={
+        centroid_hz=centroid,
+        rolloff_hz=rolloff,
+        bandwidth_hz=bandwidth,
+        flatness=flatness,
+        energy_times=energy_times,
+        energy_rms=energy_rms,
+        transient_times=_sample_list(onset_peaks, MAX_TRANSIENTS),
+        silence_segments=silence_segments,
+        silence_active=silence_active,
+        vocal_segments=vocal_sections,
+        vocal_intensity=intensity,
+        drop_times=_sample_list(onset_peaks, 64) if structured else None,  # drops from onset env
+        structure_segments=segments if structured else None,
+        structure_labels=seg_labels if structured else None,
+        structure_energy=seg_energy if structured else None,
+        structure_notes=("Segmented via novelty curve; labels are heuristic. Consider Essentia for robustness."
+                         if structured else None),
+        fx_events=fx_events,
+        profile=profile.name,
+        source_sr=ctx.source_sr,
+        analysis_sr=sr,
+        truncated=truncated,
+    )
+    if debug:
+        feats.debug = {
             "sr": sr,
-            "onset_env": onset_env, "onset_times": onset_times,
+            "onset_env": ctx.onset_env, "onset_times": ctx.onset_times,
             "rms": rms, "rms_times": rms_times,
-        },
-    )
+        }
     return feats
 
 # =========================
@@ -290,24 +527,62 @@ def features_to_payload(f: AudioFeatures) -> dict:
         },
 
         # Spectral
-        "centroid": round(f.spectral["centroid_hz"], 2),
-        "rolloff": round(f.spectral["rolloff_hz"], 2),
-        "bandwidth": round(f.spectral["bandwidth_hz"], 2),
-        "flatness": round(f.spectral["flatness"], 6),
+        "centroid": round(f.centroid_hz, 2),
+        "rolloff": round(f.rolloff_hz, 2),
+        "bandwidth": round(f.bandwidth_hz, 2),
+        "flatness": round(f.flatness, 6),
 
         # Dynamics & Energy
-        "energy_profile": f.dynamics["energy_profile"],
-        "transients_info": f.dynamics["transient_timestamps"],
-        "silence_segments": f.dynamics.get("silence_segments", []),
-
-        # Vocals
-        "vocal_timestamps": f.vocals.get("vocal_segments", []),
-        "vocal_intensity": f.vocals.get("vocal_intensity", None),
-
-        # Structure & FX
-        "drop_timestamps": f.structure["drop_timestamps"],
-        "structure_segments": f.structure["segments"],
-        "structure": f.structure.get("notes", ""),
-        "fx_and_transitions": f.fx_transitions["events"],
+        "energy_profile": [{"t": t, "rms": v} for t, v in zip(f.energy_times.tolist(), f.energy_rms.tolist())],
+        "transients_info": f.transient_times.tolist(),
+        "silence_segments": [{"start": a, "end": b, "label": "active" if on else "silence"}
+                             for (a, b), on in zip(f.silence_segments.tolist(), f.silence_active.tolist())],
     }
+    # Sections the profile skipped are left out rather than sent empty
+    if f.vocal_segments is not None:
+        payload["vocal_timestamps"] = [{"start": a, "end": b} for a, b in f.vocal_segments.tolist()]
+        payload["vocal_intensity"] = f.vocal_intensity
+    if f.structure_segments is not None:
+        payload["drop_timestamps"] = f.drop_times.tolist()
+        payload["structure_segments"] = [
+            {"start": a, "end": b, "label": label, "energy": energy}
+            for (a, b), label, energy in zip(f.structure_segments.tolist(), f.structure_labels.tolist(),
+                                             f.structure_energy.tolist())
+        ]
+        payload["structure"] = f.structure_notes or ""
+    if f.fx_events is not None:
+        payload["fx_and_transitions"] = f.fx_events
+
+    # Decode
+    payload.update(
+        sample_rate=f.source_sr,
+        analysis_sample_rate=f.analysis_sr,
+        truncated=f.truncated,
+        profile=f.profile,
+    )
     return payload
+
+
+def warmup(duration_sec: float = 3.0, sr: int = 44100) -> None:
+    """
+    Run the full profile once on a short synthetic track so numba kernels are compiled (or
+    loaded from NUMBA_CACHE_DIR) and FFT plans exist before the first real job. The PCM
+    store is bypassed: the track is decoded like a new upload and nothing is left in
+    CLIPS_DIR (or baked into an image by the Dockerfile's warmup step).
+    """
+    import os
+    import tempfile
+    import soundfile as sf
+
+    t = np.arange(int(duration_sec * sr)) / sr
+    y = 0.3 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 0.5 * t) > 0)  # gated tone
+    y[:: sr // 2] += 0.9                                                        # clicks at 120 BPM
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    store_enabled, pcm_store.enabled = pcm_store.enabled, False
+    try:
+        sf.write(path, y.astype(np.float32), sr, subtype="FLOAT")
+        extract_features(path, profile="full")
+    finally:
+        pcm_store.enabled = store_enabled
+        os.unlink(path)
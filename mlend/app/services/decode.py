@@ -0,0 +1,89 @@
+# services/decode.py
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+
+from ..constants import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class AudioTooLong(ValueError):
+    pass
+
+
+@dataclass
+class AudioInfo:
+    duration_sec: Optional[float]
+    sample_rate: Optional[int]
+
+
+@dataclass
+class DecodedAudio:
+    y: np.ndarray
+    sr: int                      # analysis rate
+    source_sr: Optional[int]     # rate of the uploaded file
+    source_duration: Optional[float]
+    truncated: bool
+
+
+def probe(path: str) -> AudioInfo:
+    """Read duration + sample rate from headers only (libsndfile, then ffmpeg via audioread)."""
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+        return AudioInfo(duration_sec=float(info.duration), sample_rate=int(info.samplerate))
+    except Exception:
+        pass
+    try:
+        import audioread
+        with audioread.audio_open(path) as f:
+            return AudioInfo(duration_sec=float(f.duration) if f.duration else None, sample_rate=int(f.samplerate))
+    except Exception:
+        return AudioInfo(duration_sec=None, sample_rate=None)
+
+
+def duration_limit() -> float:
+    """
+    Longest audio analysed: MAX_DURATION_SEC in memory, or STREAM_MAX_DURATION_SEC while
+    streaming is on (a track past MAX_DURATION_SEC is then streamed rather than truncated).
+    """
+    if settings.STREAM_ABOVE_SEC < 0:
+        return settings.MAX_DURATION_SEC
+    return max(settings.MAX_DURATION_SEC, settings.STREAM_MAX_DURATION_SEC)
+
+
+def check_duration(info: AudioInfo, max_sec: Optional[float] = None,
+                   policy: str = settings.OVERLONG_POLICY) -> None:
+    max_sec = duration_limit() if max_sec is None else max_sec
+    if policy == "reject" and info.duration_sec is not None and info.duration_sec > max_sec:
+        raise AudioTooLong(f"Track is {info.duration_sec:.0f}s; limit is {max_sec:.0f}s")
+
+
+def load_audio(path: str, *, analysis_sr: int = settings.ANALYSIS_SR,
+               max_sec: float = settings.MAX_DURATION_SEC,
+               policy: str = settings.OVERLONG_POLICY) -> DecodedAudio:
+    """
+    Decode mono float32 straight at the analysis rate (0 keeps the native rate),
+    never decoding past `max_sec`: over-limit tracks are truncated or rejected per `policy`.
+    """
+    import librosa
+
+    info = probe(path)
+    check_duration(info, max_sec, policy)
+    y, sr = librosa.load(
+        path,
+        sr=analysis_sr or None,
+        mono=True,
+        duration=max_sec,
+        res_type=settings.ANALYSIS_RES_TYPE,
+    )
+    truncated = info.duration_sec is not None and info.duration_sec > max_sec
+    return DecodedAudio(
+        y=y,
+        sr=int(sr),
+        source_sr=info.sample_rate or int(sr),
+        source_duration=info.duration_sec,
+        truncated=truncated,
+    )
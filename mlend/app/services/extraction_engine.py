@@ -0,0 +1,128 @@
+# services/extraction_engine.py
+from __future__ import annotations
+import asyncio
+import os
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from ..constants import settings
+from ..logger import get_logger
+from ..metrics import observe_extract_timings
+
+log = get_logger("extraction_engine")
+
+# Each worker is single-threaded for BLAS/FFT so N workers don't oversubscribe N cores.
+_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMBA_NUM_THREADS")
+
+
+class ExtractionTimeout(TimeoutError):
+    pass
+
+
+def _init_worker() -> None:
+    for var in _THREAD_ENV:
+        os.environ.setdefault(var, "1")
+
+
+def _extract_payload(path: str, content_hash: Optional[str] = None, profile: Optional[str] = None) -> dict:
+    # Imported inside the worker so the parent process never pays for the audio stack here.
+    from .audio_service import extract_features, features_to_payload
+    from .profiling import StageTimer
+    timer = StageTimer()
+    with timer.stage("total"):
+        payload = features_to_payload(extract_features(path, content_hash, timer=timer, profile=profile))
+    return {"payload": payload, "timings": timer.as_dict()}
+
+
+def _warm_worker() -> dict:
+    """Import the audio stack and run one tiny extraction in this worker (`audio_service.warmup`)."""
+    t0 = time.perf_counter()
+    from .audio_service import warmup
+    t1 = time.perf_counter()
+    warmup()
+    return {"pid": os.getpid(), "import_sec": t1 - t0, "warmup_sec": time.perf_counter() - t1}
+
+
+class ExtractionEngine:
+    """
+    Runs CPU-bound feature extraction in a bounded pool of worker processes so the
+    event loop stays responsive. Workers are recycled after `max_jobs_per_worker`
+    tasks to contain librosa/numba memory growth; a task exceeding `timeout_sec`
+    tears the pool down (the only way to stop a stuck worker) and is reported as failed.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.EXTRACT_WORKERS,
+        timeout_sec: float = settings.EXTRACT_TIMEOUT_SEC,
+        max_jobs_per_worker: int = settings.EXTRACT_MAX_JOBS_PER_WORKER,
+    ):
+        self.workers = max(1, workers)
+        self.timeout_sec = timeout_sec
+        self.max_jobs_per_worker = max(1, max_jobs_per_worker)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            max_tasks_per_child=self.max_jobs_per_worker,
+        )
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = self._new_pool()
+            log.info(f"[engine] started {self.workers} extraction workers")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _recycle(self, pool: ProcessPoolExecutor) -> None:
+        if self._pool is not pool:
+            return  # already replaced by a concurrent caller
+        self._pool = self._new_pool()
+        for proc in list((pool._processes or {}).values()):
+            proc.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn, *args):
+        """Run a picklable top-level `fn(*args)` in the pool, bounded by the task timeout."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        for attempt in (1, 2):
+            pool = self._pool
+            fut = loop.run_in_executor(pool, fn, *args)
+            try:
+                return await asyncio.wait_for(fut, timeout=self.timeout_sec)
+            except asyncio.TimeoutError:
+                log.error(f"[engine] {fn.__name__} timed out after {self.timeout_sec:g}s; recycling pool")
+                self._recycle(pool)
+                raise ExtractionTimeout(f"extraction exceeded {self.timeout_sec:g}s")
+            except BrokenProcessPool:
+                # a worker died (OOM kill) or the pool was recycled under us: retry once on a fresh pool
+                self._recycle(pool)
+                if attempt == 2:
+                    raise
+                log.warning(f"[engine] pool broken during {fn.__name__}; retrying")
+
+    async def warmup(self) -> list:
+        """
+        Prime the workers: one warmup task each, submitted together so the pool spawns them all
+        (best effort; a fast worker may take two). Each task counts towards `max_jobs_per_worker`.
+        """
+        return await asyncio.gather(*(self.run(_warm_worker) for _ in range(self.workers)))
+
+    async def extract(self, path: str, content_hash: Optional[str] = None, profile: Optional[str] = None) -> dict:
+        """Extract features for `path` with the named profile and return the prompt-ready payload."""
+        result = await self.run(_extract_payload, path, content_hash, profile)
+        observe_extract_timings(result["timings"])
+        return result["payload"]
+
+
+engine = ExtractionEngine()
@@ -0,0 +1,118 @@
+# services/extractor_config.py
+# Extractor tunables live here (no heavy imports) so the API process can
+# version cached features without loading the audio stack.
+from __future__ import annotations
+import hashlib
+import json
+import math
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from ..constants import settings
+
+# Bump whenever extractor logic changes a payload in a way the tunables below don't capture.
+# 2: VAD keeps speech runs of exactly the minimum length (~300 ms) that float rounding dropped
+# 3: streamed "full" extraction uses HPSS vocal_intensity instead of the spectral estimator
+EXTRACTOR_VERSION = "3"
+
+# --------------------
+# Tunables for payload size
+# --------------------
+MAX_ENERGY_POINTS = 512        # cap RMS time-series points
+MAX_TRANSIENTS     = 128       # cap transient timestamps
+MAX_VOCAL_SEGMENTS = 128       # cap VAD segments
+MAX_FX_EVENTS      = 64        # cap fx markers
+FX_CONF_MIN        = 0.50      # filter weak fx
+MAX_STRUCTURE_SEGS = 128       # cap structure segments
+
+# STFT grid shared by every extractor (librosa defaults), defined at REFERENCE_SR
+REFERENCE_SR = 44100
+N_FFT      = 2048
+HOP_LENGTH = 512
+
+
+def frame_grid(sr: int) -> tuple[int, int]:
+    """
+    (n_fft, hop_length) for `sr`, scaled by a power of two so frames keep roughly the
+    same duration (~46 ms window / ~11.6 ms hop) whatever rate the track is analysed at.
+    """
+    scale = 2.0 ** round(math.log2(sr / REFERENCE_SR))
+    return int(N_FFT * scale), int(HOP_LENGTH * scale)
+
+
+# --------------------
+# Extraction profiles
+# --------------------
+# Core features (tempo, key, loudness, spectral, dynamics) always run; these are optional.
+SECTIONS = ("vocals", "structure", "fx")
+
+
+@dataclass(frozen=True)
+class ExtractionProfile:
+    name: str
+    sections: tuple[str, ...]         # optional SECTIONS to compute
+    vocal_intensity: str = "hpss"     # hpss (full resolution) | spectral (decimated spectrogram)
+
+
+PROFILES = {
+    "fast": ExtractionProfile("fast", (), vocal_intensity="spectral"),
+    "standard": ExtractionProfile("standard", SECTIONS, vocal_intensity=settings.VOCAL_INTENSITY),
+    "full": ExtractionProfile("full", SECTIONS, vocal_intensity="hpss"),
+}
+
+# feedback_type (lower-cased) -> default profile; anything else gets settings.DEFAULT_PROFILE
+FEEDBACK_TYPE_PROFILES = {
+    "mix": "fast",
+    "mixing": "fast",
+    "mastering": "fast",
+    "loudness": "fast",
+    "arrangement": "standard",
+    "structure": "standard",
+    "creativity": "standard",
+    "full": "full",
+}
+
+
+def resolve_profile(name: Optional[str] = None, feedback_type: Optional[str] = None) -> ExtractionProfile:
+    """Explicit profile name, else the feedback_type default, else DEFAULT_PROFILE. Unknown names raise."""
+    if name:
+        try:
+            return PROFILES[name.strip().lower()]
+        except KeyError:
+            raise ValueError(f"Unknown profile {name!r}; expected one of {', '.join(PROFILES)}") from None
+    mapped = FEEDBACK_TYPE_PROFILES.get((feedback_type or "").strip().lower())
+    return PROFILES[mapped or settings.DEFAULT_PROFILE]
+
+
+# What the fingerprint hashes from this module: only values that change feature output. The
+# requested profile is hashed as itself; PROFILES / FEEDBACK_TYPE_PROFILES only choose one.
+FINGERPRINT_TUNABLES = (
+    "EXTRACTOR_VERSION",
+    "MAX_ENERGY_POINTS",
+    "MAX_TRANSIENTS",
+    "MAX_VOCAL_SEGMENTS",
+    "MAX_FX_EVENTS",
+    "FX_CONF_MIN",
+    "MAX_STRUCTURE_SEGS",
+    "REFERENCE_SR",
+    "N_FFT",
+    "HOP_LENGTH",
+)
+
+
+def extractor_fingerprint(profile: Optional[ExtractionProfile] = None) -> str:
+    """Short digest of the extractor version + tunables (+ profile); part of every feature-cache key."""
+    tunables = {k: globals()[k] for k in FINGERPRINT_TUNABLES}
+    if profile is not None:
+        tunables["PROFILE"] = asdict(profile)
+    # decode/estimator settings change the payload, so they version the cache too
+    tunables.update(
+        ANALYSIS_SR=settings.ANALYSIS_SR,
+        ANALYSIS_RES_TYPE=settings.ANALYSIS_RES_TYPE,
+        MAX_DURATION_SEC=settings.MAX_DURATION_SEC,
+        STREAM_ABOVE_SEC=settings.STREAM_ABOVE_SEC,
+        STREAM_MAX_DURATION_SEC=settings.STREAM_MAX_DURATION_SEC,
+        STREAM_BLOCK_SEC=settings.STREAM_BLOCK_SEC,
+    )
+    blob = json.dumps(tunables, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(blob, digest_size=6).hexdigest()
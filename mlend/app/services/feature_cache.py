@@ -0,0 +1,42 @@
+# services/feature_cache.py
+from __future__ import annotations
+import hashlib
+from typing import Optional
+
+from ..constants import settings
+from .extractor_config import ExtractionProfile, extractor_fingerprint
+from .file_cache import JsonFileCache
+
+HASH_CHUNK = 1024 * 1024
+
+
+def new_content_hasher():
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_file(path: str) -> str:
+    """BLAKE2b digest of the raw file bytes (the content half of a cache key)."""
+    h = new_content_hasher()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FeatureCache(JsonFileCache):
+    """
+    On-disk cache of `features_to_payload` output keyed by audio content hash plus
+    the extractor fingerprint, so changing a tunable invalidates old entries.
+    """
+
+    label = "feature_cache"
+
+    def key(self, content_hash: str, profile: Optional[ExtractionProfile] = None) -> str:
+        return f"{content_hash}-{extractor_fingerprint(profile)}"
+
+
+feature_cache = FeatureCache(
+    root=settings.FEATURE_CACHE_DIR,
+    max_bytes=settings.FEATURE_CACHE_MAX_MB * 1024 * 1024,
+    enabled=settings.FEATURE_CACHE_ENABLED,
+)
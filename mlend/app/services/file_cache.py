@@ -0,0 +1,105 @@
+# services/file_cache.py
+"""
+Storage shared by the on-disk caches: one JSON file per key under `root`, LRU eviction
+by mtime. Keys are the caller's business (see FeatureCache.key, LlmResponseCache.key).
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from ..logger import get_logger
+
+log = get_logger("file_cache")
+
+
+def evict_lru(paths, max_bytes: int, on_evict=None) -> int:
+    """
+    Delete least-recently-used files (by mtime) until their total size is below ~90%
+    of `max_bytes`; returns the remaining total. `on_evict(path)` cleans up companions.
+    """
+    entries = []
+    for p in paths:
+        try:
+            st = p.stat()
+            entries.append((st.st_mtime, st.st_size, p))
+        except FileNotFoundError:
+            continue
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return total
+    target = int(max_bytes * 0.9)  # evict a little extra to avoid thrashing
+    for _, size, p in entries:
+        if total <= target:
+            break
+        p.unlink(missing_ok=True)
+        if on_evict:
+            on_evict(p)
+        total -= size
+    return total
+
+
+class JsonFileCache:
+    """
+    JSON entries under `root/<key[:2]>/<key>.json`. A hit refreshes mtime and the oldest
+    entries are evicted once the directory exceeds `max_bytes` (LRU by mtime).
+    """
+
+    label = "file_cache"
+
+    def __init__(self, root: Path, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None  # lazily initialised from a directory scan
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        p = self._path(key)
+        try:
+            with p.open("r", encoding="utf-8") as f:
+                payload = json.load(f)
+            os.utime(p)  # mark as recently used
+            return payload
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning(f"[{self.label}] dropping unreadable entry {p.name}: {e}")
+            p.unlink(missing_ok=True)
+            return None
+
+    def put(self, key: str, payload: dict) -> None:
+        if not self.enabled:
+            return
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        tmp.write_bytes(data)
+        os.replace(tmp, p)  # atomic: readers never see a partial entry
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_bytes()
+            else:
+                self._approx_bytes += len(data)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        return [p for p in self.root.glob("*/*.json") if p.is_file()]
+
+    def _scan_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self._entries())
+
+    def _evict(self) -> None:
+        total = evict_lru(self._entries(), self.max_bytes)
+        self._approx_bytes = total
+        log.info(f"[{self.label}] evicted down to {total / (1024 * 1024):.1f} MB")
@@ -0,0 +1,69 @@
+# services/llm_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..constants import settings
+from .file_cache import JsonFileCache
+
+
+def request_key(*, model: str, messages: list, temperature: float, max_tokens: int,
+                response_format: str = "text", prompt_version: str = "") -> str:
+    """BLAKE2b digest of everything that shapes a chat-completions reply."""
+    blob = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": response_format,
+            "prompt_version": prompt_version,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+    return hashlib.blake2b(blob, digest_size=20).hexdigest()
+
+
+class LlmResponseCache(JsonFileCache):
+    """
+    On-disk cache of LLM replies keyed by `request_key`, so a double submit or a re-run
+    after a failed callback doesn't pay for the same completion twice. Same storage and
+    LRU eviction as the feature cache; entries also expire `ttl_sec` after they were stored.
+    """
+
+    label = "llm_cache"
+
+    def __init__(self, root: Path, max_bytes: int, ttl_sec: float, enabled: bool = True):
+        super().__init__(root, max_bytes, enabled)
+        self.ttl_sec = ttl_sec
+
+    def key(self, *, model: str, messages: list, temperature: float, max_tokens: int,
+            response_format: str = "text", prompt_version: str = "") -> str:
+        return request_key(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                           response_format=response_format, prompt_version=prompt_version)
+
+    def lookup(self, key: str) -> tuple[Optional[tuple[str, dict]], str]:
+        """((content, info) or None, "hit" | "miss" | "expired")."""
+        entry = self.get(key)
+        if entry is None:
+            return None, "miss"
+        if time.time() - entry.get("created_at", 0) > self.ttl_sec:
+            self._path(key).unlink(missing_ok=True)
+            return None, "expired"
+        return (entry["content"], entry["info"]), "hit"
+
+    def store(self, key: str, content: str, info: dict) -> None:
+        self.put(key, {"created_at": time.time(), "content": content, "info": info})
+
+
+llm_cache = LlmResponseCache(
+    root=settings.LLM_CACHE_DIR,
+    max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+    ttl_sec=settings.LLM_CACHE_TTL_SEC,
+    enabled=settings.LLM_CACHE_ENABLED,
+)
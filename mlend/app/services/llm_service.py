@@ -7,19 +7,94 @@ import requests
 import tiktoken
 from dotenv import load_dotenv
 from ..logger import get_logger
-import asyncio, random, httpx
+from ..constants import settings
+from ..metrics import LLM_CACHE_TOTAL, LLM_REQUEST_SECONDS, LLM_RETRIES_TOTAL, observe_llm_usage
+from ..prompts import PROMPT_VERSION
+from .llm_cache import llm_cache
+import asyncio, random, httpx, threading
+from typing import Optional
 
 load_dotenv()
 logger = get_logger(__name__)
 
+CHAT_COMPLETIONS_URL = f"{settings.OPENAI_BASE_URL.rstrip('/')}/chat/completions"
+# Usage reported for a reply served from the LLM cache.
+CACHED_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+# One pooled HTTP/2 client for the whole process; created lazily inside the running loop.
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(120, connect=10),  # generous read timeout for Cloud Run
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+                keepalive_expiry=60,
+            ),
+        )
+    return _http_client
+
+
+async def aclose_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# Encodings and services are built once per process and shared by every job.
+_encodings: dict = {}
+_services: dict = {}
+_registry_lock = threading.Lock()
+
+
+def get_encoding(model_name: str):
+    """tiktoken encoding for a model, loaded once (reading the BPE ranks is the slow part)."""
+    with _registry_lock:
+        enc = _encodings.get(model_name)
+        if enc is None:
+            try:
+                enc = tiktoken.encoding_for_model(model_name)
+            except KeyError as e:
+                raise ValueError(f"Unknown model {model_name!r} (MODEL_NAME): {e}") from e
+            _encodings[model_name] = enc
+        return enc
+
+
+def get_service(model_name: Optional[str] = None) -> "MLService":
+    """Shared MLService for `model_name` (default settings.MODEL_NAME), validated on first use."""
+    model_name = settings.MODEL_NAME if model_name is None else model_name
+    svc = _services.get(model_name)
+    if svc is None:
+        svc = MLService(model_name=model_name)
+        with _registry_lock:
+            svc = _services.setdefault(model_name, svc)
+    return svc
+
+
+def warmup_services() -> "MLService":
+    """Build the default service at startup so misconfiguration fails the deploy, not the first job."""
+    started = time.perf_counter()
+    svc = get_service()
+    svc.count_tokens("warmup")
+    logger.info(f"[llm] {svc.model} ready in {time.perf_counter() - started:.2f}s")
+    return svc
+
 
 class MLService:
     def __init__(self, model_name: str = "gpt-4o-mini"):
         self.api_key = os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY is not set.")
+        if not model_name:
+            raise ValueError("MODEL_NAME is not set.")
         self.model = model_name
-        self.encoding = tiktoken.encoding_for_model(model_name)
+        self.encoding = get_encoding(model_name)
 
     def count_tokens(self, text: str) -> int:
         return len(self.encoding.encode(text))
@@ -29,6 +104,24 @@ class MLService:
         with open(image_path, "rb") as f:
             return base64.b64encode(f.read()).decode("utf-8")
 
+    def _cache_key(self, use_cache: bool, call_type: str, **request) -> Optional[str]:
+        """Cache key for a request, or None when the cache is off; `use_cache=False` still refreshes the entry."""
+        if not llm_cache.enabled:
+            return None
+        if not use_cache:
+            LLM_CACHE_TOTAL.inc(call_type=call_type, result="bypass")
+        return llm_cache.key(**request)
+
+    def _cached_reply(self, key: str, call_type: str) -> Optional[tuple[str, dict]]:
+        hit, result = llm_cache.lookup(key)
+        LLM_CACHE_TOTAL.inc(call_type=call_type, result=result)
+        if hit is None:
+            return None
+        content, info = hit
+        logger.info(f"[{call_type}] served from LLM cache")
+        # nothing was billed for this call; the stored usage belongs to the original one
+        return content, {**info, "type": call_type, "usage": dict(CACHED_USAGE), "cost": 0.0, "cached": True}
+
     def call_llm(
         self,
         messages: list,
@@ -40,8 +133,18 @@ class MLService:
         max_retries: int = 10,          # up to 10 total attempts
         backoff_start: float = 10.0,    # start with 10s
         backoff_cap: float = 120.0,     # cap at 120s
+        use_cache: bool = True,         # False skips the lookup (the fresh reply is still stored)
+        prompt_version: str = PROMPT_VERSION,
     ):
         model = model or self.model
+        cache_key = self._cache_key(
+            use_cache, call_type, model=model, messages=messages, temperature=temperature,
+            max_tokens=max_tokens, response_format=response_format, prompt_version=prompt_version,
+        )
+        if cache_key and use_cache:
+            cached = self._cached_reply(cache_key, call_type)
+            if cached is not None:
+                return cached
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -57,11 +160,12 @@ class MLService:
             payload["response_format"] = {"type": response_format}
 
         backoff = backoff_start
+        started = time.perf_counter()
 
         for attempt in range(1, max_retries + 1):
             try:
                 resp = requests.post(
-                    "https://api.openai.com/v1/chat/completions",
+                    CHAT_COMPLETIONS_URL,
                     headers=headers,
                     json=payload,
                     timeout=120,  # be generous in serverless environments
@@ -82,6 +186,7 @@ class MLService:
                             f"[{call_type}] HTTP {resp.status_code}; retrying in {wait_sec:.2f}s "
                             f"(attempt {attempt}/{max_retries})"
                         )
+                        LLM_RETRIES_TOTAL.inc(call_type=call_type, reason=str(resp.status_code))
                         time.sleep(wait_sec)
                         backoff = min(backoff * 1.5, backoff_cap)
                         continue
@@ -106,12 +211,18 @@ class MLService:
                     raise RuntimeError(f"[{call_type}] invalid content type: {type(content).__name__}")
 
                 usage = result.get("usage", {})
-                return content, {
+                cost = self.calculate_text_model_cost(usage, model)
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, call_type=call_type, model=model)
+                observe_llm_usage(call_type, model, usage, cost)
+                info = {
                     "type": call_type,
                     "model": model,
                     "usage": usage,
-                    "cost": self.calculate_text_model_cost(usage, model),
+                    "cost": cost,
                 }
+                if cache_key and content:  # never replay an empty reply
+                    llm_cache.store(cache_key, content, info)
+                return content, info
 
             except (requests.Timeout, requests.ConnectionError) as e:
                 if attempt < max_retries:
@@ -119,6 +230,7 @@ class MLService:
                         f"[{call_type}] network error: {e}. Retrying in {backoff:.2f}s "
                         f"(attempt {attempt}/{max_retries})"
                     )
+                    LLM_RETRIES_TOTAL.inc(call_type=call_type, reason="network")
                     time.sleep(backoff)
                     backoff = min(backoff * 1.5, backoff_cap)
                     continue
@@ -147,11 +259,21 @@ class MLService:
         response_format: str = "text",
         call_type: str = "llm_call_async",
         max_retries: int = 10,                 # was 3
-        client: httpx.AsyncClient = None,
+        client: httpx.AsyncClient = None,      # defaults to the shared pooled client
         backoff_start: float = 10.0,           # NEW: long starting backoff
         backoff_cap: float = 120.0,            # NEW: allow large cap
+        use_cache: bool = True,                # False skips the lookup (the fresh reply is still stored)
+        prompt_version: str = PROMPT_VERSION,
     ):
         model = model or self.model
+        cache_key = self._cache_key(
+            use_cache, call_type, model=model, messages=messages, temperature=temperature,
+            max_tokens=max_tokens, response_format=response_format, prompt_version=prompt_version,
+        )
+        if cache_key and use_cache:
+            cached = await asyncio.to_thread(self._cached_reply, cache_key, call_type)
+            if cached is not None:
+                return cached
         payload = {
             "model": model,
             "messages": messages,
@@ -167,58 +289,66 @@ class MLService:
         }
 
         backoff = backoff_start
-        _own_client = client is None
-        if _own_client:
-            client = httpx.AsyncClient(timeout=120)  # was 45/60; give Cloud Run more room
-
-        try:
-            for attempt in range(1, max_retries + 1):
-                try:
-                    r = await client.post(
-                        "https://api.openai.com/v1/chat/completions",
-                        headers=headers,
-                        json=payload,
-                    )
+        client = client or get_http_client()
+        started = time.perf_counter()
 
-                    # Retryable HTTPs
-                    if r.status_code in (429, 500, 502, 503, 504):
+        for attempt in range(1, max_retries + 1):
+            try:
+                r = await client.post(CHAT_COMPLETIONS_URL, headers=headers, json=payload)
+
+                # Retryable HTTPs
+                if r.status_code in (429, 500, 502, 503, 504):
+                    if attempt < max_retries:
                         ra = r.headers.get("Retry-After")
-                        wait = (float(ra) + 1.0) if ra else backoff + random.uniform(0, 0.5)
+                        try:
+                            wait = float(ra) + 1.0 if ra else backoff + random.uniform(0, 0.5)
+                        except ValueError:
+                            wait = backoff + random.uniform(0, 0.5)
                         logger.warning(f"[{call_type}] {r.status_code}; sleeping {wait:.2f}s (attempt {attempt}/{max_retries})")
+                        LLM_RETRIES_TOTAL.inc(call_type=call_type, reason=str(r.status_code))
                         await asyncio.sleep(wait)
                         backoff = min(backoff * 1.5, backoff_cap)
                         continue
+                    logger.error(f"[{call_type}] HTTP {r.status_code} after {attempt} attempts: {r.text[:500]}")
 
-                    # Non-retryable HTTP errors -> raise
-                    r.raise_for_status()
-
-                    # Success
-                    result = r.json()
-                    content = result["choices"][0]["message"]["content"]
-                    usage = result.get("usage", {})
-                    return content, {
-                        "type": call_type,
-                        "model": model,
-                        "usage": usage,
-                        "cost": self.calculate_text_model_cost(usage, model),
-                    }
-
-                except (httpx.ConnectTimeout, httpx.ReadTimeout, httpx.TransportError) as e:
-                    if attempt < max_retries:
-                        wait = backoff + random.uniform(0, 0.5)
-                        logger.warning(f"[{call_type}] network error {e}; retrying in {wait:.2f}s (attempt {attempt}/{max_retries})")
-                        await asyncio.sleep(wait)
-                        backoff = min(backoff * 1.5, backoff_cap)
-                        continue
-                    logger.error(f"[{call_type}] network error, giving up after {attempt} attempts: {e}")
-                    raise
+                # Non-retryable HTTP errors (or retries exhausted) -> raise
+                r.raise_for_status()
 
-            # Exhausted loop without return
-            raise RuntimeError(f"[{call_type}] exhausted retries without success")
+                # Success
+                result = r.json()
+                choices = result.get("choices") or []
+                if not choices or "content" not in (choices[0].get("message") or {}):
+                    raise RuntimeError(f"[{call_type}] invalid response payload (missing choices/message/content)")
+                content = choices[0]["message"]["content"]
+                if not isinstance(content, str):
+                    raise RuntimeError(f"[{call_type}] invalid content type: {type(content).__name__}")
+                usage = result.get("usage", {})
+                cost = self.calculate_text_model_cost(usage, model)
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, call_type=call_type, model=model)
+                observe_llm_usage(call_type, model, usage, cost)
+                info = {
+                    "type": call_type,
+                    "model": model,
+                    "usage": usage,
+                    "cost": cost,
+                }
+                if cache_key and content:  # never replay an empty reply
+                    await asyncio.to_thread(llm_cache.store, cache_key, content, info)
+                return content, info
+
+            except httpx.TransportError as e:
+                if attempt < max_retries:
+                    wait = backoff + random.uniform(0, 0.5)
+                    logger.warning(f"[{call_type}] network error {e}; retrying in {wait:.2f}s (attempt {attempt}/{max_retries})")
+                    LLM_RETRIES_TOTAL.inc(call_type=call_type, reason="network")
+                    await asyncio.sleep(wait)
+                    backoff = min(backoff * 1.5, backoff_cap)
+                    continue
+                logger.error(f"[{call_type}] network error, giving up after {attempt} attempts: {e}")
+                raise
 
-        finally:
-            if _own_client:
-                await client.aclose()
+        # Exhausted loop without return
+        raise RuntimeError(f"[{call_type}] exhausted retries without success")
 
     def calculate_text_model_cost(self, usage: dict, model_name: str) -> float:
         pricing = {
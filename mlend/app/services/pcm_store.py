@@ -0,0 +1,106 @@
+# services/pcm_store.py
+from __future__ import annotations
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from ..constants import settings
+from ..logger import get_logger
+from .decode import DecodedAudio, load_audio
+from .feature_cache import hash_file
+from .file_cache import evict_lru
+
+log = get_logger("pcm_store")
+
+
+class PcmStore:
+    """
+    Decoded-audio store: mono float32 PCM at the analysis rate is written once as a raw
+    file (+ JSON sidecar) and re-opened with `np.memmap` on later jobs, so repeat and
+    reference tracks skip ffmpeg/audioread decoding and extractors read the mapped
+    buffer directly. Keys combine the content hash with the decode settings.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    def key(self, content_hash: str) -> str:
+        return (f"{content_hash}-sr{settings.ANALYSIS_SR}-{settings.ANALYSIS_RES_TYPE}"
+                f"-max{settings.MAX_DURATION_SEC}")
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        return self.root / f"{key}.f32", self.root / f"{key}.json"
+
+    def open(self, key: str) -> Optional[DecodedAudio]:
+        raw, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if raw.stat().st_size != meta["n_samples"] * 4:
+                raise ValueError("size mismatch")
+            y = np.memmap(raw, dtype=np.float32, mode="r", shape=(meta["n_samples"],))
+            os.utime(raw)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"[pcm_store] dropping unreadable entry {key}: {e}")
+            raw.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+            return None
+        return DecodedAudio(
+            y=y,
+            sr=meta["sr"],
+            source_sr=meta.get("source_sr"),
+            source_duration=meta.get("source_duration"),
+            truncated=meta.get("truncated", False),
+        )
+
+    def write(self, key: str, audio: DecodedAudio) -> None:
+        raw, meta_path = self._paths(key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_raw, tmp_meta = raw.with_suffix(suffix), meta_path.with_suffix(suffix + "m")
+        np.ascontiguousarray(audio.y, dtype=np.float32).tofile(tmp_raw)
+        tmp_meta.write_text(json.dumps({
+            "n_samples": int(len(audio.y)),
+            "sr": audio.sr,
+            "source_sr": audio.source_sr,
+            "source_duration": audio.source_duration,
+            "truncated": audio.truncated,
+        }), encoding="utf-8")
+        # raw first: a sidecar only ever points at a complete PCM file
+        os.replace(tmp_raw, raw)
+        os.replace(tmp_meta, meta_path)
+        evict_lru(
+            [p for p in self.root.glob("*.f32") if p != raw],
+            max(0, self.max_bytes - raw.stat().st_size),
+            on_evict=lambda p: p.with_suffix(".json").unlink(missing_ok=True),
+        )
+
+    def load(self, path: str, content_hash: Optional[str] = None) -> DecodedAudio:
+        """Memory-mapped PCM for `path` if already decoded; otherwise decode, store and map it."""
+        if not self.enabled:
+            return load_audio(path)
+        key = self.key(content_hash or hash_file(path))
+        audio = self.open(key)
+        if audio is not None:
+            return audio
+        audio = load_audio(path)
+        try:
+            self.write(key, audio)
+        except OSError as e:
+            log.warning(f"[pcm_store] could not persist {key}: {e}")
+            return audio
+        return self.open(key) or audio
+
+
+pcm_store = PcmStore(
+    root=settings.CLIPS_DIR,
+    max_bytes=settings.PCM_STORE_MAX_MB * 1024 * 1024,
+    enabled=settings.PCM_STORE_ENABLED,
+)
@@ -0,0 +1,98 @@
+# services/profiling.py
+from __future__ import annotations
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size from /proc (Linux); None where unavailable."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssSampler:
+    """
+    Background thread polling RSS so short-lived allocation peaks inside a stage are seen.
+    Each open stage holds a watch cell that records the highest RSS seen while it was open,
+    so nested stages (e.g. a "total" around the others) each get their own peak.
+    """
+
+    def __init__(self, interval_sec: float = 0.002):
+        self.interval_sec = interval_sec
+        self._open: Dict[int, list[int]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_sec):
+            rss = current_rss_bytes() or 0
+            for cell in list(self._open.values()):
+                if rss > cell[0]:
+                    cell[0] = rss
+
+    def watch(self) -> list[int]:
+        cell = [current_rss_bytes() or 0]
+        self._open[id(cell)] = cell
+        return cell
+
+    def unwatch(self, cell: list[int]) -> int:
+        self._open.pop(id(cell), None)
+        return max(cell[0], current_rss_bytes() or 0)
+
+    def start(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class StageTimer:
+    """
+    Accumulates wall time, CPU time and (optionally) peak RSS per named stage.
+    Repeated stages add up. Pass one to `extract_features` to get a per-stage breakdown.
+    """
+
+    def __init__(self, track_rss: bool = False):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._sampler = RssSampler().start() if track_rss and current_rss_bytes() is not None else None
+
+    @contextmanager
+    def stage(self, name: str):
+        cell = self._sampler.watch() if self._sampler else None
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            rec = self.stages.setdefault(name, {"wall_sec": 0.0, "cpu_sec": 0.0})
+            rec["wall_sec"] += time.perf_counter() - t0
+            rec["cpu_sec"] += time.process_time() - c0
+            if cell is not None:
+                rss = self._sampler.unwatch(cell)
+                rec["peak_rss_mb"] = max(rec.get("peak_rss_mb", 0.0), rss / (1024 * 1024))
+
+    def close(self) -> None:
+        if self._sampler:
+            self._sampler.stop()
+            self._sampler = None
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {name: {k: round(v, 4) for k, v in rec.items()} for name, rec in self.stages.items()}
+
+
+class _NullTimer:
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+
+NULL_TIMER = _NullTimer()
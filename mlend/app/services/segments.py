@@ -0,0 +1,56 @@
+# services/segments.py
+"""
+Run-length and boundary helpers shared by the silence, VAD and structure segmenters.
+Everything stays in index/second arrays; `features_to_payload` builds the dicts.
+"""
+from __future__ import annotations
+from typing import Tuple
+
+import numpy as np
+
+NO_SEGMENTS = np.empty((0, 2))
+
+
+def true_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and stop (exclusive) indices of each run of True in a 1-D boolean mask."""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def runs(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(starts, stops (exclusive), value) of each run of equal values in a non-empty 1-D array."""
+    change = np.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = np.concatenate([[0], change])
+    stops = np.concatenate([change, [len(values)]])
+    return starts, stops, values[starts]
+
+
+def min_gap_boundaries(bounds: np.ndarray, min_gap: float) -> np.ndarray:
+    """
+    Greedy left-to-right thinning of sorted boundaries: keep the first, then each next one
+    at least `min_gap` after the last kept. Jumps with searchsorted, so the Python loop runs
+    once per kept boundary rather than once per candidate.
+    """
+    n = len(bounds)
+    if n == 0:
+        return bounds
+    kept = [0]
+    i = 0
+    while True:
+        last = bounds[i]
+        j = max(int(np.searchsorted(bounds, last + min_gap)), i + 1)
+        # the float sum can land one slot off the `b - last >= min_gap` test; settle on the exact index
+        while j > i + 1 and bounds[j - 1] - last >= min_gap:
+            j -= 1
+        while j < n and bounds[j] - last < min_gap:
+            j += 1
+        if j >= n:
+            return bounds[kept]
+        kept.append(j)
+        i = j
+
+
+def span_means(values: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Mean of `values[a:b]` per span (spans may be empty at the array end: b is raised to a + 1)."""
+    stops = np.maximum(stops, starts + 1)
+    return np.array([values[a:b].mean() for a, b in zip(starts, stops)], dtype=np.float64)
@@ -0,0 +1,404 @@
+# services/streaming.py
+"""
+Block-wise analysis for long tracks (DJ mixes, live sets).
+
+The file is decoded in fixed STREAM_BLOCK_SEC blocks, resampled with a stateful soxr
+stream, and every frame-wise view `extract_features` needs (RMS, spectral stats, onset
+envelopes, novelty, chroma, vocal intensity, VAD flags) is computed block by block
+with the small amount of state each one needs carried across block edges. Only the
+per-frame series (about 1/500 of the PCM) grow with track length; decoded audio,
+spectrograms and mel bands never exist for more than one block.
+
+The result, `StreamedAnalysis`, exposes the same attributes as `AnalysisContext`, so
+`audio_service._summarise` builds the same payload from either.
+"""
+from __future__ import annotations
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import librosa
+import soxr
+import webrtcvad
+from scipy.signal import get_window, sosfilt
+
+from ..constants import settings
+from .audio_service import (
+    AnalysisContext,
+    _harmonic_abs_sum,
+    _speech_band_sos,
+    _speech_segments,
+    _vocal_intensity_hpss,
+    _webrtc_flags,
+)
+from .decode import check_duration, duration_limit, probe
+from .extractor_config import HOP_LENGTH, N_FFT, frame_grid
+from .segments import NO_SEGMENTS
+
+VAD_SR = 16000
+TOP_DB = 80.0
+AMIN = 1e-10
+
+
+def _soxr_quality(res_type: str) -> str:
+    # librosa's "soxr_hq" etc.; non-soxr resamplers have no streaming form, so use soxr HQ
+    return res_type if res_type.startswith("soxr") else "soxr_hq"
+
+
+class _Framer:
+    """
+    Centered framing over a signal that arrives in pieces, matching librosa's center=True
+    frames (1 + len // hop of them): zero padding as in `stft`, or edge copies as in
+    `zero_crossing_rate`.
+    """
+
+    def __init__(self, frame_length: int, hop_length: int, pad_mode: str = "constant"):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.pad_mode = pad_mode
+        self._buf: Optional[np.ndarray] = None
+        self._last = 0.0
+
+    def push(self, x: np.ndarray) -> np.ndarray:
+        """Frames (n, frame_length) completed by `x`."""
+        if self._buf is None:
+            first = x[0] if (self.pad_mode == "edge" and len(x)) else 0.0
+            self._buf = np.full(self.frame_length // 2, first, dtype=np.float32)
+        if len(x):
+            self._last = x[-1]
+        buf = np.concatenate([self._buf, x])
+        n = 1 + (len(buf) - self.frame_length) // self.hop_length if len(buf) >= self.frame_length else 0
+        if n == 0:
+            self._buf = buf
+            return np.empty((0, self.frame_length), dtype=np.float32)
+        self._buf = buf[n * self.hop_length:]
+        return librosa.util.frame(buf[:(n - 1) * self.hop_length + self.frame_length],
+                                  frame_length=self.frame_length, hop_length=self.hop_length, axis=0)
+
+    def finish(self) -> np.ndarray:
+        tail = self._last if self.pad_mode == "edge" else 0.0
+        return self.push(np.full(self.frame_length // 2, tail, dtype=np.float32))
+
+
+def _take_chunks(pending: List[np.ndarray], chunk: int, final: bool) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    (chunks to analyse now, what stays pending) for audio buffered in `pending`. One full
+    chunk is kept behind so a short tail is analysed together with the chunk before it.
+    """
+    n = sum(len(p) for p in pending)
+    if n < 2 * chunk and not (final and n):
+        return [], pending
+    ally = np.concatenate(pending)
+    if final:
+        return [ally], []
+    stop = (n // chunk - 1) * chunk
+    return [ally[i:i + chunk] for i in range(0, stop, chunk)], [ally[stop:]]
+
+
+def _spectrum(frames: np.ndarray, window: np.ndarray) -> np.ndarray:
+    """|STFT| (bins, n) of pre-cut frames, same precision as librosa.stft on float32 audio."""
+    return np.abs(np.fft.rfft(frames * window, axis=-1).astype(np.complex64)).T
+
+
+def _source_blocks(path: str, block_sec: float, max_sec: float) -> Tuple[int, Iterator[np.ndarray]]:
+    """(native rate, iterator of mono float32 blocks), stopping at `max_sec` like `librosa.load`."""
+    import soundfile as sf
+    try:
+        info = sf.info(path)
+    except sf.SoundFileRuntimeError:
+        return _audioread_blocks(path, block_sec, max_sec)
+    sr = int(info.samplerate)
+    blocks = sf.blocks(path, blocksize=max(1, int(block_sec * sr)), frames=int(max_sec * sr),
+                       dtype="float32", always_2d=True)
+    return sr, (b.mean(axis=1, dtype=np.float32) for b in blocks)
+
+
+def _audioread_blocks(path: str, block_sec: float, max_sec: float) -> Tuple[int, Iterator[np.ndarray]]:
+    import audioread
+    f = audioread.audio_open(path)
+    sr, channels = int(f.samplerate), int(f.channels)
+    block, limit = int(block_sec * sr) * channels, int(max_sec * sr) * channels
+
+    def gen():
+        pending: List[np.ndarray] = []
+        size = seen = 0
+        with f:
+            for buf in f:
+                x = librosa.util.buf_to_float(buf, dtype=np.float32)[:max(0, limit - seen)]
+                seen += len(x)
+                pending.append(x)
+                size += len(x)
+                if size >= block or seen >= limit:
+                    x = np.concatenate(pending)
+                    cut = len(x) - len(x) % channels
+                    pending, size = [x[cut:]], len(x) - cut
+                    yield x[:cut].reshape(-1, channels).mean(axis=1)
+                if seen >= limit:
+                    break
+        if size:
+            x = np.concatenate(pending)
+            yield x[:len(x) - len(x) % channels].reshape(-1, channels).mean(axis=1)
+
+    return sr, gen()
+
+
+class _Resampler:
+    """Stateful soxr resampling with librosa.resample's output length (ceil(n * ratio))."""
+
+    def __init__(self, in_sr: int, out_sr: int, quality: str):
+        self.ratio = out_sr / in_sr
+        self._stream = soxr.ResampleStream(in_sr, out_sr, 1, dtype="float32", quality=quality) \
+            if in_sr != out_sr else None
+        self.n_in = self.n_out = 0
+
+    def push(self, x: np.ndarray, last: bool = False) -> np.ndarray:
+        self.n_in += len(x)
+        y = x if self._stream is None else self._stream.resample_chunk(x, last=last)
+        if last and self._stream is not None:
+            want = int(np.ceil(self.n_in * self.ratio)) - self.n_out
+            y = y[:want] if len(y) >= want else np.pad(y, (0, want - len(y)))
+        self.n_out += len(y)
+        return y.astype(np.float32, copy=False)
+
+
+class _StreamingVad:
+    """`audio_service._vad_segments_webrtc` fed block by block (filter, resampler and Vad keep state)."""
+
+    def __init__(self, sr: int, aggressiveness: int = 2, frame_ms: int = 30, min_seg_ms: int = 300,
+                 energy_gate_db: float = -45.0):
+        self.frame_ms, self.min_seg_ms, self.energy_gate_db = frame_ms, min_seg_ms, energy_gate_db
+        self.sos = _speech_band_sos(sr)
+        self.zi = np.zeros((len(self.sos), 2))      # zero initial state, as a one-shot sosfilt
+        self.gate = _Framer(N_FFT, HOP_LENGTH)       # _frame_rms defaults
+        self.rms_sum, self.rms_n = 0.0, 0
+        self.to16k = _Resampler(sr, VAD_SR, "soxr_hq")
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.frame_len = int(VAD_SR * frame_ms / 1000)
+        self.carry = np.empty(0, dtype=np.int16)
+        self.flags: List[np.ndarray] = []
+        self.zcr_framer = _Framer(2 * self.frame_len, self.frame_len, pad_mode="edge")
+        self.stft_framer = _Framer(2 * self.frame_len, self.frame_len)
+        self.window = get_window("hann", 2 * self.frame_len)
+        self.zcr: List[np.ndarray] = []
+        self.flat: List[np.ndarray] = []
+
+    def push(self, y: np.ndarray, last: bool = False) -> None:
+        band, self.zi = sosfilt(self.sos, y, zi=self.zi)
+        band = band.astype(np.float32)
+        self._gate(self.gate.push(band))
+        y16 = self.to16k.push(band, last=last)
+
+        pcm16 = np.concatenate([self.carry, (np.clip(y16, -1.0, 1.0) * 32767).astype(np.int16)])
+        n = len(pcm16) // self.frame_len * self.frame_len
+        self.flags.append(_webrtc_flags(pcm16[:n], self.frame_len, self.vad))
+        self.carry = pcm16[n:]
+
+        self._timbre(self.zcr_framer.push(y16), self.stft_framer.push(y16))
+        if last:
+            self._gate(self.gate.finish())
+            self._timbre(self.zcr_framer.finish(), self.stft_framer.finish())
+
+    def _gate(self, frames: np.ndarray) -> None:
+        if len(frames):
+            self.rms_sum += float(np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=-1)).sum())
+            self.rms_n += len(frames)
+
+    def _timbre(self, zcr_frames: np.ndarray, stft_frames: np.ndarray) -> None:
+        if len(zcr_frames):
+            self.zcr.append(librosa.zero_crossings(zcr_frames, pad=False, axis=-1).mean(axis=-1))
+        if len(stft_frames):
+            self.flat.append(librosa.feature.spectral_flatness(S=_spectrum(stft_frames, self.window))[0])
+
+    def segments(self):
+        rms_db = 20 * np.log10(max(self.rms_sum / max(self.rms_n, 1), 1e-12))
+        flags = np.concatenate(self.flags) if self.flags else np.empty(0, dtype=bool)
+        if rms_db < self.energy_gate_db or not flags.size:
+            return NO_SEGMENTS
+        return _speech_segments(flags, np.concatenate(self.zcr), np.concatenate(self.flat),
+                                self.frame_ms, self.min_seg_ms)
+
+
+class StreamedAnalysis:
+    """
+    Frame-wise features of a whole track computed in one block-wise pass; attribute
+    names follow `AnalysisContext`. vocal_intensity uses the profile's estimator; HPSS
+    runs per STREAM_BLOCK_SEC chunk.
+    """
+
+    def __init__(self, sr: int, source_sr: int, n_fft: int, hop_length: int):
+        self.sr, self.source_sr = sr, source_sr
+        self.n_fft, self.hop_length = n_fft, hop_length
+        self.duration = 0.0
+        self.truncated = False
+        self.vocal_intensity: Optional[float] = None
+        self.vocal_segments: np.ndarray = NO_SEGMENTS
+
+    def release(self, *names: str) -> None:
+        """Nothing to drop: only per-frame series are kept."""
+
+    def _finalise(self, series: dict) -> None:
+        for name, parts in series.items():
+            setattr(self, name, np.concatenate(parts) if parts else np.empty(0, dtype=np.float32))
+        self.frame_times = librosa.times_like(len(self.rms), sr=self.sr, hop_length=self.hop_length)
+        self.rms_times = self.frame_times
+        self.onset_times = librosa.times_like(self.onset_env, sr=self.sr, hop_length=self.hop_length)
+
+
+class _BlockAnalyser:
+    """Carries the cross-block state for one track; `push` analysis-rate audio, then `result`."""
+
+    SERIES = ("rms", "zcr", "centroid", "bandwidth", "rolloff", "flatness", "novelty", "onset_env", "beat_onset_env")
+
+    def __init__(self, out: StreamedAnalysis, block_sec: float, vocals: bool, intensity: str = "spectral"):
+        sr, n_fft, hop = out.sr, out.n_fft, out.hop_length
+        self.out = out
+        self.frames_z = _Framer(n_fft, hop)                   # stft / rms
+        self.frames_e = _Framer(n_fft, hop, pad_mode="edge")  # zero_crossing_rate
+        self.window = get_window("hann", n_fft)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+        self.series = {k: [] for k in self.SERIES}
+        self.db_max = -np.inf
+        self.prev_db: Optional[np.ndarray] = None
+        self.prev_P: Optional[np.ndarray] = None
+        self.vad = _StreamingVad(sr) if vocals else None
+        self.hpss = vocals and intensity == "hpss"
+
+        self.harm_chunk = max(4, int(block_sec * sr / hop) // 4 * 4)  # multiple of the pooling step
+        self.harm_pending: List[np.ndarray] = []
+        self.harm_sum, self.harm_frames = 0.0, 0
+        self.chroma_chunk = int(block_sec * sr)
+        self.chroma_pending: List[np.ndarray] = []
+        self.chroma_sum, self.chroma_frames = np.zeros(12), 0
+        self.hpss_pending: List[np.ndarray] = []
+        self.hpss_sum, self.hpss_samples = 0.0, 0
+
+    def push(self, y: np.ndarray, last: bool = False) -> None:
+        self._frames(self.frames_z.push(y), self.frames_e.push(y))
+        self._chroma(y)
+        if self.vad is not None:
+            self.vad.push(y, last=last)
+        if self.hpss:
+            self._harmonic_hpss(y)
+        if last:
+            self._frames(self.frames_z.finish(), self.frames_e.finish())
+            self._chroma(None, final=True)
+            if self.hpss:
+                self._harmonic_hpss(None, final=True)
+            else:
+                self._harmonic(None, final=True)
+
+    def _frames(self, zf: np.ndarray, ef: np.ndarray) -> None:
+        series, sr = self.series, self.out.sr
+        if len(ef):
+            series["zcr"].append(librosa.zero_crossings(ef, pad=False, axis=-1).mean(axis=-1))
+        if not len(zf):
+            return
+        series["rms"].append(np.sqrt(np.mean(zf.astype(np.float64) ** 2, axis=-1)).astype(np.float32))
+        S = _spectrum(zf, self.window)
+        P = S ** 2
+        series["centroid"].append(librosa.feature.spectral_centroid(S=S, sr=sr)[0])
+        series["bandwidth"].append(librosa.feature.spectral_bandwidth(S=S, sr=sr)[0])
+        series["rolloff"].append(librosa.feature.spectral_rolloff(S=S, sr=sr)[0])
+        series["flatness"].append(librosa.feature.spectral_flatness(S=S)[0])
+
+        # positive spectral flux against the previous frame (the track's first frame scores 0)
+        prev_P = self.prev_P if self.prev_P is not None else P[:, :1]
+        series["novelty"].append(np.maximum(0, np.diff(np.concatenate([prev_P, P], axis=1), axis=1)).sum(axis=0))
+        self.prev_P = P[:, -1:]
+
+        # power_to_db(melspectrogram) with the top_db floor taken from the running max
+        db = 10.0 * np.log10(np.maximum(AMIN, self.mel_basis @ P))
+        self.db_max = max(self.db_max, float(db.max()))
+        db = np.maximum(db, self.db_max - TOP_DB)
+        ref = db if self.prev_db is None else np.concatenate([self.prev_db, db], axis=1)
+        diff = np.maximum(0.0, np.diff(ref, axis=1))
+        self.prev_db = db[:, -1:]
+        series["onset_env"].append(diff.mean(axis=0))
+        series["beat_onset_env"].append(np.median(diff, axis=0))
+
+        if self.vad is not None and not self.hpss:
+            self._harmonic(P)
+
+    def _harmonic(self, P: Optional[np.ndarray], final: bool = False) -> None:
+        if P is not None:
+            self.harm_pending.append(P)
+        n, chunk = sum(p.shape[1] for p in self.harm_pending), self.harm_chunk
+        if n < chunk and not (final and n):
+            return
+        allP = np.concatenate(self.harm_pending, axis=1)
+        stop = n if final else n // chunk * chunk
+        for i in range(0, stop, chunk):
+            total, frames = _harmonic_abs_sum(allP[:, i:i + chunk], self.out.n_fft)
+            self.harm_sum += total
+            self.harm_frames += frames
+        self.harm_pending = [allP[:, stop:]]
+
+    def _chroma(self, y: Optional[np.ndarray], final: bool = False) -> None:
+        if y is not None:
+            self.chroma_pending.append(y)
+        chunks, self.chroma_pending = _take_chunks(self.chroma_pending, self.chroma_chunk, final)
+        for c in chunks:
+            C = librosa.feature.chroma_cqt(y=c, sr=self.out.sr, hop_length=self.out.hop_length)
+            self.chroma_sum += C.sum(axis=1)
+            self.chroma_frames += C.shape[1]
+
+    def _harmonic_hpss(self, y: Optional[np.ndarray], final: bool = False) -> None:
+        """The "full" profile's estimator: HPSS + inverse STFT per chunk, as a sample-weighted mean."""
+        if y is not None:
+            self.hpss_pending.append(y)
+        chunks, self.hpss_pending = _take_chunks(self.hpss_pending, self.chroma_chunk, final)
+        for c in chunks:
+            self.hpss_sum += _vocal_intensity_hpss(AnalysisContext(c, self.out.sr)) * len(c)
+            self.hpss_samples += len(c)
+
+    def result(self, n_samples: int) -> StreamedAnalysis:
+        out, series = self.out, self.series
+        n_frames = sum(len(x) for x in series["rms"])
+        # onset_strength: lag 1 plus its center=True shift of n_fft // (2 * hop) (own default n_fft=2048)
+        pad = [np.zeros(1 + 2048 // (2 * out.hop_length), dtype=np.float32)]
+        for name in ("onset_env", "beat_onset_env"):
+            series[name] = [np.concatenate(pad + series[name])[:n_frames]]
+        series["novelty"] = [np.concatenate(series["novelty"]).astype(np.float64)]
+        out._finalise(series)
+        out.duration = n_samples / out.sr
+        out.chroma_mean = self.chroma_sum / max(self.chroma_frames, 1)
+        if self.vad is not None:
+            out.vocal_intensity = (self.hpss_sum / max(self.hpss_samples, 1) if self.hpss
+                                   else self.harm_sum / max(self.harm_frames, 1))
+            out.vocal_segments = self.vad.segments()
+        return out
+
+
+def stream_analysis(path: str, *, vocals: bool = True, intensity: str = "spectral",
+                    block_sec: Optional[float] = None,
+                    analysis_sr: int = settings.ANALYSIS_SR,
+                    max_sec: Optional[float] = None) -> StreamedAnalysis:
+    """
+    One pass over `path` in `block_sec` blocks (default STREAM_BLOCK_SEC). Per-frame
+    values match the in-memory path except for the mel dB floor (top_db below the running
+    rather than the global max), chroma tuning (estimated per block) and block edges of
+    the vocal-intensity median filters. `intensity` is the profile's vocal_intensity
+    estimator (hpss | spectral).
+    """
+    block_sec = block_sec or settings.STREAM_BLOCK_SEC
+    max_sec = duration_limit() if max_sec is None else max_sec
+    info = probe(path)
+    check_duration(info, max_sec)
+    source_sr, blocks = _source_blocks(path, block_sec, max_sec)
+    sr = analysis_sr or source_sr
+    n_fft, hop = frame_grid(sr)
+
+    out = StreamedAnalysis(sr, source_sr, n_fft, hop)
+    out.truncated = info.duration_sec is not None and info.duration_sec > max_sec
+    resampler = _Resampler(source_sr, sr, _soxr_quality(settings.ANALYSIS_RES_TYPE))
+    analyser = _BlockAnalyser(out, block_sec, vocals, intensity)
+
+    pending = None
+    for block in blocks:
+        # one block of look-ahead so the resampler can flush on the last one
+        if pending is not None:
+            analyser.push(resampler.push(pending))
+        pending = block
+    if pending is None:
+        pending = np.empty(0, dtype=np.float32)
+    analyser.push(resampler.push(pending, last=True), last=True)
+    return analyser.result(resampler.n_out)
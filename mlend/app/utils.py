@@ -1,8 +1,12 @@
-import uuid, shutil
+import os, uuid, shutil
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import UploadFile, HTTPException
+from fastapi.responses import JSONResponse
 from .constants import settings
+from .services.feature_cache import new_content_hasher
+
+UPLOAD_CHUNK = 1024 * 1024  # 1 MB
 
 ALLOWED_AUDIO = {".wav", ".mp3", ".flac", ".m4a", ".ogg"}
 
@@ -27,9 +31,80 @@ def save_upload(file: UploadFile, target_dir: Path) -> Path:
 def mb(bytes_: int) -> float:
     return round(bytes_ / (1024 * 1024), 2)
 
-def size_guard(file: UploadFile):
-    # UploadFile doesn't always know size; rely on web server limits in prod.
-    pass
+def max_upload_bytes() -> int:
+    return settings.MAX_FILE_MB * 1024 * 1024
+
+def size_guard(file: UploadFile, max_bytes: Optional[int] = None):
+    # UploadFile doesn't always know size; when it does, reject before reading anything.
+    max_bytes = max_bytes or max_upload_bytes()
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large: {mb(file.size)} MB (max {settings.MAX_FILE_MB} MB)")
+
+def max_request_bytes() -> int:
+    # main + reference upload at MAX_FILE_MB each, plus the form fields and multipart framing
+    return 2 * max_upload_bytes() + UPLOAD_CHUNK
+
+class BodySizeLimitMiddleware:
+    """
+    Caps the raw request body before Starlette parses it (multipart uploads are spooled in
+    full before a handler runs, so a per-file check there is too late to bound buffering).
+    A Content-Length over the limit is refused unread; a body without one gets 413 as
+    soon as the bytes received pass the limit.
+    """
+
+    def __init__(self, app, max_bytes: Optional[int] = None):
+        self.app = app
+        self.max_bytes = max_bytes or max_request_bytes()
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(status_code=413, detail=f"Request too large (max {mb(self.max_bytes)} MB)")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            exc = self._too_large()
+            return await JSONResponse({"detail": exc.detail}, status_code=exc.status_code)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise self._too_large()  # re-raised by FastAPI's body parsing -> 413
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def save_upload_streaming(file: UploadFile, target_dir: Path, max_bytes: Optional[int] = None) -> Tuple[Path, str]:
+    """
+    Copy an upload to `target_dir` in fixed-size chunks, hashing on the fly.
+    Aborts (and removes the partial file) as soon as `max_bytes` is exceeded.
+    Blocking; call from a worker thread. Returns (path, content_hash).
+    By now Starlette has spooled the whole upload; `BodySizeLimitMiddleware` is what
+    bounds that, this enforces the per-file limit.
+    """
+    max_bytes = max_bytes or max_upload_bytes()
+    size_guard(file, max_bytes)
+    dst = target_dir / f"{uuid.uuid4().hex}{secure_ext(file.filename or '')}"
+    hasher = new_content_hasher()
+    written = 0
+    try:
+        with dst.open("wb") as out:
+            for chunk in iter(lambda: file.file.read(UPLOAD_CHUNK), b""):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File too large (max {settings.MAX_FILE_MB} MB)")
+                hasher.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        dst.unlink(missing_ok=True)
+        raise
+    return dst, hasher.hexdigest()
 
 def short_text(s: str, n: int = 300) -> str:
     return s if len(s) <= n else s[: n - 3] + "..."
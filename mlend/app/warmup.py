@@ -0,0 +1,41 @@
+# src/warmup.py
+"""
+Prime the extractor in this process and report what a cold start costs.
+
+    python -m app.warmup            # Dockerfile RUN step: ships compiled numba kernels in NUMBA_CACHE_DIR
+
+Runs `audio_service.warmup` twice: the first run pays imports and JIT compilation
+(or loads kernels from the cache), the second is the warm baseline.
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+from typing import List, Optional
+
+from .constants import settings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.warmup", description=__doc__.split("\n\n")[0])
+    ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    from .services import audio_service
+    t1 = time.perf_counter()
+    audio_service.warmup()
+    t2 = time.perf_counter()
+    audio_service.warmup()
+    t3 = time.perf_counter()
+
+    print(json.dumps({
+        "numba_cache_dir": str(settings.NUMBA_CACHE_DIR),
+        "import_sec": round(t1 - t0, 3),
+        "first_run_sec": round(t2 - t1, 3),
+        "warm_run_sec": round(t3 - t2, 3),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
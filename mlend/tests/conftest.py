@@ -0,0 +1,14 @@
+# tests/conftest.py
+import os
+import sys
+from pathlib import Path
+
+# settings are read at import time: pin what the tests rely on before `app` is imported
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("MODEL_NAME", "gpt-4o-mini")
+os.environ["LLM_CACHE_ENABLED"] = "0"
+os.environ["FEATURE_CACHE_ENABLED"] = "0"
+os.environ["PCM_STORE_ENABLED"] = "0"
+os.environ["EXTRACT_WARMUP"] = "0"
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,106 @@
+# tests/test_batch.py
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.batch import discover, run_batch
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    root = tmp_path / "catalog"
+    (root / "album").mkdir(parents=True)
+    (root / "album" / "a.wav").write_bytes(b"")
+    (tmp_path / "secret.wav").write_bytes(b"")
+    return root
+
+
+def test_manifest_entries_resolve_inside_root(catalog):
+    manifest = catalog / "list.txt"
+    manifest.write_text("album/a.wav\n" + json.dumps({"path": str(catalog / "album" / "a.wav")}) + "\n")
+    assert discover(manifest, catalog) == [catalog / "album" / "a.wav"] * 2
+
+
+@pytest.mark.parametrize("entry", ["../secret.wav", "album/../../secret.wav", "{secret}", "/etc/passwd"])
+def test_manifest_entries_outside_root_are_rejected(catalog, entry):
+    manifest = catalog / "list.txt"
+    manifest.write_text(entry.replace("{secret}", str(catalog.parent / "secret.wav")) + "\n")
+    with pytest.raises(ValueError, match="outside"):
+        discover(manifest, catalog)
+
+
+def test_symlink_out_of_a_directory_source_is_rejected(catalog):
+    (catalog / "album" / "link.wav").symlink_to(catalog.parent / "secret.wav")
+    with pytest.raises(ValueError, match="outside"):
+        discover(catalog, catalog)
+    assert len(discover(catalog)) == 2  # the CLI (no root) reads whatever it is given
+
+
+class _FakeEngine:
+    workers = 4
+
+    def __init__(self):
+        self.in_flight = self.peak = 0
+
+    async def run(self, fn, path, content_hash, profile):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        timings = {"total": {"wall_sec": 0.01, "cpu_sec": 0.005}}
+        return {"payload": {"path": path}, "timings": timings}
+
+
+def test_run_batch_extracts_inside_the_slot(catalog, tmp_path):
+    for i in range(6):
+        (catalog / f"t{i}.wav").write_bytes(bytes([i]))
+    engine, slot_limit = _FakeEngine(), asyncio.Semaphore(2)
+
+    @asynccontextmanager
+    async def slot():
+        async with slot_limit:
+            yield
+
+    out = tmp_path / "out.jsonl"
+    report = asyncio.run(run_batch(discover(catalog), out, engine=engine, use_cache=False, slot=slot))
+
+    assert (report.done, report.failed) == (7, 0)
+    assert engine.peak == 2
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+    assert all(r["cpu_sec"] == 0.005 and r["payload"] == {"path": r["path"]} for r in records)
+
+
+def test_api_batch_resumes_and_survives_a_restart(catalog, tmp_path, monkeypatch):
+    from app import api
+    from app.jobs import JobQueue, JobStore
+
+    monkeypatch.setattr(api.settings, "BATCH_INPUT_DIR", catalog)
+    monkeypatch.setattr(api.settings, "BATCH_OUTPUT_DIR", tmp_path / "batches")
+    monkeypatch.setattr(api, "job_queue", JobQueue(JobStore(tmp_path / "jobs.sqlite3")))
+    engine = _FakeEngine()
+    monkeypatch.setattr(api, "run_batch", lambda *a, **kw: run_batch(*a, engine=engine, **kw))
+    req = api.BatchRequest(source=".", batch_id="backfill-1", use_cache=False)
+
+    async def submit_and_wait():
+        await api.features_batch(req)
+        await asyncio.gather(*api._batch_tasks.values())
+        return await api.features_batch_status("backfill-1")
+
+    first = asyncio.run(submit_and_wait())
+    assert first["state"] == "finished" and first["report"]["done"] == 1
+    (catalog / "album" / "b.wav").write_bytes(b"\x01")
+
+    api._batches.clear()
+    api._batch_tasks.clear()  # a restart: nothing in memory, the DB still knows the batch
+    assert asyncio.run(api.features_batch_status("backfill-1"))["report"] == first["report"]
+
+    second = asyncio.run(submit_and_wait())
+    assert (second["report"]["skipped"], second["report"]["done"]) == (1, 1)
+    out = tmp_path / "batches" / "backfill-1.jsonl"
+    assert sorted(json.loads(line)["path"] for line in out.read_text().splitlines()) == \
+        sorted(str(p.resolve()) for p in (catalog / "album").iterdir())
+
+    api.job_queue.store.put_batch("crashed", "running", {"source": "."}, {"done": 3})
+    assert asyncio.run(api.features_batch_status("crashed"))["state"] == "interrupted"
@@ -0,0 +1,17 @@
+# tests/test_extractor_config.py
+from app.services import extractor_config
+from app.services.extractor_config import PROFILES, extractor_fingerprint
+
+
+def test_profile_mapping_does_not_version_the_cache(monkeypatch):
+    before = {name: extractor_fingerprint(p) for name, p in PROFILES.items()}
+    monkeypatch.setitem(extractor_config.FEEDBACK_TYPE_PROFILES, "mix", "full")
+    monkeypatch.setitem(extractor_config.PROFILES, "lofi", extractor_config.ExtractionProfile("lofi", ()))
+    assert {name: extractor_fingerprint(PROFILES[name]) for name in before} == before
+
+
+def test_feature_tunables_and_profile_do_version_the_cache(monkeypatch):
+    standard = extractor_fingerprint(PROFILES["standard"])
+    assert extractor_fingerprint(PROFILES["full"]) != standard
+    monkeypatch.setattr(extractor_config, "MAX_ENERGY_POINTS", extractor_config.MAX_ENERGY_POINTS + 1)
+    assert extractor_fingerprint(PROFILES["standard"]) != standard
@@ -0,0 +1,171 @@
+# tests/test_jobs.py
+import asyncio
+import json
+import sqlite3
+import time
+
+from app import api
+from app.jobs import JobQueue, JobStore
+from app.progress import ProgressEstimator, ProgressTracker
+
+
+def _queue(tmp_path) -> JobQueue:
+    return JobQueue(JobStore(tmp_path / "jobs.sqlite3"), workers=1)
+
+
+def test_report_never_revives_a_finished_job(tmp_path):
+    queue = _queue(tmp_path)
+    queue.store.enqueue("j1", {})
+    queue.store.claim_next()
+
+    async def run():
+        queue.report("j1", percent=40, stage="extracting_main", status="processing")
+        await queue.flush()
+        queue.store.update("j1", status="failed", stage="failed", error="boom")
+        queue.report("j1", percent=98, stage="finalizing", status="processing")
+        await queue.flush()
+
+    asyncio.run(run())
+    job = queue.store.get("j1")
+    assert (job["status"], job["stage"], job["percent"]) == ("failed", "failed", 40)
+    assert queue.store.depth() == 0
+
+
+def test_progress_reports_are_coalesced(tmp_path, monkeypatch):
+    queue = _queue(tmp_path)
+    queue.store.enqueue("j1", {})
+    queue.store.claim_next()
+    writes = []
+    report_many = queue.store.report_many
+    monkeypatch.setattr(queue.store, "report_many", lambda reports: (writes.append(dict(reports)), report_many(reports)))
+
+    async def run():
+        for pct in range(10, 60, 10):
+            queue.report("j1", percent=pct, stage="extracting_main", status="processing")
+        assert (await queue.get("j1"))["percent"] == 50  # unwritten progress is still visible
+        queue.report("j1", percent=100, stage="completed", status="completed")
+        queue.report("j1", percent=99, stage="finalizing", status="processing")  # late tick
+        await queue.flush()
+
+    asyncio.run(run())
+    assert len(writes) == 1
+    job = queue.store.get("j1")
+    assert (job["status"], job["percent"]) == ("completed", 100)
+
+
+def test_failing_error_callback_still_stops_the_ticker(tmp_path, monkeypatch):
+    queue = _queue(tmp_path)
+    queue.store.enqueue("j1", {})
+    queue.store.claim_next()
+    trackers = []
+
+    def tracker(*a, **kw):
+        t = ProgressTracker(*a, **kw, estimator=ProgressEstimator(None), tick_sec=0.01)
+        trackers.append(t)
+        return t
+
+    async def backend_down(*a, **kw):
+        raise ConnectionError("backend down")
+
+    def slow_probe_failure(path):
+        time.sleep(0.2)  # long enough for the "received" ticker to run
+        raise RuntimeError("decode failed")
+
+    monkeypatch.setattr(api, "job_queue", queue)
+    monkeypatch.setattr(api, "ProgressTracker", tracker)
+    monkeypatch.setattr(api, "get_service", lambda: None)
+    monkeypatch.setattr(api, "post_json_with_retries", backend_down)
+    monkeypatch.setattr(api, "probe", slow_probe_failure)
+
+    async def run():
+        try:
+            await api._process_in_background(
+                request_id="j1", genre="Techno", feedback_type="Mix", user_note=None,
+                main_path=str(tmp_path / "missing.wav"), ref_path=None,
+                callback_url="http://backend.invalid/cb", progress_url=None, secret=None,
+            )
+        except ConnectionError:
+            pass
+        await asyncio.sleep(0.1)  # a surviving ticker would report "processing" here
+        await queue.flush()
+
+    asyncio.run(run())
+    job = queue.store.get("j1")
+    assert job["status"] == "failed"
+    assert trackers and trackers[0]._ticker is None
+
+
+
+def test_recovery_fails_crash_looping_jobs_and_reports_them(tmp_path):
+    queue = _queue(tmp_path)
+    upload = tmp_path / "main.wav"
+    upload.write_bytes(b"RIFF")
+    queue.store.enqueue("j1", {"main_path": str(upload), "callback_url": "http://backend/cb"})
+    for _ in range(queue.max_attempts):  # claimed, then the process died mid-job
+        queue.store.claim_next()
+        queue.store.update("j1", status="queued")
+    reported = []
+
+    async def on_failed(request_id, params, error):
+        reported.append((request_id, params["callback_url"], error))
+
+    async def run():
+        await queue.start(lambda **params: None, on_failed=on_failed)
+        await asyncio.sleep(0)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert queue.store.get("j1")["status"] == "failed"
+    assert not upload.exists()
+    assert reported == [("j1", "http://backend/cb", "exceeded max attempts")]
+
+
+def test_worker_results_reach_the_store(tmp_path):
+    queue = JobQueue(JobStore(tmp_path / "jobs.sqlite3"), workers=1, flush_sec=0.01)
+
+    async def runner(request_id):
+        queue.report(request_id, percent=50, stage="extracting_main", status="processing")
+
+    async def run():
+        await queue.start(runner)
+        await queue.submit("j1", {"request_id": "j1"})
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if queue.store.get("j1")["status"] == "completed":
+                break
+        await queue.stop()
+
+    asyncio.run(run())
+    job = queue.store.get("j1")
+    assert (job["status"], job["stage"], job["percent"]) == ("completed", "completed", 100)
+
+
+def test_callback_secret_is_never_persisted(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    queue = _queue(tmp_path)
+    monkeypatch.setattr(api, "job_queue", queue)
+    monkeypatch.setattr(api.settings, "UPLOADS_DIR", tmp_path)
+    client = TestClient(api.create_app())  # no lifespan: the job stays queued
+
+    r = client.post("/v1/feedback", data={"genre": "Techno", "feedback_type": "Mix", "request_id": "j1"},
+                    files={"audio_file": ("a.wav", b"RIFF")}, headers={"x-ml-secret": "s3cret"})
+    assert r.status_code == 202
+    params = json.loads(sqlite3.connect(tmp_path / "jobs.sqlite3").execute(
+        "SELECT params FROM jobs WHERE request_id = 'j1'").fetchone()[0])
+    assert "secret" not in params and "s3cret" not in json.dumps(params)
+
+    delivered = []
+
+    async def callback(url, payload, secret, **kw):
+        delivered.append(secret)
+
+    def probe_failure(path):
+        raise RuntimeError("decode failed")
+
+    monkeypatch.setattr(api, "get_service", lambda: None)
+    monkeypatch.setattr(api, "post_json_with_retries", callback)
+    monkeypatch.setattr(api, "probe", probe_failure)
+    asyncio.run(api._process_in_background(**{**params, "callback_url": "http://backend/cb"}))
+    assert delivered == ["s3cret"]
+    assert "j1" not in api._job_secrets
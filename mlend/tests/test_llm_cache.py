@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import llm_service
+from app.services.llm_cache import LlmResponseCache
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+USAGE = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+
+
+class _Reply:
+    status_code = 200
+    headers: dict = {}
+    text = ""
+
+    def __init__(self, content):
+        self._body = {"choices": [{"message": {"content": content}}], "usage": USAGE}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def llm(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_service, "get_encoding", lambda model: None)
+    monkeypatch.setattr(llm_service, "llm_cache", LlmResponseCache(tmp_path, 1 << 20, ttl_sec=60))
+    return llm_service.MLService(model_name="gpt-4o-mini")
+
+
+def _sync_call(llm, monkeypatch, content):
+    monkeypatch.setattr(llm_service.requests, "post", lambda *a, **kw: _Reply(content))
+    return llm.call_llm(messages=MESSAGES, max_retries=1)
+
+
+def _async_call(llm, content):
+    async def handler(request):
+        return httpx.Response(200, json=_Reply(content).json())
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await llm.call_llm_async(messages=MESSAGES, client=client, max_retries=1)
+
+    return asyncio.run(run())
+
+
+def test_empty_replies_are_never_cached(llm, monkeypatch):
+    assert _sync_call(llm, monkeypatch, "")[0] == ""
+    assert _async_call(llm, "")[0] == ""
+    # neither empty reply was stored: both paths still reach the model
+    assert _sync_call(llm, monkeypatch, "sync")[0] == "sync"
+    content, info = _async_call(llm, "async")
+    assert content == "sync" and info["cached"]
+
+
+def test_cached_reply_reports_no_usage(llm, monkeypatch):
+    content, info = _sync_call(llm, monkeypatch, "fresh")
+    assert info["usage"] == USAGE and "cached" not in info
+
+    content, info = _async_call(llm, "different")
+    assert content == "fresh"
+    assert info["cached"] and info["cost"] == 0.0
+    assert info["usage"] == llm_service.CACHED_USAGE
+
+
+def test_both_paths_time_their_requests(llm, monkeypatch):
+    def count(call_type):
+        key = llm_service.LLM_REQUEST_SECONDS._key({"call_type": call_type, "model": "gpt-4o-mini"})
+        return llm_service.LLM_REQUEST_SECONDS._counts.get(key, [0])[-1]
+
+    monkeypatch.setattr(llm_service.llm_cache, "enabled", False)
+    before = count("llm_call"), count("llm_call_async")
+    _sync_call(llm, monkeypatch, "fresh")
+    _async_call(llm, "fresh")
+    assert (count("llm_call"), count("llm_call_async")) == (before[0] + 1, before[1] + 1)
+
+
+def test_llm_cache_keys_cover_the_request_only(tmp_path):
+    from app.services.feature_cache import FeatureCache
+
+    cache = LlmResponseCache(tmp_path, 1 << 20, ttl_sec=60)
+    assert not isinstance(cache, FeatureCache)
+    request = dict(model="gpt-4o-mini", messages=MESSAGES, temperature=0.5, max_tokens=100)
+    assert cache.key(**request) == cache.key(**request)
+    assert cache.key(**request) != cache.key(**{**request, "temperature": 0.4})
+    assert cache.key(**request) != cache.key(**{**request, "messages": [{"role": "user", "content": "hey"}]})
@@ -0,0 +1,130 @@
+# tests/test_llm_concurrency.py
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app import api
+from app.progress import ProgressEstimator, ProgressTracker
+from app.services import llm_service
+
+PAYLOAD = json.loads((Path(__file__).resolve().parents[1] / "data" / "feature_payload.json").read_text())
+REPLY_DELAY_SEC = 0.3
+
+
+class _WordEncoding:
+    def encode(self, text: str) -> list:
+        return text.split()
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(llm_service, "get_encoding", lambda model: _WordEncoding())
+    return llm_service.MLService(model_name="gpt-4o-mini")
+
+
+def _stub_chat_completions(content, state: dict) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            await asyncio.sleep(REPLY_DELAY_SEC)
+        finally:
+            state["in_flight"] -= 1
+        body = {
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+        }
+        return httpx.Response(200, json=body)
+
+    return httpx.MockTransport(handler)
+
+
+def test_concurrent_jobs_call_the_llm_independently(llm, monkeypatch):
+    jobs = 4
+    state = {"in_flight": 0, "peak": 0}
+
+    async def send(*a):
+        pass
+
+    async def run():
+        client = httpx.AsyncClient(transport=_stub_chat_completions('{"ok": true}', state))
+        monkeypatch.setattr(llm_service, "_http_client", client)
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(
+                api._llm_phase(
+                    llm, ProgressTracker(send, ["prompting"], estimator=ProgressEstimator(None), tick_sec=0),
+                    "no_reference", PAYLOAD, None, genre="Techno", feedback_type="Mix", user_note=None,
+                )
+                for _ in range(jobs)
+            ))
+            return results, time.perf_counter() - started
+        finally:
+            await client.aclose()
+
+    results, wall = asyncio.run(run())
+    assert [content for content, *_ in results] == ['{"ok": true}'] * jobs
+    # every job's request was in flight at once: the shared client doesn't serialise them
+    assert state["peak"] == jobs
+    assert wall < 2 * REPLY_DELAY_SEC
+
+
+def test_async_call_rejects_non_string_content(llm):
+    state = {"in_flight": 0, "peak": 0}
+
+    async def run():
+        async with httpx.AsyncClient(transport=_stub_chat_completions(None, state)) as client:
+            await llm.call_llm_async(messages=[{"role": "user", "content": "hi"}], client=client, max_retries=1)
+
+    with pytest.raises(RuntimeError, match="invalid content type"):
+        asyncio.run(run())
+
+
+def _throttle_once(marker: str, retry_after: str, state: dict) -> httpx.MockTransport:
+    """Answers after REPLY_DELAY_SEC, except that the first request containing `marker` gets a 429."""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = request.content.decode()
+        if marker in body and not state["throttled"]:
+            state["throttled"] = True
+            return httpx.Response(429, headers={"Retry-After": retry_after}, json={"error": "rate limited"})
+        await asyncio.sleep(REPLY_DELAY_SEC)
+        state["replies"] += 1
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}],
+                                         "usage": {"prompt_tokens": 10, "completion_tokens": 5}})
+
+    return httpx.MockTransport(handler)
+
+
+def test_throttled_job_backs_off_while_the_others_complete(llm, monkeypatch):
+    jobs = 4
+    state = {"throttled": False, "replies": 0}
+    finished = {}
+
+    async def send(*a):
+        pass
+
+    async def job(i: int, started: float):
+        progress = ProgressTracker(send, ["prompting"], estimator=ProgressEstimator(None), tick_sec=0)
+        await api._llm_phase(llm, progress, "no_reference", PAYLOAD, None,
+                             genre="Techno", feedback_type="Mix", user_note=f"job-{i}")
+        finished[i] = time.perf_counter() - started
+
+    async def run():
+        client = httpx.AsyncClient(transport=_throttle_once("job-0", "0", state))
+        monkeypatch.setattr(llm_service, "_http_client", client)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(job(i, started) for i in range(jobs)))
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert state["throttled"] and state["replies"] == jobs
+    # the others were answered without waiting on the throttled call...
+    assert all(finished[i] < 2 * REPLY_DELAY_SEC for i in range(1, jobs))
+    # ...which slept Retry-After (+1 s margin) before its retry succeeded
+    assert finished[0] >= 1.0 + REPLY_DELAY_SEC
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from app.progress import ProgressEstimator, ProgressTracker
+
+
+def test_observe_stays_in_memory_until_flush(tmp_path):
+    path = tmp_path / "model.json"
+    est = ProgressEstimator(path)
+    est.observe("comparing", 2.0)
+    assert not path.exists()
+
+    est.flush()
+    assert json.loads(path.read_text())["rates"] == {"comparing": 2.0}
+    path.unlink()
+    est.flush()  # nothing new observed
+    assert not path.exists()
+    assert ProgressEstimator(tmp_path / "missing.json").snapshot() == {}
+
+
+def test_tracker_flushes_once_per_job(tmp_path):
+    path = tmp_path / "model.json"
+    est = ProgressEstimator(path)
+    writes = []
+    flush = est.flush
+    est.flush = lambda: (writes.append(1), flush())
+
+    async def send(*_):
+        pass
+
+    async def job():
+        tracker = ProgressTracker(send, ["received", "comparing", "finalizing"], estimator=est, tick_sec=0)
+        for stage in tracker.stages:
+            await tracker.enter(stage)
+        await tracker.finish("completed")
+
+    asyncio.run(job())
+    assert len(writes) == 1
+    assert set(ProgressEstimator(path).snapshot()) == {"received", "comparing", "finalizing"}
+
+
+def test_close_stops_the_ticker():
+    sent = []
+
+    async def send(percent, stage, status, meta):
+        sent.append(percent)
+
+    async def job():
+        est = ProgressEstimator(None)
+        est.observe("extracting_main", 0.2)  # a short stage, so the bar moves within the test
+        tracker = ProgressTracker(send, ["extracting_main"], estimator=est, tick_sec=0.01)
+        await tracker.enter("extracting_main")
+        await asyncio.sleep(0.05)
+        await tracker.close()
+        await tracker.close()
+        ticks = len(sent)
+        await asyncio.sleep(0.05)
+        return ticks
+
+    ticks = asyncio.run(job())
+    assert ticks > 1 and len(sent) == ticks
@@ -0,0 +1,84 @@
+# tests/test_streaming.py
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.constants import settings
+from app.services import audio_service
+from app.services.decode import AudioInfo, duration_limit
+
+# the vocal-intensity median filters restart at each block edge (~1e-4 apart); everything else
+# matches to float precision, bar resampler ringing (~1e-8) in digital silence
+VOCAL_INTENSITY_RTOL = 1e-3
+PAYLOAD_RTOL = PAYLOAD_ATOL = 1e-6
+
+
+@pytest.fixture
+def track_of(monkeypatch):
+    def set_duration(sec):
+        monkeypatch.setattr(audio_service, "probe", lambda path: AudioInfo(duration_sec=sec, sample_rate=44100))
+    return set_duration
+
+
+def test_defaults_stream_long_mixes_instead_of_truncating(track_of):
+    assert 0 <= settings.STREAM_ABOVE_SEC <= settings.MAX_DURATION_SEC
+    assert duration_limit() == settings.STREAM_MAX_DURATION_SEC > settings.MAX_DURATION_SEC
+    track_of(1800.0)
+    assert audio_service._should_stream("mix.wav")
+    track_of(180.0)
+    assert not audio_service._should_stream("track.wav")
+
+
+def test_anything_past_max_duration_streams_whatever_the_threshold(track_of, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_ABOVE_SEC", settings.MAX_DURATION_SEC + 600.0)
+    track_of(settings.MAX_DURATION_SEC + 60.0)
+    assert audio_service._should_stream("mix.wav")
+
+
+def test_streaming_off_keeps_the_in_memory_limit(track_of, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_ABOVE_SEC", -1.0)
+    track_of(1800.0)
+    assert duration_limit() == settings.MAX_DURATION_SEC
+    assert not audio_service._should_stream("mix.wav")
+
+
+@pytest.fixture(scope="module")
+def gated_tone(tmp_path_factory):
+    sr, dur = 44100, 30
+    t = np.arange(dur * sr) / sr
+    y = 0.3 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 0.5 * t) > 0)
+    y += 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    y[:: sr // 2] += 0.9                      # clicks at 120 BPM
+    y[12 * sr:14 * sr] = 0                    # digital silence
+    path = tmp_path_factory.mktemp("audio") / "gated.wav"
+    sf.write(path, y.astype(np.float32), sr, subtype="FLOAT")
+    return str(path)
+
+
+@pytest.mark.parametrize("profile", ["fast", "standard", "full"])
+def test_streamed_payload_matches_in_memory(gated_tone, profile, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_BLOCK_SEC", 10.0)  # three blocks
+    monkeypatch.setattr(settings, "STREAM_ABOVE_SEC", -1.0)
+    in_memory = audio_service.features_to_payload(audio_service.extract_features(gated_tone, profile=profile))
+    monkeypatch.setattr(settings, "STREAM_ABOVE_SEC", 0.0)
+    streamed = audio_service.features_to_payload(audio_service.extract_features(gated_tone, profile=profile))
+
+    expected = in_memory.pop("vocal_intensity", None)
+    actual = streamed.pop("vocal_intensity", None)
+    _assert_close(streamed, in_memory)
+    assert actual == pytest.approx(expected, rel=VOCAL_INTENSITY_RTOL)
+
+
+def _assert_close(actual, expected, path="payload"):
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and actual.keys() == expected.keys(), path
+        for k in expected:
+            _assert_close(actual[k], expected[k], f"{path}.{k}")
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(actual) == len(expected), path
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            _assert_close(a, e, f"{path}[{i}]")
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=PAYLOAD_RTOL, abs=PAYLOAD_ATOL), path
+    else:
+        assert actual == expected, path
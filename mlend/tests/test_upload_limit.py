@@ -0,0 +1,41 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.utils import BodySizeLimitMiddleware
+
+LIMIT = 64 * 1024
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=LIMIT)
+
+    @app.post("/upload")
+    async def upload(audio_file: UploadFile = File(...)):
+        return {"size": len(await audio_file.read())}
+
+    return TestClient(app)
+
+
+def test_upload_under_the_limit_passes():
+    r = _client().post("/upload", files={"audio_file": ("a.wav", b"\0" * 1024)})
+    assert r.status_code == 200 and r.json() == {"size": 1024}
+
+
+def test_oversized_content_length_is_refused_unread():
+    r = _client().post("/upload", files={"audio_file": ("a.wav", b"\0" * (2 * LIMIT))})
+    assert r.status_code == 413
+
+
+def test_oversized_chunked_body_is_cut_off():
+    body = b"--x\r\nContent-Disposition: form-data; name=\"audio_file\"; filename=\"a.wav\"\r\n\r\n"
+
+    def chunks():
+        yield body
+        for _ in range(8):
+            yield b"\0" * (LIMIT // 4)
+        yield b"\r\n--x--\r\n"
+
+    r = _client().post("/upload", content=chunks(),
+                       headers={"content-type": "multipart/form-data; boundary=x"})
+    assert r.status_code == 413
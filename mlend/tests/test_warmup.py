@@ -0,0 +1,10 @@
+from app.services import audio_service
+from app.services.pcm_store import PcmStore
+
+
+def test_warmup_leaves_nothing_in_the_pcm_store(tmp_path, monkeypatch):
+    store = PcmStore(tmp_path, 1 << 30, enabled=True)
+    monkeypatch.setattr(audio_service, "pcm_store", store)
+    audio_service.warmup(duration_sec=1.0)
+    assert store.enabled
+    assert list(tmp_path.iterdir()) == []